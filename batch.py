@@ -0,0 +1,293 @@
+# Convert many budgets at once: each job runs example.py, inverse-example.py,
+# obfuscate.py or cutover.py on one export with its own arguments, a few jobs
+# at a time.
+#
+# Jobs come from a directory of exports or a manifest.  Each runs in a process
+# of its own, forked from a server that has already imported the scripts, so
+# a job pays neither interpreter startup nor imports; a crash or MemoryError
+# fails only that job, and its memory is returned when it ends.  Failed jobs
+# are retried, and summary.json in the output directory records each job's
+# outcome, time and peak memory.
+#
+# A manifest is a JSON list of jobs:
+#
+#   [{"input": "smith.json", "args": ["--start", "2024-01-01", "-a", "Checking"]},
+#    {"input": "jones.json", "script": "obfuscate.py", "memory_limit_mb": 8192}]
+#
+# with optional "name" (default the input's name), "output" (default
+# <output dir>/<name>.json, or the directory <output dir>/<name> for
+# cutover.py), "script", "args" and "memory_limit_mb".  Paths are relative
+# to the manifest.
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import traceback
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, cast
+
+from cli import script_main
+
+
+if TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+    from multiprocessing.process import BaseProcess
+
+
+SCRIPTS = ("example.py", "inverse-example.py", "obfuscate.py", "cutover.py")
+# Imported by the fork server; between them, everything the scripts import.
+# The scripts import ynab lazily, so it comes first to be loaded for real.
+PRELOAD = ["pydantic", "ynab", "example", "obfuscate", "cutover"]
+# Of a failed job's traceback, sent back through a pipe.
+_MAX_ERROR = 4000
+# Scripts that write a directory of outputs rather than one file.
+_DIRECTORY_OUTPUT = ("cutover.py",)
+# argparse's exit status for bad arguments, which a retry won't fix.
+_USAGE_ERROR = 2
+
+
+@dataclass
+class Job:
+    name: str
+    input: str
+    output: str
+    script: str = "example.py"
+    args: list[str] = field(default_factory=list)
+    memory_limit_mb: int | None = None
+
+
+@dataclass
+class Outcome:
+    name: str
+    input: str
+    status: str = "pending"
+    attempts: int = 0
+    # Of the last attempt.
+    seconds: float = 0.0
+    peak_mb: float = 0.0
+    error: str | None = None
+
+
+def load_jobs(
+    source: Path,
+    output_dir: Path,
+    script: str,
+    args: list[str],
+    memory_limit_mb: int | None,
+) -> list[Job]:
+    """One job per export in a directory, or per entry of a manifest, with
+    `args` ahead of each job's own."""
+
+    def default_output(name: str, script: str) -> str:
+        if script in _DIRECTORY_OUTPUT:
+            return str(output_dir / name)
+        return str(output_dir / f"{name}.json")
+
+    if source.is_dir():
+        return [
+            Job(
+                p.stem,
+                str(p),
+                default_output(p.stem, script),
+                script,
+                args,
+                memory_limit_mb,
+            )
+            for p in sorted(source.glob("*.json"))
+        ]
+    jobs: list[Job] = []
+    for entry in cast(list[dict[str, Any]], json.loads(source.read_text())):
+        input_path = source.parent / cast(str, entry["input"])
+        name = cast(str, entry.get("name", input_path.stem))
+        output = entry.get("output")
+        job_script = cast(str, entry.get("script", script))
+        jobs.append(
+            Job(
+                name,
+                str(input_path),
+                default_output(name, job_script)
+                if output is None
+                else str(source.parent / cast(str, output)),
+                job_script,
+                args + cast(list[str], entry.get("args", [])),
+                cast("int | None", entry.get("memory_limit_mb", memory_limit_mb)),
+            )
+        )
+    return jobs
+
+
+def check_jobs(jobs: list[Job]):
+    names = [job.name for job in jobs]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        msg = f"Duplicate job names: {duplicates}"
+        raise RuntimeError(msg)
+    scripts = sorted({job.script for job in jobs} - set(SCRIPTS))
+    if scripts:
+        msg = f"Unknown scripts {scripts}, expected one of {list(SCRIPTS)}"
+        raise RuntimeError(msg)
+
+
+def _run_job(job: Job, log_path: Path, conn: Connection):
+    # In the job's process: output goes to the job's log, and the error (if
+    # any), peak memory and whether a retry might help back to the runner.
+    if job.memory_limit_mb is not None:
+        limit = job.memory_limit_mb << 20
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    error = None
+    retry = True
+    output_option = "--output-dir" if job.script in _DIRECTORY_OUTPUT else "--output"
+    with log_path.open("w") as log:
+        os.dup2(log.fileno(), sys.stdout.fileno())
+        os.dup2(log.fileno(), sys.stderr.fileno())
+        try:
+            script_main(job.script)(
+                ["--input", job.input, output_option, job.output, *job.args]
+            )
+        except SystemExit as e:
+            if e.code not in (0, None):
+                error = f"exit status {e.code}"
+                retry = e.code != _USAGE_ERROR
+        except Exception:  # noqa: BLE001
+            error = traceback.format_exc()
+        if error is not None:
+            print(error, file=sys.stderr)
+        sys.stdout.flush()
+        sys.stderr.flush()
+    # ru_maxrss is in KiB on Linux.
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    conn.send((None if error is None else error[-_MAX_ERROR:], peak_mb, retry))
+    conn.close()
+
+
+def run_jobs(
+    jobs: list[Job], output_dir: Path, workers: int, retries: int
+) -> list[Outcome]:
+    ctx = multiprocessing.get_context("forkserver")
+    ctx.set_forkserver_preload(PRELOAD)
+    outcomes = {job.name: Outcome(job.name, job.input) for job in jobs}
+    pending = deque(jobs)
+    running: dict[int, tuple[Job, BaseProcess, Connection, float]] = {}
+    while pending or running:
+        while pending and len(running) < workers:
+            job = pending.popleft()
+            Path(job.output).parent.mkdir(parents=True, exist_ok=True)
+            receiver, sender = ctx.Pipe(duplex=False)
+            p = ctx.Process(
+                target=_run_job,
+                args=(job, output_dir / f"{job.name}.log", sender),
+                name=job.name,
+            )
+            p.start()
+            sender.close()
+            running[p.sentinel] = (job, p, receiver, time.perf_counter())
+            outcomes[job.name].attempts += 1
+        for sentinel in wait(list(running)):
+            job, p, receiver, t0 = running.pop(cast(int, sentinel))
+            p.join()
+            outcome = outcomes[job.name]
+            outcome.seconds = time.perf_counter() - t0
+            retry = True
+            if receiver.poll():
+                outcome.error, outcome.peak_mb, retry = cast(
+                    "tuple[str | None, float, bool]", receiver.recv()
+                )
+            else:
+                # Killed, e.g. by the OOM killer.
+                outcome.error = f"exit code {p.exitcode}"
+            receiver.close()
+            if outcome.error is None:
+                outcome.status = "ok"
+            elif retry and outcome.attempts <= retries:
+                pending.append(job)
+            else:
+                outcome.status = "failed"
+            print(
+                f"{job.name}: {outcome.error and 'failed' or 'ok'} in {outcome.seconds:.1f}s (attempt {outcome.attempts})"
+            )
+    return list(outcomes.values())
+
+
+def write_summary(path: Path, outcomes: list[Outcome], workers: int, seconds: float):
+    job_seconds = sum(o.seconds for o in outcomes)
+    failed = [o.name for o in outcomes if o.status != "ok"]
+    _ = path.write_text(
+        json.dumps(
+            {
+                "workers": workers,
+                "seconds": seconds,
+                "job_seconds": job_seconds,
+                "failed": failed,
+                "jobs": [asdict(o) for o in outcomes],
+            },
+            indent=2,
+        )
+    )
+    width = max((len(o.name) for o in outcomes), default=0)
+    for o in outcomes:
+        print(
+            f"{o.name:{width}}  {o.status:6}  {o.attempts} attempt(s)  {o.seconds:7.1f}s  {o.peak_mb:7.0f} MB"
+        )
+    print(
+        f"{len(outcomes)} jobs, {len(failed)} failed, in {seconds:.1f}s ({job_seconds:.1f}s of jobs on {workers} workers)"
+    )
+    print(path)
+
+
+def main(argv: list[str]):
+    # Arguments after "--" are passed to every job.
+    common: list[str] = []
+    if "--" in argv:
+        i = argv.index("--")
+        argv, common = argv[:i], argv[i + 1 :]
+    parser = argparse.ArgumentParser(
+        description="Run a script on many budget exports concurrently",
+        epilog="Arguments after -- are passed to every job's script",
+    )
+    _ = parser.add_argument(
+        "source", help="A directory of exports (*.json) or a JSON manifest of jobs"
+    )
+    _ = parser.add_argument("--output-dir", "-o", default="batch-out")
+    _ = parser.add_argument(
+        "--script", "-s", choices=SCRIPTS, default="example.py", help="Default script"
+    )
+    _ = parser.add_argument("--workers", "-w", type=int, default=os.cpu_count() or 1)
+    _ = parser.add_argument(
+        "--memory-limit",
+        type=int,
+        metavar="MB",
+        help="Default limit on each job's address space",
+    )
+    _ = parser.add_argument(
+        "--retries", type=int, default=1, help="Times to rerun a failed job"
+    )
+    args = parser.parse_args(argv)
+    output_dir = Path(cast(str, args.output_dir))
+    workers = cast(int, args.workers)
+    jobs = load_jobs(
+        Path(cast(str, args.source)),
+        output_dir,
+        cast(str, args.script),
+        common,
+        cast("int | None", args.memory_limit),
+    )
+    check_jobs(jobs)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    t0 = time.perf_counter()
+    outcomes = run_jobs(jobs, output_dir, workers, cast(int, args.retries))
+    write_summary(
+        output_dir / "summary.json", outcomes, workers, time.perf_counter() - t0
+    )
+    if any(o.status != "ok" for o in outcomes):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,245 @@
+# Time each phase of example.py, inverse-example.py and obfuscate.py on
+# synthetic budgets of several sizes, with the peak memory reached by the end
+# of each phase.  Each script and size runs in a fresh process.
+#
+# --save writes the results as a baseline; --baseline compares against one
+# and exits non-zero if any phase got slower by more than --tolerance.
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, cast
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+    from datetime import date
+
+    from ynab import SubTransaction, TransactionSummary
+
+from ynab import BudgetDetailResponse
+
+import jsonstream
+from budget_index import BudgetIndex
+from budget_slice import (
+    SliceRule,
+    check_key_fields,
+    forward_budget,
+    inverse_budget,
+    slice_transactions,
+    with_budget,
+    write_budget,
+)
+from obfuscate import Pseudonymizer, obfuscate_budget
+from synthetic import SyntheticConfig, first_month, write_synthetic
+
+
+SIZES = [10_000, 100_000, 1_000_000]
+# Phases faster than this are too noisy to compare against a baseline.
+MIN_COMPARE_SECONDS = 0.05
+
+type Phases = list[dict[str, Any]]
+
+
+@contextmanager
+def _phase(phases: Phases, name: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    yield
+    phases.append(
+        {
+            "phase": name,
+            "seconds": time.perf_counter() - t0,
+            # ru_maxrss is in KiB on Linux.
+            "peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+    )
+
+
+def _load(phases: Phases, input_path: Path) -> BudgetDetailResponse:
+    with _phase(phases, "load"), input_path.open("r") as f:
+        doc = json.load(f)  # pyright: ignore[reportAny]
+    with _phase(phases, "validate"):
+        budget_detail_response = cast(
+            BudgetDetailResponse, BudgetDetailResponse.from_dict(doc)
+        )
+        check_key_fields(budget_detail_response.data.budget)
+    del doc
+    return budget_detail_response
+
+
+def synthetic_cutover() -> date:
+    """Halfway through the synthetic budgets' months."""
+    config = SyntheticConfig()
+    first = first_month(config)
+    return first + (config.last_month - first) / 2
+
+
+def bench_example(input_path: Path, output_path: Path, start: date) -> Phases:
+    phases: Phases = []
+    budget_detail_response = _load(phases, input_path)
+    budget = budget_detail_response.data.budget
+    with _phase(phases, "filter"):
+        s, transactions, subtransactions = slice_transactions(
+            SliceRule(start=start),
+            cast(list["TransactionSummary"], budget.transactions),
+            cast(list["SubTransaction"], budget.subtransactions),
+        )
+    with _phase(phases, "balance-forward"):
+        filtered_budget, _ = forward_budget(
+            BudgetIndex(budget), s, transactions, subtransactions, "#review", drop=False
+        )
+    with _phase(phases, "dump"):
+        write_budget(output_path, with_budget(budget_detail_response, filtered_budget))
+    return phases
+
+
+def bench_inverse(input_path: Path, output_path: Path, end: date) -> Phases:
+    phases: Phases = []
+    budget_detail_response = _load(phases, input_path)
+    budget = budget_detail_response.data.budget
+    with _phase(phases, "filter"):
+        s, transactions, subtransactions = slice_transactions(
+            SliceRule(end=end),
+            cast(list["TransactionSummary"], budget.transactions),
+            cast(list["SubTransaction"], budget.subtransactions),
+        )
+        filtered_budget = inverse_budget(
+            BudgetIndex(budget), s, transactions, subtransactions
+        )
+    with _phase(phases, "dump"):
+        write_budget(output_path, with_budget(budget_detail_response, filtered_budget))
+    return phases
+
+
+def bench_obfuscate(input_path: Path, output_path: Path, _: date) -> Phases:
+    phases: Phases = []
+    budget_detail_response = _load(phases, input_path)
+    # As in obfuscate.py, the large arrays are obfuscated as they are dumped.
+    with _phase(phases, "obfuscate+dump"), output_path.open("w") as f:
+        budget, arrays = obfuscate_budget(
+            budget_detail_response.data.budget, Pseudonymizer("bench")
+        )
+        jsonstream.write_model(f, budget, arrays, indent=2)
+    return phases
+
+
+BENCHMARKS: dict[str, Callable[[Path, Path, date], Phases]] = {
+    "example": bench_example,
+    "inverse-example": bench_inverse,
+    "obfuscate": bench_obfuscate,
+}
+
+
+def synthetic_input(data_dir: Path, transactions: int) -> Path:
+    input_path = data_dir / f"synthetic-{transactions}.json"
+    if not input_path.exists():
+        print(f"generating {input_path}", file=sys.stderr)
+        partial_path = input_path.with_suffix(".partial")
+        with partial_path.open("w") as f:
+            write_synthetic(f, SyntheticConfig(transactions=transactions))
+        _ = partial_path.replace(input_path)
+    return input_path
+
+
+def compare(results: list[dict[str, Any]], baseline_path: Path, tolerance: float):
+    baseline = {
+        (r["script"], r["transactions"], r["phase"]): cast(float, r["seconds"])
+        for r in cast(list[dict[str, Any]], json.loads(baseline_path.read_text()))
+    }
+    regressions = 0
+    for r in results:
+        before = baseline.get((r["script"], r["transactions"], r["phase"]))
+        seconds = cast(float, r["seconds"])
+        if before is None or max(before, seconds) < MIN_COMPARE_SECONDS:
+            continue
+        if seconds > before * (1 + tolerance):
+            regressions += 1
+            print(
+                f"REGRESSION {r['script']} {r['transactions']} {r['phase']}: {before:.2f}s -> {seconds:.2f}s"
+            )
+    if regressions:
+        msg = f"{regressions} phase(s) more than {tolerance:.0%} slower than {baseline_path}"
+        raise SystemExit(msg)
+
+
+def main(argv: list[str]):
+    parser = argparse.ArgumentParser()
+    _ = parser.add_argument(
+        "--sizes",
+        "-n",
+        type=int,
+        nargs="+",
+        default=SIZES,
+        help="Transaction counts to benchmark",
+    )
+    _ = parser.add_argument(
+        "--scripts", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS)
+    )
+    _ = parser.add_argument(
+        "--data-dir",
+        help="Where to generate (and keep) the synthetic inputs. Default a temporary directory",
+    )
+    _ = parser.add_argument("--save", help="Write the results to this JSON file")
+    _ = parser.add_argument("--baseline", help="Compare against results saved earlier")
+    _ = parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed slowdown of each phase against --baseline",
+    )
+    _ = parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        script, input_path, output_path = cast(list[str], args.child)
+        phases = BENCHMARKS[script](
+            Path(input_path), Path(output_path), synthetic_cutover()
+        )
+        print(json.dumps(phases))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(cast("str | None", args.data_dir) or tmp)
+        data_dir.mkdir(parents=True, exist_ok=True)
+        results: list[dict[str, Any]] = []
+        print(
+            f"{'script':<16} {'transactions':>12} {'phase':<16} {'seconds':>8} {'peak MB':>8}"
+        )
+        for transactions in cast(list[int], args.sizes):
+            input_path = synthetic_input(data_dir, transactions)
+            for script in cast(list[str], args.scripts):
+                output = subprocess.run(
+                    [
+                        sys.executable,
+                        __file__,
+                        "--child",
+                        script,
+                        str(input_path),
+                        str(Path(tmp) / "out.json"),
+                    ],
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                ).stdout
+                for p in cast(Phases, json.loads(output)):
+                    results.append(
+                        {"script": script, "transactions": transactions, **p}
+                    )
+                    print(
+                        f"{script:<16} {transactions:>12} {p['phase']:<16} {p['seconds']:>8.2f} {p['peak_mb']:>8.0f}"
+                    )
+
+    if args.save is not None:
+        _ = Path(cast(str, args.save)).write_text(json.dumps(results, indent=2))
+    if args.baseline is not None:
+        compare(results, Path(cast(str, args.baseline)), cast(float, args.tolerance))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,99 @@
+# Output bytes and write time of the pretty-printed dump against --compact,
+# each plain and compressed, on a synthetic budget or an export.  Checks that
+# the compact output holds exactly the importer's fields of the pretty one.
+
+import argparse
+import gzip
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, cast
+
+from budget_slice import load_budget, write_budget
+from compact import BUDGET_FIELDS, IMPORTER_FIELDS, MONTH_CATEGORY_FIELDS
+from synthetic import SyntheticConfig, write_synthetic
+
+
+def zstd_available() -> bool:
+    try:
+        from compression import zstd  # noqa: F401, PLC0415
+    except ImportError:
+        return False
+    return True
+
+
+def read_json(path: Path) -> Any:
+    if path.suffix == ".gz":
+        with gzip.open(path) as f:
+            return json.load(f)
+    if path.suffix == ".zst":
+        from compression import zstd  # noqa: PLC0415
+
+        with zstd.open(path) as f:
+            return json.load(f)
+    with path.open() as f:
+        return json.load(f)
+
+
+def project(budget: dict[str, Any]) -> dict[str, Any]:
+    """The importer's fields of a pretty-printed budget."""
+    projected = {k: budget[k] for k in BUDGET_FIELDS if k in budget}
+    for key, (_, names) in IMPORTER_FIELDS.items():
+        projected[key] = [
+            {n: e[n] for n in names if n in e} for e in budget.get(key) or []
+        ]
+    for m in projected["months"]:
+        m["categories"] = [
+            {n: c[n] for n in MONTH_CATEGORY_FIELDS if n in c} for c in m["categories"]
+        ]
+    return projected
+
+
+def main(argv: list[str]):
+    parser = argparse.ArgumentParser()
+    _ = parser.add_argument("--input", "-i", help="An export (default: synthetic)")
+    _ = parser.add_argument("--transactions", "-t", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.input is None:
+            input_path = Path(tmp) / "synthetic.json"
+            with input_path.open("w") as f:
+                write_synthetic(
+                    f, SyntheticConfig(transactions=cast(int, args.transactions))
+                )
+        else:
+            input_path = Path(cast(str, args.input))
+        budget_detail_response = load_budget(input_path)
+
+        suffixes = [".json", ".json.gz"] + ([".json.zst"] if zstd_available() else [])
+        cases = [(False, s) for s in suffixes[:2]] + [(True, s) for s in suffixes]
+        pretty_bytes = 0
+        pretty_seconds = 0.0
+        expected: dict[str, Any] | None = None
+        for compact, suffix in cases:
+            name = ("compact" if compact else "pretty") + suffix
+            output_path = Path(tmp) / f"out-{name}"
+            t0 = time.perf_counter()
+            write_budget(output_path, budget_detail_response, compact=compact)
+            elapsed = time.perf_counter() - t0
+            size = output_path.stat().st_size
+            pretty_bytes = pretty_bytes or size
+            pretty_seconds = pretty_seconds or elapsed
+            budget = cast(dict[str, Any], read_json(output_path)["data"]["budget"])
+            if not compact:
+                expected = expected or project(budget)
+                check = ""
+            else:
+                check = ", same fields" if budget == expected else ", DIFFERENT"
+            print(
+                f"{name:18} {size:>12} bytes ({size / pretty_bytes:6.1%})"
+                f" {elapsed:6.2f}s ({elapsed / pretty_seconds:6.1%}){check}"
+            )
+            output_path.unlink()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
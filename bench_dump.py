@@ -0,0 +1,53 @@
+# Time write_budget with 1..N workers on a synthetic budget and check that
+# every worker count produces the same bytes.
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import cast
+
+from budget_slice import load_budget, write_budget
+from synthetic import SyntheticConfig, write_synthetic
+
+
+def main(argv: list[str]):
+    parser = argparse.ArgumentParser()
+    _ = parser.add_argument("--transactions", "-t", type=int, default=1_000_000)
+    _ = parser.add_argument(
+        "--workers", "-w", type=int, default=os.cpu_count() or 1, help="Maximum workers"
+    )
+    args = parser.parse_args(argv)
+    transaction_count = cast(int, args.transactions)
+    max_workers = cast(int, args.workers)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        input_path = Path(tmp) / "synthetic.json"
+        with input_path.open("w") as f:
+            write_synthetic(f, SyntheticConfig(transactions=transaction_count))
+        budget_detail_response = load_budget(input_path)
+        print(
+            f"built {transaction_count} transactions in {time.perf_counter() - t0:.1f}s"
+        )
+        baseline: bytes | None = None
+        serial = 0.0
+        for workers in range(1, max_workers + 1):
+            output_path = Path(tmp) / f"out-{workers}.json"
+            t0 = time.perf_counter()
+            write_budget(output_path, budget_detail_response, workers)
+            elapsed = time.perf_counter() - t0
+            serial = serial or elapsed
+            output = output_path.read_bytes()
+            baseline = baseline or output
+            same = "same" if output == baseline else "DIFFERENT"
+            print(
+                f"workers={workers}: {elapsed:.2f}s ({serial / elapsed:.1f}x), {len(output)} bytes, {same}"
+            )
+            output_path.unlink()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,66 @@
+# Time and peak memory of loading an export with each available parser, and
+# of the --stream load into a TransactionStore, each in a fresh process.
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import cast
+
+from budget_json import available_parsers
+from budget_slice import load_budget, load_budget_skeleton
+from columnar import TransactionStore
+
+
+STREAM = "stream"
+
+
+def measure(input_path: Path, parser: str) -> dict[str, float]:
+    t0 = time.perf_counter()
+    if parser == STREAM:
+        _, records = load_budget_skeleton(input_path)
+        _ = TransactionStore.load(records("transactions"), records("subtransactions"))
+    else:
+        _ = load_budget(input_path, parser)
+    elapsed = time.perf_counter() - t0
+    # ru_maxrss is in KiB on Linux.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"seconds": elapsed, "peak_mb": peak}
+
+
+def main(argv: list[str]):
+    parser = argparse.ArgumentParser()
+    _ = parser.add_argument("--input", "-i", default="ynab-json/budget-in.json")
+    _ = parser.add_argument(
+        "--parser",
+        "-p",
+        action="append",
+        choices=[*available_parsers(), STREAM],
+        help="Parser to measure; repeat for several. Default all",
+    )
+    _ = parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    input_path = Path(cast(str, args.input))
+    parsers = cast("list[str] | None", args.parser) or [*available_parsers(), STREAM]
+
+    if cast(bool, args.child):
+        print(json.dumps(measure(input_path, parsers[0])))
+        return
+
+    print(f"{input_path}: {input_path.stat().st_size / (1 << 20):.0f} MB")
+    for p in parsers:
+        result = subprocess.run(
+            [sys.executable, __file__, "--child", "-i", str(input_path), "-p", p],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        m = cast(dict[str, float], json.loads(result.stdout))
+        print(f"{p:>10}: {m['seconds']:6.2f}s  peak {m['peak_mb']:6.0f} MB")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,273 @@
+# Time the whole path from export to Actual on synthetic budgets of growing
+# size: example.py --compact slices each budget, then src/import.ts (built
+# to dist/import.js with `yarn build`) imports the slice with --local, into a
+# new budget in a scratch data directory, so no Actual server is needed.
+#
+# Each half runs in a process of its own, timed as a whole with wait4.
+# example.py runs with --no-cache, so every size parses its export, and again
+# with --profile for its phases (peak traced memory), reported as a script of
+# their own since tracing slows them down.  Importer stages come from
+# import.ts --timings (peak RSS).  The report fits each phase's time against
+# transactions on a log-log scale: an exponent past --max-exponent is
+# super-linear and fails the run, as does any phase more than --tolerance
+# slower than --baseline.
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from math import log
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, cast
+
+from bench import MIN_COMPARE_SECONDS, compare, synthetic_cutover, synthetic_input
+
+
+if TYPE_CHECKING:
+    from bench import Phases
+
+
+SIZES = [5_000, 20_000, 80_000]
+HERE = Path(__file__).parent
+SLICER = "example.py"
+PROFILED = f"{SLICER} --profile"
+IMPORTER = "import.ts"
+# Of a failed run's output, in its error.
+_MAX_LOG = 4000
+
+
+def run_timed(args: list[str], log_path: Path) -> dict[str, Any]:
+    """Run `args` with output to `log_path`, as a "process" phase: its wall
+    time and peak RSS."""
+    with log_path.open("w") as log_file:
+        t0 = time.perf_counter()
+        p = subprocess.Popen(args, stdout=log_file, stderr=subprocess.STDOUT, cwd=HERE)
+        _, status, rusage = os.wait4(p.pid, 0)
+        seconds = time.perf_counter() - t0
+    p.returncode = os.waitstatus_to_exitcode(status)
+    if p.returncode != 0:
+        msg = f"{' '.join(args)} exited with {p.returncode}:\n{log_path.read_text()[-_MAX_LOG:]}"
+        raise RuntimeError(msg)
+    # ru_maxrss is in KiB on Linux.
+    return {"phase": "process", "seconds": seconds, "peak_mb": rusage.ru_maxrss / 1024}
+
+
+def trace_phases(trace_path: Path) -> Phases:
+    """Top level phases of a profiling trace."""
+    phases: Phases = []
+    end = 0.0
+    for e in cast(
+        list[dict[str, Any]], json.loads(trace_path.read_text())["traceEvents"]
+    ):
+        if e["ph"] != "X" or e["ts"] < end:
+            continue
+        end = cast(float, e["ts"]) + cast(float, e["dur"])
+        phases.append(
+            {
+                "phase": e["name"],
+                "seconds": cast(float, e["dur"]) / 1e6,
+                "peak_mb": cast(int, e["args"]["peak_bytes"]) / (1 << 20),
+            }
+        )
+    return phases
+
+
+def slicer_args(input_path: Path, sliced_path: Path) -> list[str]:
+    return [
+        sys.executable,
+        str(HERE / SLICER),
+        "--input",
+        str(input_path),
+        "--output",
+        str(sliced_path),
+        "--start",
+        synthetic_cutover().isoformat(),
+        "--compact",
+        "--no-cache",
+    ]
+
+
+def run_slicer(input_path: Path, sliced_path: Path, work_dir: Path) -> Phases:
+    return [run_timed(slicer_args(input_path, sliced_path), work_dir / "slice.log")]
+
+
+def profile_slicer(input_path: Path, sliced_path: Path, work_dir: Path) -> Phases:
+    """run_slicer's phases, from a second run with --profile."""
+    trace_path = work_dir / "trace.json"
+    _ = run_timed(
+        [
+            *slicer_args(input_path, sliced_path),
+            "--profile",
+            "--profile-trace",
+            str(trace_path),
+        ],
+        work_dir / "profile.log",
+    )
+    return trace_phases(trace_path)
+
+
+def run_importer(
+    node: str, importer: Path, sliced_path: Path, work_dir: Path
+) -> Phases:
+    timings_path = work_dir / "timings.json"
+    data_dir = work_dir / "actual"
+    # A new budget each time.
+    shutil.rmtree(data_dir, ignore_errors=True)
+    process = run_timed(
+        [
+            node,
+            str(importer),
+            "--budget",
+            "bench",
+            "--file",
+            str(sliced_path),
+            "--local",
+            str(data_dir),
+            "--timings",
+            str(timings_path),
+        ],
+        work_dir / "import.log",
+    )
+    return [*cast("Phases", json.loads(timings_path.read_text())), process]
+
+
+def exponent(points: list[tuple[int, float]]) -> float | None:
+    """Slope of log(seconds) against log(transactions) between the two
+    largest sizes long enough to time, where fixed costs matter least."""
+    points = sorted((n, s) for n, s in points if s >= MIN_COMPARE_SECONDS)
+    if len(points) < 2:
+        return None
+    (n0, s0), (n1, s1) = points[-2:]
+    return log(s1 / s0) / log(n1 / n0)
+
+
+def report_scaling(results: list[dict[str, Any]], max_exponent: float) -> int:
+    """Print each phase's time per size and its exponent; the number of
+    phases past `max_exponent`."""
+    sizes = sorted({cast(int, r["transactions"]) for r in results})
+    curves: dict[tuple[str, str], list[tuple[int, float]]] = {}
+    for r in results:
+        curves.setdefault((r["script"], r["phase"]), []).append(
+            (r["transactions"], r["seconds"])
+        )
+    print()
+    print(
+        f"{'script':<20} {'phase':<16}"
+        + "".join(f" {n:>10}" for n in sizes)
+        + f" {'exponent':>9}"
+    )
+    superlinear = 0
+    for (script, phase), points in curves.items():
+        seconds = dict(points)
+        k = exponent(points)
+        flag = ""
+        if k is not None and k > max_exponent:
+            superlinear += 1
+            flag = "  SUPER-LINEAR"
+        print(
+            f"{script:<20} {phase:<16}"
+            + "".join(
+                f" {seconds[n]:>9.2f}s" if n in seconds else f" {'':>10}" for n in sizes
+            )
+            + (f" {k:>9.2f}" if k is not None else f" {'-':>9}")
+            + flag
+        )
+    return superlinear
+
+
+def main(argv: list[str]):
+    parser = argparse.ArgumentParser(
+        description="Time slicing and importing synthetic budgets of growing size"
+    )
+    _ = parser.add_argument(
+        "--sizes",
+        "-n",
+        type=int,
+        nargs="+",
+        default=SIZES,
+        help="Transaction counts to benchmark",
+    )
+    _ = parser.add_argument(
+        "--data-dir",
+        help="Where to generate (and keep) the synthetic inputs. Default a temporary directory",
+    )
+    _ = parser.add_argument(
+        "--importer",
+        default=str(HERE / "dist" / "import.js"),
+        help="The built importer",
+    )
+    _ = parser.add_argument("--node", default="node")
+    _ = parser.add_argument(
+        "--no-import", action="store_true", help="Only time the Python half"
+    )
+    _ = parser.add_argument("--save", help="Write the results to this JSON file")
+    _ = parser.add_argument("--baseline", help="Compare against results saved earlier")
+    _ = parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed slowdown of each phase against --baseline",
+    )
+    _ = parser.add_argument(
+        "--max-exponent",
+        type=float,
+        default=1.3,
+        help="Allowed growth of each phase's time, as the power of transactions",
+    )
+    args = parser.parse_args(argv)
+    importer = None if args.no_import else Path(cast(str, args.importer))
+    if importer is not None and not importer.exists():
+        msg = f"No {importer}; build it with `yarn build`, or pass --no-import"
+        raise RuntimeError(msg)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        data_dir = Path(cast("str | None", args.data_dir) or tmp)
+        data_dir.mkdir(parents=True, exist_ok=True)
+        results: list[dict[str, Any]] = []
+        print(
+            f"{'script':<20} {'transactions':>12} {'phase':<16} {'seconds':>8} {'peak MB':>8}"
+        )
+        for transactions in cast(list[int], args.sizes):
+            input_path = synthetic_input(data_dir, transactions)
+            sliced_path = work_dir / "sliced.json"
+            runs = [
+                (SLICER, run_slicer(input_path, sliced_path, work_dir)),
+                (PROFILED, profile_slicer(input_path, sliced_path, work_dir)),
+            ]
+            if importer is not None:
+                runs.append(
+                    (
+                        IMPORTER,
+                        run_importer(
+                            cast(str, args.node), importer, sliced_path, work_dir
+                        ),
+                    )
+                )
+            for script, phases in runs:
+                for p in phases:
+                    results.append(
+                        {"script": script, "transactions": transactions, **p}
+                    )
+                    print(
+                        f"{script:<20} {transactions:>12} {p['phase']:<16} {p['seconds']:>8.2f} {p['peak_mb']:>8.0f}"
+                    )
+        superlinear = report_scaling(results, cast(float, args.max_exponent))
+
+    if args.save is not None:
+        _ = Path(cast(str, args.save)).write_text(json.dumps(results, indent=2))
+    if args.baseline is not None:
+        compare(results, Path(cast(str, args.baseline)), cast(float, args.tolerance))
+    if superlinear:
+        msg = (
+            f"{superlinear} phase(s) grow faster than transactions^{args.max_exponent}"
+        )
+        raise SystemExit(msg)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
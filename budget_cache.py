@@ -0,0 +1,111 @@
+# On-disk cache of parsed, validated budgets, so repeated runs against the same
+# export skip json.load and BudgetDetailResponse.from_dict.
+#
+# Entries are pickles named by the SHA-256 of the export.  index.json maps
+# each export path to the size, mtime and hash it had when last read, so an
+# unchanged file isn't even rehashed; a changed one is, and an edit that
+# leaves the content as it was still hits.  Least recently used entries are
+# evicted once the cache grows past max_bytes.
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, cast
+
+import profiling
+from budget_json import gc_paused
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+DEFAULT_MAX_BYTES = 2 << 30
+
+
+def default_cache_dir() -> Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "ynab-to-actual"
+
+
+class BudgetCache:
+    def __init__(
+        self,
+        directory: Path | None = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        suffix: str = ".pickle",
+    ):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._index_path = self.directory / "index.json"
+
+    def load[T](self, input_path: Path, parse: Callable[[Path], T]) -> T:
+        """parse(input_path), or the cached result of an earlier call on a
+        file with the same content."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with profiling.phase("hash"):
+            entry_path = self.entry_path(input_path)
+        try:
+            with profiling.phase("unpickle"), entry_path.open("rb") as f, gc_paused():
+                value = cast(T, pickle.load(f))  # noqa: S301
+            os.utime(entry_path)
+            return value
+        except FileNotFoundError:
+            pass
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            # Truncated, or written by an incompatible version of ynab.
+            print(f"Ignoring cache entry {entry_path}: {e!r}")
+
+        value = parse(input_path)
+        with profiling.phase("pickle"):
+            self._write(entry_path, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+            self.evict()
+        return value
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = sorted(
+            (p.stat().st_mtime_ns, p.stat().st_size, p)
+            for p in self.directory.glob(f"*{self.suffix}")
+        )
+        total = sum(size for _, size, _ in entries)
+        # Always keep the newest entry, even if it alone is over the limit.
+        for _, size, p in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+
+    def entry_path(self, input_path: Path) -> Path:
+        """Where the entry for the current content of `input_path` goes."""
+        return self.directory / f"{self.digest(input_path)}{self.suffix}"
+
+    def digest(self, input_path: Path) -> str:
+        st = input_path.stat()
+        key = str(input_path.resolve())
+        try:
+            index = cast(
+                dict[str, list[int | str]], json.loads(self._index_path.read_text())
+            )
+        except FileNotFoundError, ValueError:
+            index = {}
+        known = index.get(key)
+        if known is not None and known[:2] == [st.st_size, st.st_mtime_ns]:
+            return cast(str, known[2])
+        with input_path.open("rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+        index[key] = [st.st_size, st.st_mtime_ns, digest]
+        self._write(self._index_path, json.dumps(index, indent=2).encode())
+        return digest
+
+    def _write(self, path: Path, data: bytes):
+        # Write and rename, so a concurrent or interrupted run never sees a
+        # partial file.
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            _ = f.write(data)
+        _ = Path(tmp).replace(path)
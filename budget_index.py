@@ -0,0 +1,133 @@
+# Lookups into a loaded budget, built once: entities by id, ids by name, and
+# each account's transactions as a range of one sorted order.
+
+import re
+from collections import defaultdict
+from fnmatch import fnmatchcase
+from functools import cached_property
+from typing import TYPE_CHECKING, cast
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+
+    from ynab import Account, BudgetDetail, Category, Payee, TransactionSummary
+
+    from budget_slice import Id
+
+
+# Account selectors with these are patterns rather than names.
+_GLOB_CHARS = re.compile(r"[*?\[]")
+REGEX_PREFIX = "re:"
+
+
+def _key(i: Id) -> str:
+    # Depending on the ynab version ids are UUIDs or strings.
+    return str(i)
+
+
+class _Named[T: (Account, Payee, Category)]:
+    # Entities by id and ids by name, in budget order.  Names can repeat.
+    def __init__(self, entities: Iterable[T]):
+        self.by_id: dict[str, T] = {}
+        self.position: dict[str, int] = {}
+        self.ids_by_name: defaultdict[str, list[Id]] = defaultdict(list)
+        for i, e in enumerate(entities):
+            self.by_id[_key(e.id)] = e
+            self.position[_key(e.id)] = i
+            self.ids_by_name[e.name].append(e.id)
+
+    def __getitem__(self, i: Id) -> T:
+        return self.by_id[_key(i)]
+
+    def ids(self) -> list[Id]:
+        return [e.id for e in self.by_id.values()]
+
+    def named(self, name: str) -> list[Id]:
+        return self.ids_by_name.get(name, [])
+
+    def in_order(self, ids: Iterable[Id]) -> list[T]:
+        """The entities with these ids, in budget order; unknown ids are
+        ignored."""
+        known = {k for k in map(_key, ids) if k in self.by_id}
+        return [self.by_id[k] for k in sorted(known, key=self.position.__getitem__)]
+
+
+class BudgetIndex:
+    def __init__(self, budget: BudgetDetail):
+        self.budget = budget
+        self.accounts = _Named(cast(list["Account"], budget.accounts))
+        self.payees = _Named(cast(list["Payee"], budget.payees))
+        self.categories = _Named(cast(list["Category"], budget.categories))
+
+    def select_accounts(self, selectors: Iterable[str]) -> set[Id]:
+        """Ids of the accounts named by `selectors`: exact names, globs
+        (fnmatch, case-sensitive) or regexes prefixed with "re:".  A selector
+        that is an account's exact name only selects that name, even if it
+        has glob characters, as in "Savings [Joint]".
+
+        Every selector has to match at least one account."""
+        ids: set[Id] = set()
+        missing: list[str] = []
+        names = self.accounts.ids_by_name
+        for selector in selectors:
+            if selector.startswith(REGEX_PREFIX):
+                pattern = re.compile(selector.removeprefix(REGEX_PREFIX))
+                matched = [n for n in names if pattern.fullmatch(n)]
+            elif selector in names:
+                matched = [selector]
+            elif _GLOB_CHARS.search(selector):
+                matched = [n for n in names if fnmatchcase(n, selector)]
+            else:
+                matched = []
+            if not matched:
+                missing.append(selector)
+            for n in matched:
+                ids.update(names[n])
+        if missing:
+            message = f"No such account(s): {missing}"
+            raise RuntimeError(message)
+        return ids
+
+    def fake_payee_id(self) -> Id:
+        fake_payee_ids = self.payees.named("Fake")
+        if len(fake_payee_ids) != 1:
+            msg = f"Wrong number of Fake payees {len(fake_payee_ids)}"
+            raise RuntimeError(msg)
+        return fake_payee_ids[0]
+
+    def inflow_category_id(self) -> Id:
+        inflow_category_ids = self.categories.named("Inflow: Ready to Assign")
+        if len(inflow_category_ids) != 1:
+            msg = f"Wrong number of inflow categories {len(inflow_category_ids)}"
+            raise RuntimeError(msg)
+        return inflow_category_ids[0]
+
+    @cached_property
+    def transaction_order(self) -> list[int]:
+        """Positions in budget.transactions, sorted by account and then date
+        (ties in list order)."""
+        transactions = cast(list["TransactionSummary"], self.budget.transactions)
+        return sorted(
+            range(len(transactions)),
+            key=lambda i: (transactions[i].account_id, transactions[i].var_date),
+        )
+
+    @cached_property
+    def transaction_ranges(self) -> dict[Id, range]:
+        """Each account's run of transaction_order."""
+        transactions = cast(list["TransactionSummary"], self.budget.transactions)
+        ranges: dict[Id, range] = {}
+        start = 0
+        order = self.transaction_order
+        for end in range(1, len(order) + 1):
+            account_id = transactions[order[start]].account_id
+            if end == len(order) or transactions[order[end]].account_id != account_id:
+                ranges[account_id] = range(start, end)
+                start = end
+        return ranges
+
+    def account_transactions(self, account_id: Id) -> Sequence[int]:
+        """Positions of one account's transactions, by date."""
+        r = self.transaction_ranges.get(account_id, range(0))
+        return self.transaction_order[r.start : r.stop]
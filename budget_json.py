@@ -0,0 +1,134 @@
+# Parsers from an export file to a BudgetDetailResponse, selected by name:
+#
+#   json      json.load and from_dict, as the scripts always did
+#   orjson    orjson.loads straight from an mmap of the file, then from_dict
+#   pydantic  pydantic-core's JSON parser builds the models directly, with
+#             no intermediate dict tree
+#
+# All give the same models; bench_parse.py compares their time and memory.
+
+import gc
+import json
+import mmap
+from contextlib import contextmanager
+from importlib.util import find_spec
+from typing import TYPE_CHECKING, Any, cast
+
+import profiling
+from compact import is_compressed, open_input
+from lazy import lazy_import
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+    from pathlib import Path
+
+    from pydantic import BaseModel
+    from ynab import BudgetDetailResponse
+
+if TYPE_CHECKING:
+    import ynab
+else:
+    ynab = lazy_import("ynab")
+
+
+@contextmanager
+def gc_paused() -> Iterator[None]:
+    """Parsing allocates millions of small objects that all survive;
+    collecting in the middle of it only costs time."""
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.enable()
+
+
+def _from_dict(doc: Any) -> BudgetDetailResponse:
+    budget_detail_response = ynab.BudgetDetailResponse.from_dict(doc)  # pyright: ignore[reportAny]
+    if budget_detail_response is None:
+        msg = "Bad JSON"
+        raise RuntimeError(msg)
+    return budget_detail_response
+
+
+def parse_json(input_path: Path) -> BudgetDetailResponse:
+    with profiling.phase("json.load"), open_input(input_path) as f:
+        doc = json.load(f)  # pyright: ignore[reportAny]
+    with profiling.phase("from_dict"):
+        return _from_dict(doc)
+
+
+def parse_orjson(input_path: Path) -> BudgetDetailResponse:
+    import orjson  # noqa: PLC0415
+
+    if is_compressed(input_path):
+        with profiling.phase("orjson.loads"), open_input(input_path) as f:
+            doc = orjson.loads(f.read())  # pyright: ignore[reportAny]
+        with profiling.phase("from_dict"):
+            return _from_dict(doc)
+    with (
+        profiling.phase("orjson.loads"),
+        input_path.open("rb") as f,
+        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m,
+        memoryview(m) as buf,
+    ):
+        doc = orjson.loads(buf)  # pyright: ignore[reportAny]
+    with profiling.phase("from_dict"):
+        return _from_dict(doc)
+
+
+def _mark_all_fields_set(value: object):
+    # from_dict passes every field, present in the file or not, so dumping
+    # with exclude_unset writes missing ones as null.  Do the same.
+    # Any pydantic model, without importing pydantic for isinstance.
+    if hasattr(value, "__pydantic_fields_set__"):
+        model = cast("BaseModel", value)
+        model.__pydantic_fields_set__.update(type(model).model_fields)
+        for v in model.__dict__.values():  # pyright: ignore[reportAny]
+            _mark_all_fields_set(v)
+    elif isinstance(value, list):
+        for v in cast(list[object], value):
+            _mark_all_fields_set(v)
+
+
+def parse_pydantic(input_path: Path) -> BudgetDetailResponse:
+    # validate_json wants bytes, so this one copies the file once.
+    with profiling.phase("validate_json"), open_input(input_path) as f:
+        budget_detail_response = ynab.BudgetDetailResponse.model_validate_json(f.read())
+    with profiling.phase("mark fields set"):
+        _mark_all_fields_set(budget_detail_response)
+    return budget_detail_response
+
+
+PARSERS: dict[str, Callable[[Path], BudgetDetailResponse]] = {
+    "json": parse_json,
+    "orjson": parse_orjson,
+    "pydantic": parse_pydantic,
+}
+
+
+def available_parsers() -> list[str]:
+    return [name for name in PARSERS if name != "orjson" or find_spec("orjson")]
+
+
+DEFAULT_PARSER = "orjson" if find_spec("orjson") else "json"
+
+
+def parse(input_path: Path, parser: str = DEFAULT_PARSER) -> BudgetDetailResponse:
+    with gc_paused():
+        return PARSERS[parser](input_path)
+
+
+def parse_bytes(data: bytes) -> BudgetDetailResponse:
+    """A budget from JSON already in memory, such as an API response body."""
+    with gc_paused():
+        if DEFAULT_PARSER == "orjson":
+            import orjson  # noqa: PLC0415
+
+            with profiling.phase("orjson.loads"):
+                doc = orjson.loads(data)  # pyright: ignore[reportAny]
+        else:
+            with profiling.phase("json.loads"):
+                doc = json.loads(data)  # pyright: ignore[reportAny]
+        with profiling.phase("from_dict"):
+            return _from_dict(doc)
@@ -0,0 +1,555 @@
+# Loading and slicing shared by example.py (everything from a start date on,
+# plus balance forward transactions) and inverse-example.py (everything up to
+# an end date).
+
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from operator import itemgetter
+from typing import TYPE_CHECKING, Any, cast
+from uuid import uuid4
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Collection, Iterable, Iterator, Mapping
+    from pathlib import Path
+    from uuid import UUID
+
+    from pydantic import BaseModel
+    from ynab import (
+        BudgetDetail,
+        BudgetDetailResponse,
+        Category,
+        MonthDetail,
+        SubTransaction,
+        TransactionSummary,
+    )
+
+    from budget_index import BudgetIndex
+    from rollup import BalanceForward
+
+import budget_json
+import jsonstream
+from compact import MONTH_CATEGORY_FIELDS, open_output, write_compact
+from lazy import lazy_import
+
+
+if TYPE_CHECKING:
+    import ynab
+else:
+    ynab = lazy_import("ynab")
+
+
+# The arrays that grow with the budget's history: left on disk by
+# load_budget_skeleton and dumped on a process pool by write_budget.
+LARGE_ARRAYS = ("months", "transactions", "subtransactions")
+
+# Ids are UUIDs on models and plain strings on streamed records.
+type Id = UUID | str
+
+
+def load_budget(
+    input_path: Path, parser: str = budget_json.DEFAULT_PARSER
+) -> BudgetDetailResponse:
+    budget_detail_response = budget_json.parse(input_path, parser)
+    check_key_fields(budget_detail_response.data.budget)
+    return budget_detail_response
+
+
+@dataclass
+class StreamedArrays:
+    """The LARGE_ARRAYS of an export, read back from the file a record at a
+    time each time one is iterated."""
+
+    input_path: Path
+    offsets: dict[str, int]
+
+    def __call__(self, key: str) -> Iterator[dict[str, Any]]:
+        return jsonstream.iter_array(self.input_path, self.offsets[key])
+
+    def months(self, keep: Callable[[date], bool]) -> Iterator[tuple[date, Any]]:
+        """(month, record) for each month, with None for the record of months
+        not kept.  Those are skipped without decoding their categories."""
+        for month, record in jsonstream.iter_array_where(
+            self.input_path,
+            self.offsets["months"],
+            "month",
+            lambda m: keep(date.fromisoformat(cast(str, m))),
+        ):
+            yield date.fromisoformat(cast(str, month)), record
+
+    def month(self, month: date) -> dict[str, Any] | None:
+        """The record of one month, if there is one."""
+        for _, record in self.months(lambda m: m == month):
+            if record is not None:
+                return cast(dict[str, Any], record)
+        return None
+
+
+def load_budget_skeleton(
+    input_path: Path,
+) -> tuple[BudgetDetailResponse, StreamedArrays]:
+    """Like load_budget, but the LARGE_ARRAYS are left empty, to be read with
+    the StreamedArrays."""
+    doc, offsets = jsonstream.scan_budget(input_path, LARGE_ARRAYS)
+    budget_detail_response = ynab.BudgetDetailResponse.from_dict(doc)
+    if budget_detail_response is None:
+        msg = "Bad JSON"
+        raise RuntimeError(msg)
+    check_key_fields(budget_detail_response.data.budget)
+    return budget_detail_response, StreamedArrays(input_path, offsets)
+
+
+def write_budget(
+    output_path: Path,
+    budget_detail_response: BudgetDetailResponse,
+    workers: int = 1,
+    compact: bool = False,
+):
+    if compact:
+        with open_output(output_path) as f:
+            write_compact(f, budget_detail_response.data.budget)
+        return
+    if workers <= 1:
+        with open_output(output_path) as f:
+            _ = f.write(
+                budget_detail_response.model_dump_json(
+                    by_alias=True, exclude_unset=True, indent=2
+                )
+            )
+        return
+    budget = budget_detail_response.data.budget
+    arrays = {
+        key: cast(list["BaseModel"], getattr(budget, key))
+        for key in LARGE_ARRAYS
+        if getattr(budget, key) is not None
+    }
+    skeleton = with_budget(
+        budget_detail_response, budget.model_copy(update={key: [] for key in arrays})
+    )
+    with open_output(output_path) as f:
+        jsonstream.write_model(f, skeleton, arrays, workers=workers)
+
+
+def check_key_fields(budget: BudgetDetail):
+    if (
+        budget.first_month is None
+        or budget.last_month is None
+        or budget.accounts is None
+        or budget.payees is None
+        or budget.payee_locations is None
+        or budget.category_groups is None
+        or budget.categories is None
+        or budget.months is None
+        or budget.transactions is None
+        or budget.subtransactions is None
+        or budget.scheduled_transactions is None
+        or budget.scheduled_subtransactions is None
+    ):
+        msg = "budget is missing key fields"
+        raise RuntimeError(msg)
+
+
+def parse_account_names(arg: str) -> set[str]:
+    return set([a.strip() for a in arg.split(",") if a])
+
+
+def keep_account_ids(
+    index: BudgetIndex, target_account_names: set[str], exclude_account_names: set[str]
+) -> set[Id]:
+    """Accounts example.py keeps whole for --accounts / --exclude."""
+    target_accounts = index.select_accounts(target_account_names)
+    exclude_accounts = index.select_accounts(exclude_account_names)
+    if not target_accounts:
+        return exclude_accounts
+    return set(index.accounts.ids()) - target_accounts
+
+
+def balance_forward_transaction(
+    account_id: Id, amount: int, start: date, fake_payee_id: Id, inflow_category_id: Id
+) -> TransactionSummary:
+    return ynab.TransactionSummary(
+        id=str(uuid4()),
+        date=start - timedelta(days=1),
+        amount=amount,
+        cleared=ynab.TransactionClearedStatus.RECONCILED,
+        approved=True,
+        account_id=account_id,
+        deleted=False,
+        payee_id=fake_payee_id,
+        category_id=inflow_category_id,
+        memo="Balance forward",
+    )
+
+
+def mark_unapproved(t: TransactionSummary, unapproved_prefix: str):
+    if not t.approved:
+        orig_memo = (t.memo or "").strip()
+        t.memo = f"{unapproved_prefix}{f' {orig_memo}' if orig_memo else ''}"
+
+
+def with_unapproved_prefix(
+    t: TransactionSummary, unapproved_prefix: str
+) -> TransactionSummary:
+    t = t.model_copy()
+    mark_unapproved(t, unapproved_prefix)
+    return t
+
+
+@dataclass(frozen=True)
+class SliceRule:
+    """Which transactions a slice keeps.
+
+    Accounts in `never` are dropped, accounts in `always` are kept whole, and
+    everything else is kept when its date is within [start, end]."""
+
+    start: date | None = None
+    end: date | None = None
+    always: Collection[Id] = ()
+    never: Collection[Id] = ()
+
+    def keeps(self, account_id: Id, var_date: date) -> bool:
+        if account_id in self.never:
+            return False
+        if account_id in self.always:
+            return True
+        return self.in_range(var_date)
+
+    def in_range(self, d: date) -> bool:
+        return (self.start is None or d >= self.start) and (
+            self.end is None or d <= self.end
+        )
+
+
+@dataclass
+class BudgetSlice:
+    """Everything the scripts need to know about a slice, accumulated in one
+    pass over transactions and one over subtransactions."""
+
+    rule: SliceRule
+    transaction_ids: set[str] = field(default_factory=set)
+    payee_ids: set[Id] = field(default_factory=set)
+    # Per account, over all transactions.
+    transaction_counts: defaultdict[Id, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    latest: defaultdict[Id, date] = field(
+        default_factory=lambda: defaultdict(lambda: date.min)
+    )
+    # Per account, over kept / dropped transactions.
+    kept_counts: defaultdict[Id, int] = field(default_factory=lambda: defaultdict(int))
+    dropped_amounts: defaultdict[Id, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    subtransaction_count: int = 0
+    kept_subtransaction_count: int = 0
+
+    def add_transaction(
+        self,
+        t_id: str,
+        account_id: Id,
+        var_date: date,
+        amount: int,
+        payee_id: Id | None,
+    ) -> bool:
+        self.transaction_counts[account_id] += 1
+        if var_date > self.latest[account_id]:
+            self.latest[account_id] = var_date
+        if not self.rule.keeps(account_id, var_date):
+            self.dropped_amounts[account_id] += amount
+            return False
+        self.transaction_ids.add(t_id)
+        self.kept_counts[account_id] += 1
+        if payee_id is not None:
+            self.payee_ids.add(payee_id)
+        return True
+
+    def add_subtransaction(self, transaction_id: str, payee_id: Id | None) -> bool:
+        self.subtransaction_count += 1
+        if transaction_id not in self.transaction_ids:
+            return False
+        self.kept_subtransaction_count += 1
+        if payee_id is not None:
+            self.payee_ids.add(payee_id)
+        return True
+
+    @property
+    def transaction_count(self) -> int:
+        return sum(self.transaction_counts.values())
+
+    @property
+    def kept_transaction_count(self) -> int:
+        return sum(self.kept_counts.values())
+
+    def kept_account_ids(self) -> list[Id]:
+        """Accounts with at least one kept transaction."""
+        return [a for a, n in self.kept_counts.items() if n > 0]
+
+
+def slice_transactions(
+    rule: SliceRule,
+    transactions: Iterable[TransactionSummary],
+    subtransactions: Iterable[SubTransaction],
+) -> tuple[BudgetSlice, list[TransactionSummary], list[SubTransaction]]:
+    s = BudgetSlice(rule)
+    kept_transactions = [
+        t
+        for t in transactions
+        if s.add_transaction(t.id, t.account_id, t.var_date, t.amount, t.payee_id)
+    ]
+    kept_subtransactions = [
+        st
+        for st in subtransactions
+        if s.add_subtransaction(st.transaction_id, st.payee_id)
+    ]
+    return s, kept_transactions, kept_subtransactions
+
+
+def slice_months(rule: SliceRule, months: Iterable[MonthDetail]) -> list[MonthDetail]:
+    return [m for m in months if rule.in_range(m.month)]
+
+
+def prune_month(m: MonthDetail) -> MonthDetail:
+    """`m` with only the MONTH_CATEGORY_FIELDS of its categories."""
+    categories = [
+        ynab.Category.model_construct(
+            _fields_set=set(MONTH_CATEGORY_FIELDS),
+            **{name: getattr(c, name) for name in MONTH_CATEGORY_FIELDS},  # pyright: ignore[reportAny]
+        )
+        for c in cast(list["Category"], m.categories)
+    ]
+    return m.model_copy(update={"categories": categories})
+
+
+class _AccountIndex:
+    # One account's transactions sorted by date, with prefix sums of amounts
+    # and prefix/suffix minima of list positions so the amount and first
+    # position of any dropped head/tail is O(1).
+    def __init__(self, transactions: list[TransactionSummary], positions: list[int]):
+        self.positions = positions
+        self.dates = [transactions[i].var_date for i in positions]
+        self.amount_sums = [0]
+        for i in positions:
+            self.amount_sums.append(self.amount_sums[-1] + transactions[i].amount)
+        self.head_min = [len(transactions)]
+        for i in positions:
+            self.head_min.append(min(self.head_min[-1], i))
+        self.tail_min = [len(transactions)]
+        for i in reversed(positions):
+            self.tail_min.append(min(self.tail_min[-1], i))
+        self.tail_min.reverse()
+
+    def bounds(self, rule: SliceRule) -> tuple[int, int]:
+        lo = 0 if rule.start is None else bisect_left(self.dates, rule.start)
+        hi = len(self.dates) if rule.end is None else bisect_right(self.dates, rule.end)
+        return lo, hi
+
+
+class TransactionIndex:
+    """Transactions sorted by date, overall and per account, for cutting many
+    slices out of one budget.
+
+    slice() gives the same result as slice_transactions, at a cost that
+    depends on the size of the slice rather than of the budget."""
+
+    def __init__(self, index: BudgetIndex):
+        transactions = cast(list["TransactionSummary"], index.budget.transactions)
+        subtransactions = cast(list["SubTransaction"], index.budget.subtransactions)
+        self.transactions = transactions
+        self.subtransactions = subtransactions
+        self.order = sorted(
+            range(len(transactions)), key=lambda i: transactions[i].var_date
+        )
+        self.dates = [transactions[i].var_date for i in self.order]
+        self.totals = BudgetSlice(SliceRule())
+        for t in transactions:
+            _ = self.totals.add_transaction(
+                t.id, t.account_id, t.var_date, t.amount, t.payee_id
+            )
+        self.accounts = {
+            a_id: _AccountIndex(transactions, list(index.account_transactions(a_id)))
+            for a_id in index.transaction_ranges
+        }
+        self.children: defaultdict[str, list[int]] = defaultdict(list)
+        for j, st in enumerate(subtransactions):
+            self.children[st.transaction_id].append(j)
+
+    def slice(
+        self, rule: SliceRule
+    ) -> tuple[BudgetSlice, list[TransactionSummary], list[SubTransaction]]:
+        s = BudgetSlice(
+            rule,
+            transaction_counts=self.totals.transaction_counts.copy(),
+            latest=self.totals.latest.copy(),
+            subtransaction_count=len(self.subtransactions),
+        )
+        lo = 0 if rule.start is None else bisect_left(self.dates, rule.start)
+        hi = len(self.dates) if rule.end is None else bisect_right(self.dates, rule.end)
+        kept = [
+            i
+            for i in self.order[lo:hi]
+            if self.transactions[i].account_id not in rule.never
+            and self.transactions[i].account_id not in rule.always
+        ]
+        first_dropped: list[tuple[int, Id, int]] = []
+        for a_id, a in self.accounts.items():
+            if a_id in rule.never:
+                a_lo, a_hi = 0, 0
+            elif a_id in rule.always:
+                a_lo, a_hi = 0, len(a.positions)
+                kept.extend(a.positions)
+            else:
+                a_lo, a_hi = a.bounds(rule)
+            if a_hi > a_lo:
+                s.kept_counts[a_id] = a_hi - a_lo
+            if a_lo > 0 or a_hi < len(a.positions):
+                amount = a.amount_sums[-1] - (a.amount_sums[a_hi] - a.amount_sums[a_lo])
+                position = min(a.head_min[a_lo], a.tail_min[a_hi])
+                first_dropped.append((position, a_id, amount))
+        # Same account order as slice_transactions, which sees them in list order.
+        for _, a_id, amount in sorted(first_dropped, key=itemgetter(0)):
+            s.dropped_amounts[a_id] = amount
+
+        kept.sort()
+        kept_transactions = [self.transactions[i] for i in kept]
+        kept_children: list[int] = []
+        for t in kept_transactions:
+            s.transaction_ids.add(t.id)
+            if t.payee_id is not None:
+                s.payee_ids.add(t.payee_id)
+            kept_children.extend(self.children.get(t.id, ()))
+        kept_children.sort()
+        kept_subtransactions = [self.subtransactions[j] for j in kept_children]
+        for st in kept_subtransactions:
+            if st.payee_id is not None:
+                s.payee_ids.add(st.payee_id)
+        s.kept_subtransaction_count = len(kept_subtransactions)
+        return s, kept_transactions, kept_subtransactions
+
+
+def forward_budget(
+    index: BudgetIndex,
+    s: BudgetSlice,
+    transactions: list[TransactionSummary],
+    subtransactions: list[SubTransaction],
+    unapproved_prefix: str,
+    drop: bool,
+    forward: BalanceForward | None = None,
+) -> tuple[BudgetDetail, list[TransactionSummary]]:
+    """The budget example.py writes for a slice with a start date.
+
+    Returns it and the balance forward transactions it adds: one per account
+    with the amount of its dropped transactions, or `forward`'s. The budget
+    and its transactions are left unchanged."""
+    budget = index.budget
+    start = s.rule.start
+    if start is None:
+        msg = "Forward slice needs a start date"
+        raise RuntimeError(msg)
+    if unapproved_prefix:
+        transactions = [
+            t if t.approved else with_unapproved_prefix(t, unapproved_prefix)
+            for t in transactions
+        ]
+    fake_payee_id = index.fake_payee_id()
+    inflow_category_id = index.inflow_category_id()
+    months = slice_months(s.rule, cast(list["MonthDetail"], budget.months))
+    first_month = max(months[-1].month, date(start.year, start.month, 1))
+    if forward is None:
+        balance_forward_transactions = [
+            balance_forward_transaction(
+                account_id, amount, start, fake_payee_id, inflow_category_id
+            )
+            for account_id, amount in s.dropped_amounts.items()
+            if amount != 0
+        ]
+    else:
+        balance_forward_transactions = forward.transactions
+        subtransactions = subtransactions + forward.subtransactions
+        if forward.month is not None:
+            months = [*months, forward.month]
+            first_month = forward.month.month
+    return budget.model_copy(
+        update={
+            "first_month": first_month,
+            "accounts": index.accounts.in_order(s.kept_account_ids())
+            if drop
+            else budget.accounts,
+            "transactions": transactions + balance_forward_transactions,
+            "subtransactions": subtransactions,
+            "payees": index.payees.in_order([*s.payee_ids, fake_payee_id]),
+            "months": months,
+        }
+    ), balance_forward_transactions
+
+
+def inverse_budget(
+    index: BudgetIndex,
+    s: BudgetSlice,
+    transactions: list[TransactionSummary],
+    subtransactions: list[SubTransaction],
+) -> BudgetDetail:
+    """The budget inverse-example.py writes for a slice with an end date."""
+    budget = index.budget
+    end = s.rule.end
+    if end is None:
+        msg = "Inverse slice needs an end date"
+        raise RuntimeError(msg)
+    months = slice_months(s.rule, cast(list["MonthDetail"], budget.months))
+    return budget.model_copy(
+        update={
+            "last_month": min(months[0].month, date(end.year, end.month, 1)),
+            "accounts": index.accounts.in_order(s.kept_account_ids()),
+            "transactions": transactions,
+            "subtransactions": subtransactions,
+            "payees": index.payees.in_order(s.payee_ids),
+            "months": months,
+        }
+    )
+
+
+def with_budget(
+    budget_detail_response: BudgetDetailResponse, budget: BudgetDetail
+) -> BudgetDetailResponse:
+    data = budget_detail_response.data
+    return budget_detail_response.model_copy(
+        update={"data": data.model_copy(update={"budget": budget})}
+    )
+
+
+def print_account_stats(index: BudgetIndex, s: BudgetSlice):
+    for a_id, count in sorted(
+        s.transaction_counts.items(), key=itemgetter(1), reverse=True
+    ):
+        print(
+            f"{index.accounts[a_id].name}: {count} transactions, latest {s.latest[a_id]}"
+        )
+
+
+def budget_lengths(budget: BudgetDetail) -> dict[str, int]:
+    return {
+        "accounts": len(budget.accounts or []),
+        "payees": len(budget.payees or []),
+        "category_groups": len(budget.category_groups or []),
+        "categories": len(budget.categories or []),
+        "months": len(budget.months or []),
+        "transactions": len(budget.transactions or []),
+        "subtransactions": len(budget.subtransactions or []),
+        "scheduled_transactions": len(budget.scheduled_transactions or []),
+        "scheduled_subtransactions": len(budget.scheduled_subtransactions or []),
+    }
+
+
+def print_budget_stats(budget: BudgetDetail, lengths: Mapping[str, int]):
+    print(f"{budget.first_month=}")
+    print(f"{budget.last_month=}")
+    for name, n in lengths.items():
+        print(f"len({name})={n}")
+
+
+def print_slice_stats(budget: BudgetDetail, added_transactions: int = 0):
+    lengths = budget_lengths(budget)
+    lengths["transactions"] -= added_transactions
+    for name in ["accounts", "transactions", "subtransactions", "payees", "months"]:
+        print(f"len(filtered_{name})={lengths[name]}")
@@ -0,0 +1,126 @@
+# Startup time check: runs each script's --help in a fresh interpreter under
+# -X importtime and fails if its imports, beyond what a bare interpreter
+# imports anyway, take longer than the budget, or if it imports the ynab
+# package or pydantic, which only loading a budget should need.  batch.py's
+# fork server, on the other hand, has to have them loaded already.
+
+import argparse
+import multiprocessing
+import subprocess
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import TYPE_CHECKING, cast
+
+from batch import PRELOAD
+
+
+if TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+
+
+SCRIPTS = (
+    "cli.py",
+    "example.py",
+    "inverse-example.py",
+    "cutover.py",
+    "obfuscate.py",
+    "ynab_api.py",
+    "batch.py",
+    "synthetic.py",
+    "integrity.py",
+)
+# Imported only once a budget is loaded or built.
+HEAVY = ("ynab", "pydantic")
+
+
+def import_times(args: list[str]) -> dict[str, int]:
+    """Self import time in microseconds of each module `args` imports."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=Path(__file__).parent,
+    )
+    times: dict[str, int] = {}
+    # import time: self [us] | cumulative | imported package
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(self_us)
+    return times
+
+
+def best_times(args: list[str], runs: int) -> dict[str, int]:
+    best: dict[str, int] = {}
+    for _ in range(runs):
+        for name, us in import_times(args).items():
+            best[name] = min(us, best.get(name, us))
+    return best
+
+
+def _send_unloaded(conn: Connection):
+    # A module lazy_import hasn't loaded yet isn't a plain ModuleType.
+    conn.send([name for name in HEAVY if type(sys.modules.get(name)) is not ModuleType])
+    conn.close()
+
+
+def unloaded_in_batch() -> list[str]:
+    """The HEAVY modules a batch.py job would still have to import."""
+    ctx = multiprocessing.get_context("forkserver")
+    ctx.set_forkserver_preload(PRELOAD)
+    receiver, sender = ctx.Pipe(duplex=False)
+    p = ctx.Process(target=_send_unloaded, args=(sender,))
+    p.start()
+    sender.close()
+    unloaded = cast(list[str], receiver.recv())
+    p.join()
+    return unloaded
+
+
+def main(argv: list[str]):
+    parser = argparse.ArgumentParser(
+        description="Check the import time of each script's --help"
+    )
+    _ = parser.add_argument("--budget-ms", type=float, default=100.0)
+    _ = parser.add_argument("--runs", type=int, default=3, help="Best of")
+    _ = parser.add_argument("--verbose", "-v", action="store_true")
+    args = parser.parse_args(argv)
+    budget_ms = cast(float, args.budget_ms)
+    runs = cast(int, args.runs)
+
+    baseline = set(best_times(["-c", "pass"], runs))
+    failed = False
+    for script in SCRIPTS:
+        times = {
+            name: us
+            for name, us in best_times([script, "--help"], runs).items()
+            if name not in baseline
+        }
+        total_ms = sum(times.values()) / 1000
+        heavy = sorted(name for name in times if name in HEAVY)
+        ok = total_ms <= budget_ms and not heavy
+        failed = failed or not ok
+        print(
+            f"{script:20} {total_ms:7.1f} ms  {len(times):4} modules"
+            f"  {'ok' if ok else 'FAILED'}"
+            + (f" (imports {', '.join(heavy)})" if heavy else "")
+        )
+        if args.verbose:
+            for name, us in sorted(times.items(), key=lambda item: -item[1])[:10]:
+                print(f"    {us / 1000:7.1f} ms  {name}")
+    print(f"budget {budget_ms:.0f} ms of imports per script")
+    unloaded = unloaded_in_batch()
+    failed = failed or bool(unloaded)
+    print(
+        "batch.py fork server"
+        + (f" FAILED (doesn't load {', '.join(unloaded)})" if unloaded else " ok")
+    )
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
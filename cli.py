@@ -0,0 +1,65 @@
+# One entry point for the scripts: python cli.py COMMAND [ARGS...], where
+# ARGS are the script's own (cli.py COMMAND --help lists them).  Only the
+# chosen script is loaded.
+
+import argparse
+import importlib
+import runpy
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING, cast
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+COMMANDS = {
+    "slice": ("example.py", "everything from a start date on, with balance forward"),
+    "inverse": ("inverse-example.py", "everything up to an end date"),
+    "cutover": ("cutover.py", "before and after slices for cutover dates"),
+    "obfuscate": ("obfuscate.py", "random names, memos and amounts"),
+    "fetch": ("ynab_api.py", "export files fetched from the YNAB API"),
+    "batch": ("batch.py", "run a script on many exports concurrently"),
+    "check": ("integrity.py", "check exports for dangling references"),
+    "synthetic": ("synthetic.py", "a made-up export of any size"),
+}
+
+
+def script_main(script: str) -> Callable[[list[str]], None]:
+    """The main function of one of the scripts, loaded on demand."""
+    name = script.removesuffix(".py")
+    if name.isidentifier():
+        # Imported under its own name, so that what it sends to worker
+        # processes pickles by reference to it.
+        return importlib.import_module(name).main
+    return cast(
+        "Callable[[list[str]], None]",
+        runpy.run_path(str(Path(__file__).parent / script), run_name=name)["main"],
+    )
+
+
+def main(argv: list[str]):
+    parser = argparse.ArgumentParser(
+        prog="ynab-to-actual",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n"
+        + "\n".join(
+            f"  {command:10} {script:19} {help}"
+            for command, (script, help) in COMMANDS.items()
+        ),
+    )
+    _ = parser.add_argument("command", choices=COMMANDS, metavar="COMMAND")
+    _ = parser.add_argument(
+        "args", nargs=argparse.REMAINDER, help="Arguments for the command's script"
+    )
+    args = parser.parse_args(argv)
+    command = cast(str, args.command)
+    script, _ = COMMANDS[command]
+    # For the script's usage messages.
+    sys.argv[0] = f"{parser.prog} {command}"
+    script_main(script)(cast(list[str], args.args))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,172 @@
+# Smaller outputs: --compact writes minified JSON with only the fields that
+# src/import.ts reads, and any output named *.gz or *.zst is compressed.
+# Exports named so are read decompressed, by these scripts and the importer.
+#
+# Compact files are for the importer only; they lack fields that
+# BudgetDetailResponse requires, so these scripts can't read them back.
+
+import gzip
+import itertools
+from functools import cache
+from typing import TYPE_CHECKING, Any, BinaryIO, TextIO, cast
+
+from lazy import lazy_import
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+    from pathlib import Path
+    from types import ModuleType
+
+    import ynab
+    from pydantic import BaseModel
+    from ynab import BudgetDetail
+else:
+    ynab = lazy_import("ynab")
+
+
+# What the importer reads of each entity (a ynab model), by JSON name (as in
+# src/ynab5-types.ts, less what it declares but never reads).
+BUDGET_FIELDS = ("id", "name")
+IMPORTER_FIELDS: dict[str, tuple[str, tuple[str, ...]]] = {
+    "accounts": ("Account", ("id", "name", "on_budget", "deleted", "closed")),
+    "payees": ("Payee", ("id", "name", "deleted")),
+    "category_groups": ("CategoryGroup", ("id", "name", "deleted")),
+    "categories": (
+        "Category",
+        (
+            "id",
+            "category_group_id",
+            "name",
+            "deleted",
+            "hidden",
+            "original_category_group_id",
+        ),
+    ),
+    "months": ("MonthDetail", ("month", "categories")),
+    "transactions": (
+        "TransactionSummary",
+        (
+            "id",
+            "account_id",
+            "date",
+            "amount",
+            "payee_id",
+            "category_id",
+            "transfer_account_id",
+            "transfer_transaction_id",
+            "import_id",
+            "memo",
+            "cleared",
+            "deleted",
+        ),
+    ),
+    "subtransactions": (
+        "SubTransaction",
+        (
+            "id",
+            "transaction_id",
+            "amount",
+            "payee_id",
+            "category_id",
+            "transfer_account_id",
+            "memo",
+        ),
+    ),
+}
+# Of a month's categories; --prune-months keeps only these too.
+MONTH_CATEGORY_FIELDS = ("id", "category_group_id", "budgeted")
+
+# Elements dumped per write.
+_BATCH = 1000
+
+
+def _include(model: str, names: Iterable[str]) -> dict[str, Any]:
+    # A pydantic include spec goes by field name, not alias (var_date).
+    fields = cast("type[BaseModel]", getattr(ynab, model)).model_fields
+    by_json_name = {f.alias or name: name for name, f in fields.items()}
+    return {by_json_name[name]: True for name in names}
+
+
+@cache
+def _includes() -> dict[str, dict[str, Any]]:
+    includes = {
+        key: _include(model, names) for key, (model, names) in IMPORTER_FIELDS.items()
+    }
+    includes["months"]["categories"] = {
+        "__all__": _include("Category", MONTH_CATEGORY_FIELDS)
+    }
+    includes["budget"] = _include("BudgetDetail", BUDGET_FIELDS)
+    return includes
+
+
+def write_compact(
+    f: TextIO,
+    budget: BudgetDetail,
+    arrays: Mapping[str, Iterable[BaseModel]] | None = None,
+):
+    """Write `budget` as the importer reads it, with `arrays` (consumed as
+    they are written) in place of those members of `budget`."""
+    arrays = arrays or {}
+    includes = _includes()
+    head = budget.model_dump_json(
+        by_alias=True, exclude_unset=True, include=includes["budget"]
+    )
+    _ = f.write('{"data":{"budget":' + head[:-1])
+    sep = "," if len(head) > 2 else ""  # noqa: PLR2004
+    for key in IMPORTER_FIELDS:
+        include = includes[key]
+        models = arrays.get(key, cast("list[BaseModel] | None", getattr(budget, key)))
+        _ = f.write(f'{sep}"{key}":[')
+        sep = ","
+        batch_sep = ""
+        for batch in itertools.batched(models or [], _BATCH, strict=False):
+            _ = f.write(batch_sep)
+            _ = f.write(
+                ",".join(
+                    m.model_dump_json(
+                        by_alias=True, exclude_unset=True, include=include
+                    )
+                    for m in batch
+                )
+            )
+            batch_sep = ","
+        _ = f.write("]")
+    _ = f.write("}}}")
+
+
+def _zstd(path: Path) -> ModuleType:
+    try:
+        from compression import zstd  # noqa: PLC0415
+    except ImportError:
+        msg = f"{path}: zstd needs Python's compression.zstd"
+        raise RuntimeError(msg) from None
+    return zstd
+
+
+def is_compressed(path: Path) -> bool:
+    return path.suffix in {".gz", ".zst"}
+
+
+def open_output(output_path: Path) -> TextIO:
+    """`output_path` opened for writing text, gzip or zstd compressed if it
+    is named *.gz or *.zst."""
+    if output_path.suffix == ".gz":
+        # Level 1: these are passed along and unpacked once, and it's about
+        # twice as fast as 6 for a fifth more bytes.
+        return gzip.open(output_path, "wt", compresslevel=1, encoding="utf-8")
+    if output_path.suffix == ".zst":
+        return cast(
+            TextIO, _zstd(output_path).open(output_path, "wt", encoding="utf-8")
+        )
+    return output_path.open("w")
+
+
+def open_input(input_path: Path) -> BinaryIO:
+    """`input_path` opened for reading bytes, decompressed if it is named
+    *.gz or *.zst."""
+    if input_path.suffix == ".gz":
+        return gzip.open(input_path, "rb")
+    if input_path.suffix == ".zst":
+        return cast(BinaryIO, _zstd(input_path).open(input_path, "rb"))
+    return input_path.open("rb")
@@ -0,0 +1,210 @@
+# Write the "after" slice (as example.py --start) and the "before" slice (as
+# inverse-example.py --end, the day before) for several cutover dates, and
+# optionally several account sets, from a single parse of the export.
+
+import argparse
+import sys
+from datetime import datetime, timedelta
+from functools import partial
+from pathlib import Path
+from typing import TYPE_CHECKING, cast
+
+import profiling
+import ynab_api
+from budget_cache import BudgetCache
+from budget_index import BudgetIndex
+from budget_json import DEFAULT_PARSER, available_parsers
+from budget_slice import (
+    SliceRule,
+    TransactionIndex,
+    forward_budget,
+    inverse_budget,
+    keep_account_ids,
+    load_budget,
+    parse_account_names,
+    print_slice_stats,
+    with_budget,
+    write_budget,
+)
+from integrity import account_totals, check_balances, check_budget, raise_problems
+
+
+if TYPE_CHECKING:
+    from ynab import TransactionSummary
+
+
+def main(argv: list[str]):
+    parser = argparse.ArgumentParser()
+    _ = parser.add_argument("--input", "-i", default="ynab-json/budget-in.json")
+    _ = parser.add_argument("--output-dir", "-o", default="ynab-json")
+    _ = parser.add_argument(
+        "cutovers",
+        nargs="+",
+        help="Cutover dates in YYYY-MM-DD format; each 'after' slice starts on its date",
+    )
+    _ = parser.add_argument(
+        "--accounts",
+        "-a",
+        action="append",
+        default=[],
+        help="Comma-separated list of account names to filter, as for example.py. Repeat for several account sets",
+    )
+    _ = parser.add_argument(
+        "--exclude",
+        "-x",
+        action="append",
+        default=[],
+        help="Comma-separated list of account names to exclude from filtering, as for example.py. Repeat for several account sets",
+    )
+    _ = parser.add_argument(
+        "--drop",
+        "-d",
+        action="store_true",
+        help="Drop accounts with no transactions from 'after' slices",
+    )
+    _ = parser.add_argument("--unapproved_prefix", "-u", default="#review")
+    _ = parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=1,
+        help="Processes to serialize each output with",
+    )
+    _ = parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Write minified JSON with only the fields the Actual importer reads",
+    )
+    _ = parser.add_argument(
+        "--compress",
+        choices=["gz", "zst"],
+        help="Write compressed .json.gz or .json.zst files",
+    )
+    _ = parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Check each output for dangling references and duplicate ids, and 'after' slices for unchanged account balances",
+    )
+    _ = parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Parse the input even if it is in the parsed budget cache",
+    )
+    _ = parser.add_argument(
+        "--parser",
+        choices=available_parsers(),
+        default=DEFAULT_PARSER,
+        help="JSON parser to load the input with",
+    )
+    ynab_api.add_arguments(parser)
+    profiling.add_arguments(parser)
+    args = parser.parse_args(argv)
+    profiling.configure(args)
+    input_path = Path(cast(str, args.input))
+    output_dir = Path(cast(str, args.output_dir))
+    cutovers = [
+        datetime.strptime(c, "%Y-%m-%d").date() for c in cast(list[str], args.cutovers)
+    ]
+    account_sets: list[tuple[set[str], set[str]]] = [
+        (parse_account_names(a), set()) for a in cast(list[str], args.accounts)
+    ] + [(set(), parse_account_names(x)) for x in cast(list[str], args.exclude)]
+    if not account_sets:
+        account_sets = [(set(), set())]
+    unapproved_prefix = cast(str, args.unapproved_prefix).strip()
+    drop = cast(bool, args.drop)
+    workers = cast(int, args.workers)
+    compact = cast(bool, args.compact)
+    extension = ".json" if args.compress is None else f".json.{args.compress}"
+    json_parser = cast(str, args.parser)
+    cache = not cast(bool, args.no_cache)
+    budget_id = cast("str | None", args.budget_id)
+    full_fetch = cast(bool, args.full_fetch)
+    verify = cast(bool, args.verify)
+
+    with profiling.phase("load"):
+        if budget_id is not None:
+            budget_detail_response = ynab_api.fetch(budget_id, full_fetch)
+        elif cache:
+            budget_detail_response = BudgetCache().load(
+                input_path, partial(load_budget, parser=json_parser)
+            )
+        else:
+            budget_detail_response = load_budget(input_path, json_parser)
+    budget = budget_detail_response.data.budget
+    with profiling.phase("index"):
+        budget_index = BudgetIndex(budget)
+        index = TransactionIndex(budget_index)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    totals = (
+        account_totals(cast(list["TransactionSummary"], budget.transactions))
+        if verify
+        else {}
+    )
+
+    for cutover in cutovers:
+        for n, (target_account_names, exclude_account_names) in enumerate(account_sets):
+            # Accounts kept whole after the cutover are left out before it.
+            whole = keep_account_ids(
+                budget_index, target_account_names, exclude_account_names
+            )
+            suffix = f"{cutover}" if len(account_sets) == 1 else f"{cutover}-{n}"
+
+            after_path = output_dir / f"after-{suffix}{extension}"
+            with profiling.phase(after_path.name):
+                with profiling.phase("filter"):
+                    s, transactions, subtransactions = index.slice(
+                        SliceRule(start=cutover, always=whole)
+                    )
+                with profiling.phase("balance-forward"):
+                    after, balance_forward_transactions = forward_budget(
+                        budget_index,
+                        s,
+                        transactions,
+                        subtransactions,
+                        unapproved_prefix,
+                        drop,
+                    )
+                print(after_path)
+                print_slice_stats(after, len(balance_forward_transactions))
+                if verify:
+                    with profiling.phase("verify"):
+                        check_balances(
+                            totals,
+                            account_totals(
+                                cast(list["TransactionSummary"], after.transactions)
+                            ),
+                        )
+                        raise_problems(str(after_path), check_budget(after))
+                with profiling.phase("dump"):
+                    write_budget(
+                        after_path,
+                        with_budget(budget_detail_response, after),
+                        workers,
+                        compact,
+                    )
+
+            before_path = output_dir / f"before-{suffix}{extension}"
+            with profiling.phase(before_path.name):
+                with profiling.phase("filter"):
+                    s, transactions, subtransactions = index.slice(
+                        SliceRule(end=cutover - timedelta(days=1), never=whole)
+                    )
+                    before = inverse_budget(
+                        budget_index, s, transactions, subtransactions
+                    )
+                print(before_path)
+                print_slice_stats(before)
+                if verify:
+                    with profiling.phase("verify"):
+                        raise_problems(str(before_path), check_budget(before))
+                with profiling.phase("dump"):
+                    write_budget(
+                        before_path,
+                        with_budget(budget_detail_response, before),
+                        workers,
+                        compact,
+                    )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
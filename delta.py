@@ -0,0 +1,267 @@
+# Incremental exports for example.py --state: remember what earlier runs
+# emitted, and emit only transactions that are new since.
+#
+# The state file maps each emitted transaction and subtransaction id to a
+# short hash of what was written for it, each month to a digest of its
+# transactions, and each account to the balance forward amount written for
+# it.  It also records the export it was last run on (its server knowledge
+# and modification time) and the slicing options: a run on the same export
+# with the same options has nothing to emit and skips slicing, and a run on a
+# changed one hashes transactions only in the months whose digest changed.
+# The Actual importer only ever adds, so a transaction emitted twice is
+# imported twice: a run that would emit a changed one fails instead.
+
+import hashlib
+import json
+import os
+import tempfile
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import cache
+from pathlib import Path
+from typing import TYPE_CHECKING, cast
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from datetime import date
+
+    from pydantic import BaseModel, TypeAdapter
+    from ynab import (
+        Account,
+        BudgetDetail,
+        BudgetDetailResponse,
+        Payee,
+        SubTransaction,
+        TransactionSummary,
+    )
+
+
+def content_hash(m: BaseModel) -> str:
+    return hashlib.blake2b(
+        m.model_dump_json(by_alias=True, exclude_unset=True).encode(), digest_size=8
+    ).hexdigest()
+
+
+@cache
+def _month_adapters() -> tuple[
+    TypeAdapter[list[BaseModel]], TypeAdapter[list[BaseModel]]
+]:
+    from pydantic import TypeAdapter  # noqa: PLC0415
+    from ynab import SubTransaction, TransactionSummary  # noqa: PLC0415
+
+    return (
+        cast("TypeAdapter[list[BaseModel]]", TypeAdapter(list[TransactionSummary])),
+        cast("TypeAdapter[list[BaseModel]]", TypeAdapter(list[SubTransaction])),
+    )
+
+
+def month_digest(
+    transactions: list[TransactionSummary], subtransactions: list[SubTransaction]
+) -> str:
+    """Digest of a month's transactions and their subtransactions, dumped in
+    one call each, which is cheaper than hashing them one by one."""
+    transaction_adapter, subtransaction_adapter = _month_adapters()
+    h = hashlib.blake2b(
+        transaction_adapter.dump_json(transactions, by_alias=True, exclude_unset=True),
+        digest_size=16,
+    )
+    h.update(
+        subtransaction_adapter.dump_json(
+            subtransactions, by_alias=True, exclude_unset=True
+        )
+    )
+    return h.hexdigest()
+
+
+def export_source(
+    response: BudgetDetailResponse, options: Iterable[object]
+) -> str | None:
+    """What a run emits from: the export's server knowledge and modification
+    time, and the options it was sliced with.  None for an export without
+    either, which can't be told apart from a changed one."""
+    knowledge = response.data.server_knowledge
+    modified = response.data.budget.last_modified_on
+    if knowledge is None and modified is None:
+        return None
+    return json.dumps([knowledge, str(modified), *map(str, options)])
+
+
+@dataclass
+class ExportState:
+    start: str | None = None
+    source: str | None = None
+    transactions: dict[str, str] = field(default_factory=dict)
+    subtransactions: dict[str, str] = field(default_factory=dict)
+    months: dict[str, str] = field(default_factory=dict)
+    balance_forward: dict[str, int] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: Path) -> ExportState:
+        try:
+            doc = cast(dict[str, object], json.loads(path.read_text()))
+        except FileNotFoundError:
+            return cls()
+        return cls(
+            start=cast("str | None", doc["start"]),
+            # Not in states written before these were kept.
+            source=cast("str | None", doc.get("source")),
+            transactions=cast(dict[str, str], doc["transactions"]),
+            subtransactions=cast(dict[str, str], doc["subtransactions"]),
+            months=cast(dict[str, str], doc.get("months", {})),
+            balance_forward=cast(dict[str, int], doc["balance_forward"]),
+        )
+
+    def save(self, path: Path):
+        # Write and rename, so an interrupted run leaves the old state.
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(
+                {
+                    "start": self.start,
+                    "source": self.source,
+                    "transactions": self.transactions,
+                    "subtransactions": self.subtransactions,
+                    "months": self.months,
+                    "balance_forward": self.balance_forward,
+                },
+                f,
+                separators=(",", ":"),
+            )
+        _ = Path(tmp).replace(path)
+
+    def check_start(self, start: date):
+        # Balance forward amounts only add up for one start date.
+        if self.start is None:
+            self.start = start.isoformat()
+        elif self.start != start.isoformat():
+            msg = f"State was built with --start {self.start}, not {start}"
+            raise RuntimeError(msg)
+
+
+@dataclass
+class Delta:
+    new: int = 0
+    unchanged: int = 0
+    # Months whose transactions were all emitted before, unchanged.
+    unchanged_months: int = 0
+    balance_forward: int = 0
+
+    def report(self):
+        print(
+            f"delta: {self.new} new, {self.unchanged} unchanged transactions ({self.unchanged_months} months unchanged)"
+        )
+        print(f"delta: {self.balance_forward} balance forward transactions")
+
+
+def empty_delta(budget: BudgetDetail) -> BudgetDetail:
+    """`budget` with nothing to import."""
+    return budget.model_copy(
+        update={
+            "accounts": [],
+            "payees": [],
+            "months": [],
+            "transactions": [],
+            "subtransactions": [],
+        }
+    )
+
+
+def delta_budget(
+    budget: BudgetDetail,
+    balance_forward_transactions: list[TransactionSummary],
+    state: ExportState,
+) -> tuple[BudgetDetail, Delta]:
+    """The part of `budget` (as returned by forward_budget) that `state`
+    hasn't seen, with only the accounts and payees it references.
+
+    Fails if a transaction or balance forward emitted before has changed,
+    since importing it again would duplicate it.  Otherwise `state` is
+    updated to include the delta."""
+    delta = Delta()
+    subtransactions_by_parent: defaultdict[str, list[SubTransaction]] = defaultdict(
+        list
+    )
+    for st in cast(list["SubTransaction"], budget.subtransactions):
+        subtransactions_by_parent[st.transaction_id].append(st)
+    balance_forward_ids = {t.id for t in balance_forward_transactions}
+
+    emitted: set[str] = set()
+    changed: list[str] = []
+    for t in balance_forward_transactions:
+        # Balance forward ids are made up each run; go by account.
+        account_id = str(t.account_id)
+        before = state.balance_forward.get(account_id)
+        if before is None:
+            state.balance_forward[account_id] = t.amount
+            delta.balance_forward += 1
+            emitted.add(t.id)
+        elif before != t.amount:
+            changed.append(
+                f"balance forward for account {account_id} ({before} -> {t.amount})"
+            )
+
+    by_month: defaultdict[str, list[TransactionSummary]] = defaultdict(list)
+    for t in cast(list["TransactionSummary"], budget.transactions):
+        if t.id not in balance_forward_ids:
+            by_month[t.var_date.isoformat()[:7]].append(t)
+    for month, month_transactions in by_month.items():
+        month_subtransactions = [
+            st for t in month_transactions for st in subtransactions_by_parent[t.id]
+        ]
+        digest = month_digest(month_transactions, month_subtransactions)
+        if state.months.get(month) == digest:
+            delta.unchanged_months += 1
+            delta.unchanged += len(month_transactions)
+            continue
+        state.months[month] = digest
+        for t in month_transactions:
+            t_hash = content_hash(t)
+            children = [
+                (st, content_hash(st)) for st in subtransactions_by_parent[t.id]
+            ]
+            if t.id not in state.transactions:
+                delta.new += 1
+            elif state.transactions[t.id] != t_hash or any(
+                state.subtransactions.get(st.id) != h for st, h in children
+            ):
+                changed.append(t.id)
+                continue
+            else:
+                delta.unchanged += 1
+                continue
+            state.transactions[t.id] = t_hash
+            state.subtransactions.update((st.id, h) for st, h in children)
+            emitted.add(t.id)
+    if changed:
+        msg = f"{len(changed)} transactions were emitted before and have changed since, so importing them again would duplicate them: {', '.join(changed[:5])}"
+        raise RuntimeError(msg)
+
+    # In the order of the export.
+    transactions = [
+        t
+        for t in cast(list["TransactionSummary"], budget.transactions)
+        if t.id in emitted
+    ]
+    subtransactions = [
+        st
+        for st in cast(list["SubTransaction"], budget.subtransactions)
+        if st.transaction_id in emitted
+    ]
+    account_ids = {t.account_id for t in transactions}
+    account_ids.update(t.transfer_account_id for t in transactions)
+    account_ids.update(st.transfer_account_id for st in subtransactions)
+    payee_ids = {t.payee_id for t in transactions}
+    payee_ids.update(st.payee_id for st in subtransactions)
+    return budget.model_copy(
+        update={
+            "accounts": [
+                a for a in cast(list["Account"], budget.accounts) if a.id in account_ids
+            ],
+            "payees": [
+                p for p in cast(list["Payee"], budget.payees) if p.id in payee_ids
+            ],
+            "transactions": transactions,
+            "subtransactions": subtransactions,
+        }
+    ), delta
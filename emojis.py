@@ -1,11 +1,18 @@
+from functools import cache
+
+
 _ZWJ = "\u200d"
 _people = ["👨", "👩", "🧑", "👶", "👧", "👦"]
 _professions = ["💻", "🍳", "🎨", "🔬", "🚒", "✈️", "🚀", "⚕️", "🎓", "🔧"]
 _skin_tones = ["🏻", "🏼", "🏽", "🏾", "🏿"]
 
-EMOJIS: list[str] = []
 
-for person in _people:
-    for tone in _skin_tones:
-        for profession in _professions:
-            EMOJIS.append(f"{person}{tone}{_ZWJ}{profession}")
+@cache
+def emojis() -> list[str]:
+    """Every person, skin tone and profession combination, built on first use."""
+    return [
+        f"{person}{tone}{_ZWJ}{profession}"
+        for person in _people
+        for tone in _skin_tones
+        for profession in _professions
+    ]
@@ -1,43 +1,70 @@
 import argparse
-import json
 import sys
-from collections import defaultdict
-from typing import TYPE_CHECKING, cast
-
-
-if TYPE_CHECKING:
-    from collections.abc import Mapping
-
+from collections import defaultdict, deque
 from datetime import date, datetime, timedelta
-from operator import itemgetter
+from functools import partial
+from itertools import chain, compress
 from pathlib import Path
-from uuid import uuid4
+from typing import TYPE_CHECKING, Any, cast
 
-from ynab import (
-    Account,
-    BudgetDetailResponse,
-    TransactionClearedStatus,
-    TransactionSummary,
+import jsonstream
+import profiling
+import ynab_api
+from budget_cache import BudgetCache
+from budget_index import BudgetIndex
+from budget_json import DEFAULT_PARSER, available_parsers
+from budget_slice import (
+    BudgetSlice,
+    SliceRule,
+    balance_forward_transaction,
+    budget_lengths,
+    forward_budget,
+    keep_account_ids,
+    load_budget,
+    load_budget_skeleton,
+    mark_unapproved,
+    parse_account_names,
+    print_account_stats,
+    print_budget_stats,
+    print_slice_stats,
+    prune_month,
+    slice_transactions,
+    with_budget,
+    write_budget,
+)
+from columnar import TransactionStore
+from compact import open_output, write_compact
+from delta import ExportState, delta_budget, empty_delta, export_source
+from integrity import (
+    IntegrityCheck,
+    account_totals,
+    check_balances,
+    check_budget,
+    raise_problems,
 )
+from lazy import lazy_import
+from rollup import BALANCE_FORWARD_MODES, BalanceForward, Rollup, month_of
+from staging import ExportIndex, StagingStore
 
 
-def account_names_to_ids(
-    account_name_dict: Mapping[str, Account], account_names: set[str]
-):
-    missing: list[str] = []
-    for a in account_names:
-        if a not in account_name_dict:
-            missing.append(a)
-    if missing:
-        message = f"No such account(s): {missing}"
-        raise RuntimeError(message)
-    return set([a.id for a in account_name_dict.values() if a.name in account_names])
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    import ynab
+    from ynab import Account, MonthDetail, SubTransaction, TransactionSummary
+else:
+    ynab = lazy_import("ynab")
 
 
 def main(argv: list[str]):
     parser = argparse.ArgumentParser()
     _ = parser.add_argument("--input", "-i", default="ynab-json/budget-in.json")
-    _ = parser.add_argument("--output", "-o", default="ynab-json/budget-out.json")
+    _ = parser.add_argument(
+        "--output",
+        "-o",
+        default="ynab-json/budget-out.json",
+        help="Compressed with gzip or zstd if named *.gz or *.zst",
+    )
     _ = parser.add_argument(
         "--start", "-s", required=True, help="Start date in YYYY-MM-DD format"
     )
@@ -45,190 +72,476 @@ def main(argv: list[str]):
         "--accounts",
         "-a",
         default="",
-        help="Comma-separated list of account names to filter. If omitted filters all accounts",
+        help="Comma-separated list of account names, globs or re:regexes to filter. If omitted filters all accounts",
     )
     _ = parser.add_argument(
         "--exclude",
         "-x",
         default="",
-        help="Comma-separated list of account names to exclude from filtering.",
+        help="Comma-separated list of account names, globs or re:regexes to exclude from filtering.",
     )
     _ = parser.add_argument(
         "--drop", "-d", action="store_true", help="Drop accounts with no transactions"
     )
     _ = parser.add_argument("--unapproved_prefix", "-u", default="#review")
+    _ = parser.add_argument(
+        "--balance-forward",
+        choices=BALANCE_FORWARD_MODES,
+        default="account",
+        help="account: one inflow transaction per account for the dropped transactions; category: split by their categories; carryover: also budget the month it falls in so categories carry over their YNAB balances",
+    )
+    _ = parser.add_argument(
+        "--prune-months",
+        action="store_true",
+        help="Write only the month category fields the Actual importer reads",
+    )
+    _ = parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Write minified JSON with only the fields the Actual importer reads (which these scripts can't read back)",
+    )
+    _ = parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream transactions, subtransactions and months instead of loading the whole export",
+    )
+    _ = parser.add_argument(
+        "--staging",
+        action="store_true",
+        help="Like --stream, but stage the export in a SQLite database (kept for later runs) and slice it there, in constant memory",
+    )
+    _ = parser.add_argument(
+        "--index",
+        action="store_true",
+        help="Like --staging, but with a sidecar index (EXPORT.index, built on first use) and only the kept records read from the export",
+    )
+    _ = parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=1,
+        help="Processes to serialize the output with (ignored with --stream)",
+    )
+    _ = parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Parse the input even if it is in the parsed budget cache",
+    )
+    _ = parser.add_argument(
+        "--parser",
+        choices=available_parsers(),
+        default=DEFAULT_PARSER,
+        help="JSON parser to load the input with",
+    )
+    _ = parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Check the output for dangling references and duplicate ids",
+    )
+    _ = parser.add_argument(
+        "--state",
+        help="Incremental export: emit only transactions not emitted by earlier runs with this state file, which is then updated",
+    )
+    ynab_api.add_arguments(parser)
+    profiling.add_arguments(parser)
     args = parser.parse_args(argv)
+    profiling.configure(args)
     input_path = Path(cast(str, args.input))
     output_path = Path(cast(str, args.output))
     start = datetime.strptime(cast(str, args.start), "%Y-%m-%d").date()
     unapproved_prefix = cast(str, args.unapproved_prefix).strip()
-    target_account_names = set(
-        [a.strip() for a in cast(str, args.accounts).split(",") if a]
-    )
-    exclude_account_names = set(
-        [a.strip() for a in cast(str, args.exclude).split(",") if a]
-    )
+    target_account_names = parse_account_names(cast(str, args.accounts))
+    exclude_account_names = parse_account_names(cast(str, args.exclude))
     if bool(target_account_names) and bool(exclude_account_names):
         msg = "Specify at most one of --accounts or --exclude"
         raise RuntimeError(msg)
     drop = cast(bool, args.drop)
+    prune_months = cast(bool, args.prune_months)
+    compact = cast(bool, args.compact)
+    workers = cast(int, args.workers)
+    json_parser = cast(str, args.parser)
+    cache = not cast(bool, args.no_cache)
+    budget_id = cast("str | None", args.budget_id)
+    full_fetch = cast(bool, args.full_fetch)
+    state_path = None if args.state is None else Path(cast(str, args.state))
+    staging = cast(bool, args.staging)
+    export_index = cast(bool, args.index)
+    balance_forward_mode = cast(str, args.balance_forward)
+    verify = cast(bool, args.verify)
+    if cast(bool, args.stream) or staging or export_index:
+        if state_path is not None:
+            msg = "--state is not supported with --stream, --staging or --index"
+            raise RuntimeError(msg)
+        if budget_id is not None:
+            msg = "--stream, --staging and --index read --input, so can't be used with --budget-id"
+            raise RuntimeError(msg)
+        main_stream(
+            input_path,
+            output_path,
+            start,
+            unapproved_prefix,
+            target_account_names,
+            exclude_account_names,
+            drop,
+            prune_months,
+            compact,
+            staging,
+            export_index,
+            balance_forward_mode,
+            verify,
+        )
+        return
 
-    with input_path.open("r") as f:
-        budget_detail_response = BudgetDetailResponse.from_dict(json.load(f))  # pyright: ignore[reportAny]
-    if budget_detail_response is None:
-        msg = "Bad JSON"
-        raise RuntimeError(msg)
+    with profiling.phase("load"):
+        if budget_id is not None:
+            budget_detail_response = ynab_api.fetch(budget_id, full_fetch)
+        elif cache:
+            budget_detail_response = BudgetCache().load(
+                input_path, partial(load_budget, parser=json_parser)
+            )
+        else:
+            budget_detail_response = load_budget(input_path, json_parser)
     budget = budget_detail_response.data.budget
-    if (
-        budget.first_month is None
-        or budget.last_month is None
-        or budget.accounts is None
-        or budget.payees is None
-        or budget.payee_locations is None
-        or budget.category_groups is None
-        or budget.categories is None
-        or budget.months is None
-        or budget.transactions is None
-        or budget.subtransactions is None
-        or budget.scheduled_transactions is None
-        or budget.scheduled_subtransactions is None
-    ):
-        msg = "budget is missing key fields"
-        raise RuntimeError(msg)
-    accounts = budget.accounts
-    payees = budget.payees
-    category_groups = budget.category_groups
-    categories = budget.categories
-    months = budget.months
-    transactions = budget.transactions
-    subtransactions = budget.subtransactions
-    scheduled_transactions = budget.scheduled_transactions
-    scheduled_subtransactions = budget.scheduled_subtransactions
-    account_name_dict = {a.name: a for a in accounts}
-    target_accounts = account_names_to_ids(account_name_dict, target_account_names)
-    exclude_accounts = account_names_to_ids(account_name_dict, exclude_account_names)
-    if not target_accounts:
-        keep_accounts = exclude_accounts
-    else:
-        keep_accounts = set([a.id for a in accounts if a.id not in target_accounts])
-
-    # For stats only (AFAIK)
-    adict = {a.id: a for a in accounts}
-    tcount: defaultdict[str, int] = defaultdict(int)
-    latest: defaultdict[str, date] = defaultdict(lambda: date.min)
-    for t in transactions:
-        tcount[t.account_id] += 1
-        if t.var_date > latest[t.account_id]:
-            latest[t.account_id] = t.var_date
-    # for a in accounts:
-    #  print(f"{a.name} {tcount[a.id]} transactions")
-    for a_id, count in sorted(tcount.items(), key=itemgetter(1), reverse=True):
-        print(f"{adict[a_id].name}: {count} transactions, latest {latest[a_id]}")
-
-    print(f"{budget.first_month=}")
-    print(f"{budget.last_month=}")
-    print(f"{len(accounts)=}")
-    print(f"{len(payees)=}")
-    print(f"{len(category_groups)=}")
-    print(f"{len(categories)=}")
-    print(f"{len(months)=}")
-    print(f"{len(transactions)=}")
-    print(f"{len(subtransactions)=}")
-    print(f"{len(scheduled_transactions)=}")
-    print(f"{len(scheduled_subtransactions)=}")
-    # print(budget.months[-1].model_dump_json(by_alias=True, exclude_unset=True, indent=2))
-    print(f"Last month in list={budget.months[-1].month}")
+    state = source = None
+    if state_path is not None:
+        state = ExportState.load(state_path)
+        state.check_start(start)
+        source = export_source(
+            budget_detail_response,
+            [
+                sorted(target_account_names),
+                sorted(exclude_account_names),
+                drop,
+                unapproved_prefix,
+                balance_forward_mode,
+            ],
+        )
+        if source is not None and state.source == source:
+            print("delta: the export hasn't changed since the last run")
+            with profiling.phase("dump"):
+                write_budget(
+                    output_path,
+                    with_budget(budget_detail_response, empty_delta(budget)),
+                    workers,
+                    compact,
+                )
+            return
+    index = BudgetIndex(budget)
+    months = cast(list["MonthDetail"], budget.months)
+    transactions = cast(list["TransactionSummary"], budget.transactions)
+    subtransactions = cast(list["SubTransaction"], budget.subtransactions)
+    rule = SliceRule(
+        start=start,
+        always=keep_account_ids(index, target_account_names, exclude_account_names),
+    )
+    with profiling.phase("filter"):
+        s, filtered_transactions, filtered_subtransactions = slice_transactions(
+            rule, transactions, subtransactions
+        )
+
+    print_account_stats(index, s)
+    print_budget_stats(budget, budget_lengths(budget))
+    print(f"Last month in list={months[-1].month}")
     print(transactions[-1].model_dump_json(by_alias=True, exclude_unset=True, indent=2))
-    # print(subtransactions[0].model_dump_json(by_alias=True, exclude_unset=True, indent=2))
-
-    filtered_transactions = [
-        t for t in transactions if t.account_id in keep_accounts or t.var_date >= start
-    ]
-    if unapproved_prefix:
-        for t in filtered_transactions:
-            if not t.approved:
-                orig_memo = (t.memo or "").strip()
-                t.memo = f"{unapproved_prefix}{f' {orig_memo}' if orig_memo else ''}"
-    ftdict = {t.id: t for t in filtered_transactions}
-    deleted_amounts: defaultdict[str, int] = defaultdict(int)
-    fake_payee_ids = [p.id for p in payees if p.name == "Fake"]
-    if len(fake_payee_ids) != 1:
-        msg = f"Wrong number of Fake payees {len(fake_payee_ids)}"
-        raise RuntimeError(msg)
-    fake_payee_id = fake_payee_ids[0]
-    inflow_category_ids = [
-        c.id for c in categories if c.name == "Inflow: Ready to Assign"
-    ]
-    if len(inflow_category_ids) != 1:
-        msg = f"Wrong number of inflow categories {len(inflow_category_ids)}"
-        raise RuntimeError(msg)
-    inflow_category_id = inflow_category_ids[0]
-    for t in transactions:
-        if t.id not in ftdict:
-            deleted_amounts[t.account_id] += t.amount
-    filtered_subtransactions = [
-        s for s in subtransactions if s.transaction_id in ftdict
-    ]
-    filtered_payee_ids = set(
-        [fake_payee_id]
-        + [t.payee_id for t in filtered_transactions if t.payee_id is not None]
-        + [s.payee_id for s in filtered_subtransactions if s.payee_id is not None]
-    )
-    filtered_payees = [p for p in payees if p.id in filtered_payee_ids]
-    filtered_months = [m for m in months if m.month >= start]
 
-    if drop:
-        ftcount: defaultdict[str, int] = defaultdict(int)
-        for t in filtered_transactions:
-            ftcount[t.account_id] += 1
-        filtered_accounts = [a for a in accounts if ftcount[a.id] > 0]
-    else:
-        filtered_accounts = accounts
+    with profiling.phase("balance-forward"):
+        forward = None
+        if balance_forward_mode != "account":
+            rollup = new_rollup(rule, balance_forward_mode, index)
+            rollup.add_models(transactions, subtransactions)
+            forward = rollup.balance_forward(
+                start, index.fake_payee_id(), index.inflow_category_id(), months
+            )
+        filtered_budget, balance_forward_transactions = forward_budget(
+            index,
+            s,
+            filtered_transactions,
+            filtered_subtransactions,
+            unapproved_prefix,
+            drop,
+            forward,
+        )
+    # An account balance forward is the dropped amount by construction; one
+    # split by a rollup is checked against the export, as is any --verify.
+    if forward is not None or verify:
+        with profiling.phase("verify"):
+            check_balances(
+                account_totals(transactions),
+                account_totals(
+                    cast(list["TransactionSummary"], filtered_budget.transactions)
+                ),
+            )
+            if verify:
+                raise_problems(str(output_path), check_budget(filtered_budget))
+    if prune_months:
+        filtered_budget.months = [
+            prune_month(m) for m in cast(list["MonthDetail"], filtered_budget.months)
+        ]
+    print_slice_stats(filtered_budget, len(balance_forward_transactions))
+    print_balance_forward(index, balance_forward_transactions, forward)
 
-    print(f"{len(filtered_accounts)=}")
-    print(f"{len(filtered_transactions)=}")
-    print(f"{len(filtered_subtransactions)=}")
-    print(f"{len(filtered_payees)=}")
-    print(f"{len(filtered_months)=}")
-
-    balance_forward_transactions = [
-        TransactionSummary(
-            id=str(uuid4()),
-            date=start - timedelta(days=1),
-            amount=amount,
-            cleared=TransactionClearedStatus.RECONCILED,
-            approved=True,
-            account_id=account_id,
-            deleted=False,
-            payee_id=fake_payee_id,
-            category_id=inflow_category_id,
-            memo="Balance forward",
+    if state is not None:
+        with profiling.phase("delta"):
+            filtered_budget, delta = delta_budget(
+                filtered_budget, balance_forward_transactions, state
+            )
+            state.source = source
+        delta.report()
+        print_slice_stats(filtered_budget)
+
+    with profiling.phase("dump"):
+        write_budget(
+            output_path,
+            with_budget(budget_detail_response, filtered_budget),
+            workers,
+            compact,
         )
-        for account_id, amount in deleted_amounts.items()
-        if amount != 0
-    ]
+    if state_path is not None and state is not None:
+        state.save(state_path)
+
 
-    budget.first_month = max(
-        filtered_months[-1].month, date(start.year, start.month, 1)
+def new_rollup(
+    rule: SliceRule, balance_forward_mode: str, index: BudgetIndex
+) -> Rollup:
+    return Rollup(
+        rule,
+        by_category=True,
+        by_month=balance_forward_mode == "carryover",
+        off_budget={
+            str(a.id) for a in index.accounts.by_id.values() if not a.on_budget
+        },
     )
-    budget.accounts = filtered_accounts
-    budget.transactions = filtered_transactions + balance_forward_transactions
-    budget.subtransactions = filtered_subtransactions
-    budget.payees = filtered_payees
-    budget.months = filtered_months
-    # print(json.dumps(sorted([p.name for p in filtered_payees]), indent=2))
+
+
+def print_balance_forward(
+    index: BudgetIndex,
+    balance_forward_transactions: list[TransactionSummary],
+    forward: BalanceForward | None = None,
+):
+    splits = [] if forward is None else forward.subtransactions
     for t in balance_forward_transactions:
         print(
-            adict[t.account_id].name,
+            index.accounts[t.account_id].name,
             t.model_dump_json(by_alias=True, exclude_unset=True, indent=2),
         )
+        for st in splits:
+            if st.transaction_id == t.id:
+                category = index.categories.by_id.get(str(st.category_id))
+                print(f"  {category.name if category else st.category_id}: {st.amount}")
+    if forward is not None and forward.month is not None:
+        print(f"Carryover budgeted in {forward.month.month}")
+
+
+def main_stream(
+    input_path: Path,
+    output_path: Path,
+    start: date,
+    unapproved_prefix: str,
+    target_account_names: set[str],
+    exclude_account_names: set[str],
+    drop: bool,
+    prune_months: bool,
+    compact: bool,
+    staging: bool,
+    export_index: bool,
+    balance_forward_mode: str,
+    verify: bool,
+):
+    # Same slice as main, but transactions, subtransactions and months are
+    # read one record at a time: once into a TransactionStore, once to write
+    # out the kept rows.  With `staging`, they are read from a StagingStore
+    # instead, sliced by its queries; with `export_index`, from an ExportIndex.
+    staged = records = None
+    if export_index:
+        staged = ExportIndex.of(input_path)
+        budget_detail_response = staged.skeleton()
+    elif staging:
+        staged = StagingStore.open(input_path)
+        budget_detail_response = staged.skeleton()
+    else:
+        with profiling.phase("scan"):
+            budget_detail_response, records = load_budget_skeleton(input_path)
+    budget = budget_detail_response.data.budget
+    index = BudgetIndex(budget)
+    rule = SliceRule(
+        start=start,
+        always=set(
+            [
+                str(a)
+                for a in keep_account_ids(
+                    index, target_account_names, exclude_account_names
+                )
+            ]
+        ),
+    )
 
-    _ = output_path.write_text(
-        budget_detail_response.model_dump_json(
-            by_alias=True, exclude_unset=True, indent=2
+    s = BudgetSlice(rule)
+    month_records: Iterator[dict[str, Any]]
+    if staged is not None:
+        with profiling.phase("filter"):
+            staged.slice(s)
+            window = staged.month_window(rule)
+        last_transaction = staged.last_transaction()
+        totals_before = staged.account_totals
+        month_count = window.count
+        last_month = window.last
+        last_filtered_month = window.last_kept
+        filtered_month_count = window.kept_count
+        month_records = staged.kept_months(rule)
+        transaction_records = staged.kept_transactions()
+        subtransaction_records = staged.kept_subtransactions()
+    else:
+        assert records is not None
+        with profiling.phase("columnar"):
+            store = TransactionStore.load(
+                records("transactions"), records("subtransactions")
+            )
+        with profiling.phase("filter"):
+            transaction_mask, subtransaction_mask = store.slice(s)
+        last_transaction = store.last_transaction
+        totals_before = store.account_totals
+        month_count = 0
+        last_month: date | None = None
+        last_filtered_month: date | None = None
+        # Months out of range are dropped as they are read, so only the kept
+        # ones are held until the dump, and each only until it is written.
+        kept_months: deque[dict[str, Any]] = deque()
+        with profiling.phase("months"):
+            for last_month, m in records.months(rule.in_range):
+                month_count += 1
+                if m is not None:
+                    kept_months.append(m)
+                    last_filtered_month = last_month
+        filtered_month_count = len(kept_months)
+        month_records = (kept_months.popleft() for _ in range(filtered_month_count))
+        transaction_records = compress(records("transactions"), transaction_mask)
+        subtransaction_records = compress(
+            records("subtransactions"), subtransaction_mask
         )
+
+    print_account_stats(index, s)
+    lengths = budget_lengths(budget)
+    lengths["months"] = month_count
+    lengths["transactions"] = s.transaction_count
+    lengths["subtransactions"] = s.subtransaction_count
+    print_budget_stats(budget, lengths)
+    print(f"Last month in list={last_month}")
+    if last_transaction is None or last_filtered_month is None:
+        msg = "No transactions, or no months on or after start"
+        raise RuntimeError(msg)
+    print(
+        cast(
+            "TransactionSummary", ynab.TransactionSummary.from_dict(last_transaction)
+        ).model_dump_json(by_alias=True, exclude_unset=True, indent=2)
     )
 
+    fake_payee_id = index.fake_payee_id()
+    inflow_category_id = index.inflow_category_id()
+    s.payee_ids.add(str(fake_payee_id))
+    filtered_payees = index.payees.in_order(s.payee_ids)
+    if drop:
+        filtered_accounts = index.accounts.in_order(s.kept_account_ids())
+    else:
+        filtered_accounts = cast(list["Account"], budget.accounts)
+
+    print(f"{len(filtered_accounts)=}")
+    print(f"len(filtered_transactions)={s.kept_transaction_count}")
+    print(f"len(filtered_subtransactions)={s.kept_subtransaction_count}")
+    print(f"{len(filtered_payees)=}")
+    print(f"len(filtered_months)={filtered_month_count}")
+
+    forward = None
+    if balance_forward_mode == "account":
+        balance_forward_transactions = [
+            balance_forward_transaction(
+                account_id, amount, start, fake_payee_id, inflow_category_id
+            )
+            for account_id, amount in s.dropped_amounts.items()
+            if amount != 0
+        ]
+    else:
+        # Another pass, over whole records, for their categories.
+        with profiling.phase("balance-forward"):
+            rollup = new_rollup(rule, balance_forward_mode, index)
+            if staged is not None:
+                rollup.add_records(
+                    staged.transaction_records(), staged.subtransaction_records()
+                )
+                month = staged.month(month_of(start - timedelta(days=1)))
+            else:
+                assert records is not None
+                rollup.add_records(records("transactions"), records("subtransactions"))
+                month = records.month(month_of(start - timedelta(days=1)))
+            forward = rollup.balance_forward(
+                start,
+                fake_payee_id,
+                inflow_category_id,
+                []
+                if month is None
+                else [cast("MonthDetail", ynab.MonthDetail.from_dict(month))],
+            )
+        balance_forward_transactions = forward.transactions
+    totals_after: defaultdict[str, int] = defaultdict(int)
+
+    def filtered_months() -> Iterator[MonthDetail]:
+        months: Iterable[MonthDetail] = (
+            cast("MonthDetail", ynab.MonthDetail.from_dict(m)) for m in month_records
+        )
+        if forward is not None and forward.month is not None:
+            months = chain(months, [forward.month])
+        for month in months:
+            yield prune_month(month) if prune_months else month
+
+    def filtered_transactions() -> Iterator[TransactionSummary]:
+        for t in transaction_records:
+            transaction = cast(
+                "TransactionSummary", ynab.TransactionSummary.from_dict(t)
+            )
+            if unapproved_prefix:
+                mark_unapproved(transaction, unapproved_prefix)
+            totals_after[transaction.account_id] += transaction.amount
+            yield transaction
+        for transaction in balance_forward_transactions:
+            totals_after[transaction.account_id] += transaction.amount
+            yield transaction
+
+    def filtered_subtransactions() -> Iterator[SubTransaction]:
+        for st in subtransaction_records:
+            yield cast("SubTransaction", ynab.SubTransaction.from_dict(st))
+        if forward is not None:
+            yield from forward.subtransactions
+
+    budget.first_month = max(last_filtered_month, date(start.year, start.month, 1))
+    if forward is not None and forward.month is not None:
+        budget.first_month = forward.month.month
+    budget.accounts = filtered_accounts
+    budget.payees = filtered_payees
+    print_balance_forward(index, balance_forward_transactions, forward)
+
+    arrays: dict[str, Iterable[Any]] = {
+        "months": filtered_months(),
+        "transactions": filtered_transactions(),
+        "subtransactions": filtered_subtransactions(),
+    }
+    check = None
+    if verify:
+        # Checked as they are written.
+        check = IntegrityCheck()
+        check.add_budget(budget, skip=arrays)
+        arrays = {key: check.watch(key, models) for key, models in arrays.items()}
+    with profiling.phase("dump"), open_output(output_path) as f:
+        if compact:
+            write_compact(f, budget, arrays)
+        else:
+            jsonstream.write_model(f, budget_detail_response, arrays)
+    if forward is not None or check is not None:
+        with profiling.phase("verify"):
+            check_balances(totals_before(), totals_after)
+            if check is not None:
+                raise_problems(str(output_path), check.problems())
+    if staged is not None:
+        staged.close()
+
 
 if __name__ == "__main__":
     main(sys.argv[1:])
@@ -0,0 +1,186 @@
+# Integrity checks for exports and the slices made of them: every id a budget
+# refers to (accounts, payees, categories, category groups, the parents of
+# subtransactions and the other side of transfers) is in it, ids are unique, and slicing keeps each account's
+# balance.  A dangling reference otherwise only shows up as a failed import.
+#
+# Ids are gathered into sets a batch of records at a time and compared with
+# set operations at the end, so checking costs a small fraction of slicing.
+# The scripts run this on their output with --verify; `integrity.py EXPORT...`
+# checks exports.
+
+import argparse
+import sys
+from collections import defaultdict
+from itertools import batched
+from operator import attrgetter
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, cast
+
+from budget_json import DEFAULT_PARSER, available_parsers
+from budget_slice import load_budget
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Mapping
+
+    from ynab import BudgetDetail, MonthDetail, TransactionSummary
+
+    from budget_slice import Id
+
+
+# Array, field, and the array whose ids it refers to.
+REFERENCES = (
+    ("transactions", "account_id", "accounts"),
+    ("transactions", "payee_id", "payees"),
+    ("transactions", "category_id", "categories"),
+    ("transactions", "transfer_account_id", "accounts"),
+    ("transactions", "transfer_transaction_id", "transactions"),
+    ("subtransactions", "transaction_id", "transactions"),
+    ("subtransactions", "payee_id", "payees"),
+    ("subtransactions", "category_id", "categories"),
+    ("subtransactions", "transfer_account_id", "accounts"),
+    ("subtransactions", "transfer_transaction_id", "transactions"),
+    ("payees", "transfer_account_id", "accounts"),
+    ("categories", "category_group_id", "category_groups"),
+)
+_FIELDS = {
+    array: [name for a, name, _ in REFERENCES if a == array]
+    for array, _, _ in REFERENCES
+}
+
+_BATCH = 10_000
+# Of the missing ids in each problem.
+_EXAMPLES = 3
+
+
+class IntegrityCheck:
+    """Ids of a budget's arrays and the ids they refer to, added an array
+    (or a batch of one) at a time."""
+
+    def __init__(self):
+        self.ids: defaultdict[str, set[Id]] = defaultdict(set)
+        self.counts: defaultdict[str, int] = defaultdict(int)
+        self.refs: defaultdict[tuple[str, str], set[Id | None]] = defaultdict(set)
+
+    def add(self, array: str, models: Iterable[Any]):
+        for batch in batched(models, _BATCH, strict=False):
+            self._add_batch(array, batch)
+
+    def watch[M](self, array: str, models: Iterable[M]) -> Iterator[M]:
+        """`models`, added as they are iterated."""
+        for batch in batched(models, _BATCH, strict=False):
+            self._add_batch(array, batch)
+            yield from batch
+
+    def _add_batch(self, array: str, batch: tuple[Any, ...]):
+        if array == "months":
+            # Months have no ids, but their categories refer to categories.
+            self.refs["months", "categories"].update(
+                c.id
+                for m in cast("tuple[MonthDetail, ...]", batch)
+                for c in m.categories
+            )
+            return
+        self.counts[array] += len(batch)
+        self.ids[array].update(map(attrgetter("id"), batch))
+        for name in _FIELDS.get(array, ()):
+            self.refs[array, name].update(map(attrgetter(name), batch))
+
+    def add_budget(self, budget: BudgetDetail, skip: Iterable[str] = ()):
+        """Add the arrays of `budget`, except those in `skip` (to be watched
+        as they are written)."""
+        for array in (
+            "accounts",
+            "payees",
+            "category_groups",
+            "categories",
+            "months",
+            "transactions",
+            "subtransactions",
+        ):
+            if array not in skip:
+                self.add(array, cast("list[Any]", getattr(budget, array) or []))
+
+    def problems(self) -> list[str]:
+        problems: list[str] = []
+        for array, count in self.counts.items():
+            if count != len(self.ids[array]):
+                problems.append(f"{count - len(self.ids[array])} duplicate {array} ids")
+        references = [*REFERENCES, ("months", "categories", "categories")]
+        for array, name, target in references:
+            refs = self.refs.get((array, name))
+            if not refs or target not in self.counts:
+                continue
+            missing = refs - self.ids[target]
+            missing.discard(None)
+            if missing:
+                examples = sorted(map(str, missing))[:_EXAMPLES]
+                problems.append(
+                    f"{array}.{name}: {len(missing)} ids not in {target}, e.g. {examples}"
+                )
+        return problems
+
+
+def check_budget(budget: BudgetDetail) -> list[str]:
+    """Dangling references and duplicate ids in `budget`."""
+    check = IntegrityCheck()
+    check.add_budget(budget)
+    return check.problems()
+
+
+def raise_problems(what: str, problems: list[str]):
+    if problems:
+        msg = f"{what} failed verification: " + "; ".join(problems)
+        raise RuntimeError(msg)
+
+
+def account_totals(transactions: Iterable[TransactionSummary]) -> dict[Id, int]:
+    totals: defaultdict[Id, int] = defaultdict(int)
+    for t in transactions:
+        totals[t.account_id] += t.amount
+    return totals
+
+
+def check_balances(before: Mapping[Id, int], after: Mapping[Id, int]):
+    """Raise unless each account's transactions add up to the same in a
+    slice (kept plus balance forward) as in the export."""
+    before = {str(a): amount for a, amount in before.items()}
+    after = {str(a): amount for a, amount in after.items()}
+    wrong = [
+        (a, before.get(a, 0), after.get(a, 0))
+        for a in before.keys() | after.keys()
+        if before.get(a, 0) != after.get(a, 0)
+    ]
+    if wrong:
+        msg = "Balances changed by slicing (account, export, output): " + ", ".join(
+            f"({a}, {b}, {c})" for a, b, c in sorted(wrong)
+        )
+        raise RuntimeError(msg)
+
+
+def main(argv: list[str]):
+    parser = argparse.ArgumentParser(
+        description="Check exports for dangling references and duplicate ids"
+    )
+    _ = parser.add_argument("inputs", nargs="+", metavar="EXPORT")
+    _ = parser.add_argument(
+        "--parser",
+        choices=available_parsers(),
+        default=DEFAULT_PARSER,
+        help="JSON parser to load the exports with",
+    )
+    args = parser.parse_args(argv)
+    failed = False
+    for input_path in cast(list[str], args.inputs):
+        budget = load_budget(Path(input_path), cast(str, args.parser)).data.budget
+        problems = check_budget(budget)
+        print(f"{input_path}: {'ok' if not problems else 'FAILED'}")
+        for problem in problems:
+            print(f"  {problem}")
+        failed = failed or bool(problems)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,42 +1,60 @@
 # For importing the complement of the set of stuff imported by example.py
 
 import argparse
-import json
 import sys
-from collections import defaultdict
-from typing import TYPE_CHECKING, cast
-
-
-if TYPE_CHECKING:
-    from collections.abc import Mapping
-
 from datetime import date, datetime
-from operator import itemgetter
+from functools import partial
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, cast
 
-from ynab import Account, BudgetDetailResponse
+import jsonstream
+import profiling
+import ynab_api
+from budget_cache import BudgetCache
+from budget_index import BudgetIndex
+from budget_json import DEFAULT_PARSER, available_parsers
+from budget_slice import (
+    BudgetSlice,
+    SliceRule,
+    budget_lengths,
+    inverse_budget,
+    load_budget,
+    parse_account_names,
+    print_account_stats,
+    print_budget_stats,
+    print_slice_stats,
+    prune_month,
+    slice_transactions,
+    with_budget,
+    write_budget,
+)
+from compact import open_output, write_compact
+from integrity import IntegrityCheck, check_budget, raise_problems
+from lazy import lazy_import
+from staging import ExportIndex, StagingStore
 
 
-INVERSE = True  # TODO: flag
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
 
+    import ynab
+    from ynab import MonthDetail, SubTransaction, TransactionSummary
+else:
+    ynab = lazy_import("ynab")
 
-def account_names_to_ids(
-    account_name_dict: Mapping[str, Account], account_names: set[str]
-):
-    missing: list[str] = []
-    for a in account_names:
-        if a not in account_name_dict:
-            missing.append(a)
-    if missing:
-        message = f"No such account(s): {missing}"
-        raise RuntimeError(message)
-    return set([a.id for a in account_name_dict.values() if a.name in account_names])
+
+INVERSE = True  # TODO: flag
 
 
 def main(argv: list[str]):
     parser = argparse.ArgumentParser()
     _ = parser.add_argument("--input", "-i", default="ynab-json/budget-in.json")
-    _ = parser.add_argument("--output", "-o", default="ynab-json/budget-out.json")
+    _ = parser.add_argument(
+        "--output",
+        "-o",
+        default="ynab-json/budget-out.json",
+        help="Compressed with gzip or zstd if named *.gz or *.zst",
+    )
     _ = parser.add_argument(
         "--end", "-e", required=True, help="End date in YYYY-MM-DD format"
     )
@@ -44,115 +62,217 @@ def main(argv: list[str]):
         "--drop",
         "-d",
         default="",
-        help="Comma-separated list of account names to drop.",
+        help="Comma-separated list of account names, globs or re:regexes to drop.",
+    )
+    _ = parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=1,
+        help="Processes to serialize the output with",
+    )
+    _ = parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Parse the input even if it is in the parsed budget cache",
+    )
+    _ = parser.add_argument(
+        "--parser",
+        choices=available_parsers(),
+        default=DEFAULT_PARSER,
+        help="JSON parser to load the input with",
+    )
+    _ = parser.add_argument(
+        "--prune-months",
+        action="store_true",
+        help="Write only the month category fields the Actual importer reads",
+    )
+    _ = parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Write minified JSON with only the fields the Actual importer reads (which these scripts can't read back)",
+    )
+    _ = parser.add_argument(
+        "--staging",
+        action="store_true",
+        help="Stage the export in a SQLite database (kept for later runs) and slice it there, in constant memory",
     )
+    _ = parser.add_argument(
+        "--index",
+        action="store_true",
+        help="Like --staging, but with a sidecar index (EXPORT.index, built on first use) and only the kept records read from the export",
+    )
+    _ = parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Check the output for dangling references and duplicate ids",
+    )
+    ynab_api.add_arguments(parser)
+    profiling.add_arguments(parser)
     args = parser.parse_args(argv)
+    profiling.configure(args)
     input_path = Path(cast(str, args.input))
     output_path = Path(cast(str, args.output))
     end = datetime.strptime(cast(str, args.end), "%Y-%m-%d").date()
-    drop_account_names = set([a.strip() for a in cast(str, args.drop).split(",") if a])
+    drop_account_names = parse_account_names(cast(str, args.drop))
+    workers = cast(int, args.workers)
+    prune_months = cast(bool, args.prune_months)
+    compact = cast(bool, args.compact)
+    json_parser = cast(str, args.parser)
+    cache = not cast(bool, args.no_cache)
+    budget_id = cast("str | None", args.budget_id)
+    full_fetch = cast(bool, args.full_fetch)
+    verify = cast(bool, args.verify)
+    export_index = cast(bool, args.index)
+    if cast(bool, args.staging) or export_index:
+        if budget_id is not None:
+            msg = (
+                "--staging and --index read --input, so can't be used with --budget-id"
+            )
+            raise RuntimeError(msg)
+        main_staged(
+            input_path,
+            output_path,
+            end,
+            drop_account_names,
+            prune_months,
+            compact,
+            export_index,
+            verify,
+        )
+        return
 
-    with input_path.open("r") as f:
-        budget_detail_response = BudgetDetailResponse.from_dict(json.load(f))  # pyright: ignore[reportAny]
-    if budget_detail_response is None:
-        msg = "Bad JSON"
-        raise RuntimeError(msg)
+    with profiling.phase("load"):
+        if budget_id is not None:
+            budget_detail_response = ynab_api.fetch(budget_id, full_fetch)
+        elif cache:
+            budget_detail_response = BudgetCache().load(
+                input_path, partial(load_budget, parser=json_parser)
+            )
+        else:
+            budget_detail_response = load_budget(input_path, json_parser)
     budget = budget_detail_response.data.budget
-    if (
-        budget.first_month is None
-        or budget.last_month is None
-        or budget.accounts is None
-        or budget.payees is None
-        or budget.payee_locations is None
-        or budget.category_groups is None
-        or budget.categories is None
-        or budget.months is None
-        or budget.transactions is None
-        or budget.subtransactions is None
-        or budget.scheduled_transactions is None
-        or budget.scheduled_subtransactions is None
-    ):
-        msg = "budget is missing key fields"
-        raise RuntimeError(msg)
-    accounts = budget.accounts
-    payees = budget.payees
-    category_groups = budget.category_groups
-    categories = budget.categories
-    months = budget.months
-    transactions = budget.transactions
-    subtransactions = budget.subtransactions
-    scheduled_transactions = budget.scheduled_transactions
-    scheduled_subtransactions = budget.scheduled_subtransactions
-    account_name_dict = {a.name: a for a in accounts}
-    drop_accounts = account_names_to_ids(account_name_dict, drop_account_names)
-
-    # For stats only (AFAIK)
-    adict = {a.id: a for a in accounts}
-    tcount: defaultdict[str, int] = defaultdict(int)
-    latest: defaultdict[str, date] = defaultdict(lambda: date.min)
-    for t in transactions:
-        tcount[t.account_id] += 1
-        if t.var_date > latest[t.account_id]:
-            latest[t.account_id] = t.var_date
-    # for a in accounts:
-    #  print(f"{a.name} {tcount[a.id]} transactions")
-    for a_id, count in sorted(tcount.items(), key=itemgetter(1), reverse=True):
-        print(f"{adict[a_id].name}: {count} transactions, latest {latest[a_id]}")
-
-    print(f"{budget.first_month=}")
-    print(f"{budget.last_month=}")
-    print(f"{len(accounts)=}")
-    print(f"{len(payees)=}")
-    print(f"{len(category_groups)=}")
-    print(f"{len(categories)=}")
-    print(f"{len(months)=}")
-    print(f"{len(transactions)=}")
-    print(f"{len(subtransactions)=}")
-    print(f"{len(scheduled_transactions)=}")
-    print(f"{len(scheduled_subtransactions)=}")
-    print(f"First month in list={budget.months[0].month}")
-    print(f"Last month in list={budget.months[-1].month}")
+    index = BudgetIndex(budget)
+    months = cast(list["MonthDetail"], budget.months)
+    transactions = cast(list["TransactionSummary"], budget.transactions)
+    subtransactions = cast(list["SubTransaction"], budget.subtransactions)
+    rule = SliceRule(end=end, never=index.select_accounts(drop_account_names))
+    with profiling.phase("filter"):
+        s, filtered_transactions, filtered_subtransactions = slice_transactions(
+            rule, transactions, subtransactions
+        )
+
+    print_account_stats(index, s)
+    print_budget_stats(budget, budget_lengths(budget))
+    print(f"First month in list={months[0].month}")
+    print(f"Last month in list={months[-1].month}")
     print(transactions[-1].model_dump_json(by_alias=True, exclude_unset=True, indent=2))
 
-    filtered_transactions = [
-        t
-        for t in transactions
-        if t.account_id not in drop_accounts and t.var_date <= end
-    ]
-    ftdict = {t.id: t for t in filtered_transactions}
-    filtered_subtransactions = [
-        s for s in subtransactions if s.transaction_id in ftdict
-    ]
-    filtered_payee_ids = set(
-        [t.payee_id for t in filtered_transactions if t.payee_id is not None]
-        + [s.payee_id for s in filtered_subtransactions if s.payee_id is not None]
-    )
-    filtered_payees = [p for p in payees if p.id in filtered_payee_ids]
-    filtered_months = [m for m in months if m.month <= end]
-    ftcount: defaultdict[str, int] = defaultdict(int)
-    for t in filtered_transactions:
-        ftcount[t.account_id] += 1
-    filtered_accounts = [a for a in accounts if ftcount[a.id] > 0]
-
-    print(f"{len(filtered_accounts)=}")
-    print(f"{len(filtered_transactions)=}")
-    print(f"{len(filtered_subtransactions)=}")
-    print(f"{len(filtered_payees)=}")
-    print(f"{len(filtered_months)=}")
-
-    budget.last_month = min(filtered_months[0].month, date(end.year, end.month, 1))
-    budget.accounts = filtered_accounts
-    budget.transactions = filtered_transactions
-    budget.subtransactions = filtered_subtransactions
-    budget.payees = filtered_payees
-    budget.months = filtered_months
-    # print(json.dumps(sorted([p.name for p in filtered_payees]), indent=2))
-
-    _ = output_path.write_text(
-        budget_detail_response.model_dump_json(
-            by_alias=True, exclude_unset=True, indent=2
+    with profiling.phase("inverse"):
+        filtered_budget = inverse_budget(
+            index, s, filtered_transactions, filtered_subtransactions
+        )
+    if prune_months:
+        filtered_budget.months = [
+            prune_month(m) for m in cast(list["MonthDetail"], filtered_budget.months)
+        ]
+    print_slice_stats(filtered_budget)
+    # print(json.dumps(sorted([p.name for p in filtered_budget.payees]), indent=2))
+    if verify:
+        with profiling.phase("verify"):
+            raise_problems(str(output_path), check_budget(filtered_budget))
+
+    with profiling.phase("dump"):
+        write_budget(
+            output_path,
+            with_budget(budget_detail_response, filtered_budget),
+            workers,
+            compact,
         )
+
+
+def main_staged(
+    input_path: Path,
+    output_path: Path,
+    end: date,
+    drop_account_names: set[str],
+    prune_months: bool,
+    compact: bool,
+    export_index: bool,
+    verify: bool,
+):
+    # Same slice as main, cut by a StagingStore's (or with `export_index`, an
+    # ExportIndex's) queries and written out from its cursors.
+    staged = (
+        ExportIndex.of(input_path) if export_index else StagingStore.open(input_path)
     )
+    budget_detail_response = staged.skeleton()
+    budget = budget_detail_response.data.budget
+    index = BudgetIndex(budget)
+    rule = SliceRule(end=end, never=index.select_accounts(drop_account_names))
+    s = BudgetSlice(rule)
+    with profiling.phase("filter"):
+        staged.slice(s)
+        window = staged.month_window(rule)
+    last_transaction = staged.last_transaction()
+
+    print_account_stats(index, s)
+    lengths = budget_lengths(budget)
+    lengths["months"] = window.count
+    lengths["transactions"] = s.transaction_count
+    lengths["subtransactions"] = s.subtransaction_count
+    print_budget_stats(budget, lengths)
+    print(f"First month in list={window.first}")
+    print(f"Last month in list={window.last}")
+    if last_transaction is None or window.first_kept is None:
+        msg = "No transactions, or no months on or before end"
+        raise RuntimeError(msg)
+    print(
+        cast(
+            "TransactionSummary", ynab.TransactionSummary.from_dict(last_transaction)
+        ).model_dump_json(by_alias=True, exclude_unset=True, indent=2)
+    )
+
+    budget.last_month = min(window.first_kept, date(end.year, end.month, 1))
+    budget.accounts = index.accounts.in_order(s.kept_account_ids())
+    budget.payees = index.payees.in_order(s.payee_ids)
+    print(f"len(filtered_accounts)={len(budget.accounts)}")
+    print(f"len(filtered_transactions)={s.kept_transaction_count}")
+    print(f"len(filtered_subtransactions)={s.kept_subtransaction_count}")
+    print(f"len(filtered_payees)={len(budget.payees)}")
+    print(f"len(filtered_months)={window.kept_count}")
+
+    def filtered_months() -> Iterator[MonthDetail]:
+        for m in staged.kept_months(rule):
+            month = cast("MonthDetail", ynab.MonthDetail.from_dict(m))
+            yield prune_month(month) if prune_months else month
+
+    arrays: dict[str, Iterable[Any]] = {
+        "months": filtered_months(),
+        "transactions": (
+            cast("TransactionSummary", ynab.TransactionSummary.from_dict(t))
+            for t in staged.kept_transactions()
+        ),
+        "subtransactions": (
+            cast("SubTransaction", ynab.SubTransaction.from_dict(st))
+            for st in staged.kept_subtransactions()
+        ),
+    }
+    check = None
+    if verify:
+        # Checked as they are written.
+        check = IntegrityCheck()
+        check.add_budget(budget, skip=arrays)
+        arrays = {key: check.watch(key, models) for key, models in arrays.items()}
+    with profiling.phase("dump"), open_output(output_path) as f:
+        if compact:
+            write_compact(f, budget, arrays)
+        else:
+            jsonstream.write_model(f, budget_detail_response, arrays)
+    staged.close()
+    if check is not None:
+        with profiling.phase("verify"):
+            raise_problems(str(output_path), check.problems())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,349 @@
+# Incremental reading and writing of budget exports too large to hold in
+# memory as a single dict tree / pydantic model / output string.
+
+import codecs
+import json
+import re
+import sys
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from operator import itemgetter
+from typing import TYPE_CHECKING, Any, BinaryIO
+
+from compact import open_input
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Collection, Iterable, Iterator, Mapping
+    from concurrent.futures import Executor, Future
+    from pathlib import Path
+    from typing import TextIO
+
+    from pydantic import BaseModel
+
+
+CHUNK_SIZE = 1 << 20
+BUDGET_INDENT = 6  # indent of data.budget members in model_dump_json(indent=2)
+# write_model with workers splits each array into about this many chunks,
+# but no smaller than PARALLEL_CHUNK_MIN elements.
+PARALLEL_CHUNKS = 64
+PARALLEL_CHUNK_MIN = 1000
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# What can follow the part of a number that ends a buffer, if it was cut short.
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+# Text up to the next bracket, over whole strings; then any containers with no
+# containers inside, and the text after each.  A string cut short by the end
+# of the buffer is left unmatched.
+_TEXT = r'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*'
+_FLAT = re.compile(rf"{_TEXT}(?:(?:\{{{_TEXT}\}}|\[{_TEXT}\]){_TEXT})*")
+
+
+class JsonReader:
+    """Pull parser over a binary file: containers are walked incrementally,
+    everything else is decoded with the stdlib decoder one value at a time."""
+
+    def __init__(self, f: BinaryIO, offset: int = 0):
+        _ = f.seek(offset)
+        self._f = f
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._base = offset  # byte offset of self._buf[0]
+        self._eof = False
+        # Bytes in self._buf[:self._tell_pos], so tell() only encodes what
+        # was read since it was last called.
+        self._tell_pos = 0
+        self._tell_bytes = 0
+
+    def tell(self) -> int:
+        if self._tell_pos > self._pos:
+            self._tell_pos = self._tell_bytes = 0
+        self._tell_bytes += len(self._buf[self._tell_pos : self._pos].encode())
+        self._tell_pos = self._pos
+        return self._base + self._tell_bytes
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        self._base = self.tell()
+        self._buf = self._buf[self._pos :]
+        self._pos = self._tell_pos = self._tell_bytes = 0
+        data = self._f.read(max(CHUNK_SIZE, len(self._buf)))
+        self._eof = not data
+        self._buf += self._utf8.decode(data, final=self._eof)
+        return not self._eof
+
+    def peek(self) -> str:
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()  # pyright: ignore[reportOptionalMemberAccess]
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                msg = "Unexpected end of JSON input"
+                raise RuntimeError(msg)
+
+    def expect(self, ch: str):
+        if self.peek() != ch:
+            msg = f"Expected {ch!r} at byte {self.tell()}"
+            raise RuntimeError(msg)
+        self._pos += 1
+
+    def value(self) -> Any:
+        _ = self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)  # pyright: ignore[reportAny]
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number or literal ending at the buffer end, or a number followed
+            # only by what could continue it (as in "1." or "2e-"), may be cut
+            # short.
+            if _NUMBER_TAIL.fullmatch(self._buf, end) and self._fill():
+                continue
+            self._pos = end
+            return value  # pyright: ignore[reportAny]
+
+    def skip(self):
+        """Read past a value without decoding it: scalars are decoded, but
+        containers are scanned to their closing bracket."""
+        if self.peek() not in "[{":
+            _ = self.value()  # pyright: ignore[reportAny]
+            return
+        self._pos += 1
+        depth = 1
+        while True:
+            end = _FLAT.match(self._buf, self._pos).end()  # pyright: ignore[reportOptionalMemberAccess]
+            if end == len(self._buf) or self._buf[end] == '"':
+                self._pos = end
+                if not self._fill():
+                    msg = f"Unterminated container before byte {self.tell()}"
+                    raise RuntimeError(msg)
+                continue
+            self._pos = end + 1
+            depth += 1 if self._buf[end] in "[{" else -1
+            if depth == 0:
+                return
+
+    def _separator(self, close: str) -> bool:
+        ch = self.peek()
+        self._pos += 1
+        if ch == close:
+            return False
+        if ch != ",":
+            msg = f"Expected ',' or {close!r} at byte {self.tell() - 1}"
+            raise RuntimeError(msg)
+        return True
+
+    def keys(self) -> Iterator[str]:
+        """Yield the keys of an object; the caller must consume each value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        more = True
+        while more:
+            key = self.value()  # pyright: ignore[reportAny]
+            if not isinstance(key, str):
+                msg = f"Expected string key, got {key!r}"
+                raise RuntimeError(msg)
+            self.expect(":")
+            yield key
+            more = self._separator("}")
+
+    def array(self) -> Iterator[None]:
+        """Yield once per element of an array; the caller must consume each
+        element."""
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        more = True
+        while more:
+            yield
+            more = self._separator("]")
+
+    def elements(self) -> Iterator[Any]:
+        for _ in self.array():
+            yield self.value()
+
+
+def scan_budget(
+    input_path: Path, streamed: Collection[str]
+) -> tuple[dict[str, Any], dict[str, int]]:
+    """Load an export except for the `streamed` arrays of data.budget.
+
+    Returns the document with each of those arrays replaced by [] and the
+    byte offset of each array in the file, for use with iter_array."""
+    offsets: dict[str, int] = {}
+    doc: dict[str, Any] = {}
+    with open_input(input_path) as f:
+        reader = JsonReader(f)
+        for key in reader.keys():
+            if key != "data":
+                doc[key] = reader.value()
+                continue
+            data: dict[str, Any] = {}
+            doc[key] = data
+            for data_key in reader.keys():
+                if data_key != "budget":
+                    data[data_key] = reader.value()
+                    continue
+                budget: dict[str, Any] = {}
+                data[data_key] = budget
+                for budget_key in reader.keys():
+                    if budget_key in streamed and reader.peek() == "[":
+                        offsets[budget_key] = reader.tell()
+                        for _ in reader.elements():
+                            pass
+                        budget[budget_key] = []
+                    else:
+                        budget[budget_key] = reader.value()
+    return doc, offsets
+
+
+def iter_array(input_path: Path, offset: int) -> Iterator[Any]:
+    with open_input(input_path) as f:
+        yield from JsonReader(f, offset).elements()
+
+
+def iter_array_spans(input_path: Path, offset: int) -> Iterator[tuple[int, int, Any]]:
+    """(byte offset, length in bytes, element) for each element of an array."""
+    with open_input(input_path) as f:
+        reader = JsonReader(f, offset)
+        for _ in reader.array():
+            _ = reader.peek()
+            start = reader.tell()
+            value = reader.value()  # pyright: ignore[reportAny]
+            yield start, reader.tell() - start, value
+
+
+def iter_array_where(
+    input_path: Path, offset: int, key: str, keep: Callable[[Any], bool]
+) -> Iterator[tuple[Any, dict[str, Any] | None]]:
+    """(element[key], element) for each object in an array, with None for
+    the element where keep(element[key]) is false.
+
+    The members of those elements after `key` are skipped without being
+    decoded, so only kept elements are ever built."""
+    with open_input(input_path) as f:
+        reader = JsonReader(f, offset)
+        for _ in reader.array():
+            element: dict[str, Any] = {}
+            value = None
+            kept = True
+            for k in reader.keys():
+                if not kept:
+                    reader.skip()
+                    continue
+                member = reader.value()  # pyright: ignore[reportAny]
+                element[k] = member
+                if k == key:
+                    value = member  # pyright: ignore[reportAny]
+                    kept = keep(value)
+            yield value, element if kept else None
+
+
+def _dump_element(m: BaseModel, indent: int) -> str:
+    return " " * indent + m.model_dump_json(
+        by_alias=True, exclude_unset=True, indent=2
+    ).replace("\n", "\n" + " " * indent)
+
+
+# Arrays being written by write_model with workers, set in each worker by
+# the pool's initializer so chunks are addressed by index instead of pickled.
+# Where fork is safe (Linux) workers inherit them; elsewhere the pool's
+# default start method pickles them to each worker once.
+_parallel_arrays: dict[str, Sequence[BaseModel]] = {}
+
+
+def _set_parallel_arrays(arrays: dict[str, Sequence[BaseModel]]):
+    _parallel_arrays.update(arrays)
+
+
+def _dump_chunk(key: str, start: int, end: int, indent: int) -> str:
+    return ",\n".join(
+        _dump_element(m, indent) for m in _parallel_arrays[key][start:end]
+    )
+
+
+def _array_chunks(
+    pool: Executor | None, key: str, models: Iterable[BaseModel], indent: int
+) -> Iterator[Future[str] | str]:
+    if pool is None or not isinstance(models, Sequence):
+        return (_dump_element(m, indent) for m in models)
+    # Chunks start on multiples of PARALLEL_CHUNK_MIN.
+    step = PARALLEL_CHUNK_MIN * max(
+        1, -(-len(models) // (PARALLEL_CHUNKS * PARALLEL_CHUNK_MIN))
+    )
+    return iter(
+        [
+            pool.submit(_dump_chunk, key, start, min(start + step, len(models)), indent)
+            for start in range(0, len(models), step)
+        ]
+    )
+
+
+def write_model(
+    f: TextIO,
+    skeleton: BaseModel,
+    arrays: Mapping[str, Iterable[BaseModel]],
+    indent: int = BUDGET_INDENT,
+    workers: int = 1,
+):
+    """Write `skeleton` with its empty placeholder arrays replaced by
+    `arrays`, byte-identical to model_dump_json(indent=2) of the full model.
+
+    The arrays are members at `indent` in the dump of `skeleton`.  Each
+    iterable is consumed only when its turn in the output comes.  With
+    workers > 1, arrays given as sequences are dumped in chunks on a process
+    pool."""
+    text = skeleton.model_dump_json(by_alias=True, exclude_unset=True, indent=2)
+    splices: list[tuple[int, str, Iterable[BaseModel]]] = []
+    for key, models in arrays.items():
+        # String values cannot contain a raw newline, so this only matches the key.
+        marker = f'\n{" " * indent}"{key}": '
+        start = text.index(marker) + len(marker)
+        if not text.startswith("[]", start):
+            msg = f"{key} is not an empty placeholder"
+            raise RuntimeError(msg)
+        splices.append((start, key, models))
+    splices.sort(key=itemgetter(0))
+
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(
+            workers,
+            mp_context=get_context("fork" if sys.platform == "linux" else None),
+            initializer=_set_parallel_arrays,
+            initargs=(
+                {
+                    key: models
+                    for _, key, models in splices
+                    if isinstance(models, Sequence)
+                },
+            ),
+        )
+    try:
+        # Submit everything up front so workers stay busy while we write.
+        chunks = [
+            _array_chunks(pool, key, models, indent + 2) for _, key, models in splices
+        ]
+        pos = 0
+        for (start, _, _), array_chunks in zip(splices, chunks, strict=True):
+            _ = f.write(text[pos:start])
+            sep = "[\n"
+            for chunk in array_chunks:
+                _ = f.write(sep)
+                _ = f.write(chunk if isinstance(chunk, str) else chunk.result())
+                sep = ",\n"
+            _ = f.write("[]" if sep == "[\n" else "\n" + " " * indent + "]")
+            pos = start + 2
+        _ = f.write(text[pos:])
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
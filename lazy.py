@@ -0,0 +1,30 @@
+# The ynab package imports every model and API module it has, which takes
+# longer than slicing a small budget.  Modules that need it bind it with
+# lazy_import, so it is only imported once a budget is actually loaded or
+# built, and --help, bad arguments and the cli.py dispatcher never wait for
+# it.  check_startup.py keeps it that way.
+
+import importlib.util
+import sys
+from typing import TYPE_CHECKING
+
+
+if TYPE_CHECKING:
+    from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Module `name`, imported when one of its attributes is first used."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        msg = f"No module named {name!r}"
+        raise ModuleNotFoundError(msg, name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -4,57 +4,178 @@
 # TODO: make sure to take allowed fields approach not excluded fields approach.
 
 import argparse
-import json
-import random
+import hashlib
+import hmac
+import secrets
 import sys
+from collections.abc import Sequence
+from functools import cache, lru_cache
 from pathlib import Path
-from typing import cast
-
-from ynab import (
-    Account,
-    BudgetDetail,
-    BudgetDetailResponse,
-    Category,
-    CategoryGroup,
-    MonthDetail,
-    Payee,
-    SubTransaction,
-    TransactionSummary,
-)
-
-from emojis import EMOJIS
+from random import Random
+from typing import TYPE_CHECKING, Any, cast, overload
+
+import jsonstream
+import profiling
+import ynab_api
+from budget_json import DEFAULT_PARSER, available_parsers
+from budget_slice import load_budget
+from compact import open_output
+from emojis import emojis
+from lazy import lazy_import
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+
+    import ynab
+    from pydantic import BaseModel
+    from ynab import (
+        Account,
+        BudgetDetail,
+        Category,
+        CategoryGroup,
+        MonthDetail,
+        Payee,
+        SubTransaction,
+        TransactionSummary,
+    )
+else:
+    ynab = lazy_import("ynab")
 
 
 CODEPOINT_RANGES = [(0x0020, 0xD800), (0xE000, 0xFDD0), (0xFDF0, 0xFFFE)]
-CODEPOINT_COUNT = sum([r[1] - r[0] for r in CODEPOINT_RANGES])
+
+AMOUNT_MODES = ("random", "scaled")
+# Distinct strings and amounts remembered by each process.
+PSEUDONYM_CACHE_SIZE = 1 << 16
+# Random codepoints after the emoji of even the shortest string, so that
+# distinct short names (which the importer matches entities by) stay distinct.
+MIN_TAIL = 6
 
 
-def random_codepoint() -> int:
-    index = random.randrange(CODEPOINT_COUNT)
-    for start, end in CODEPOINT_RANGES:
-        rlen = end - start
-        if index < rlen:
-            return start + index
-        index -= rlen
-    msg = "Internal error, ran out of codepoints"
-    raise RuntimeError(msg)
+@cache
+def codepoints() -> str:
+    """Every allowed codepoint, so a random one is a single index.  Built on
+    first use; it takes a few milliseconds."""
+    return "".join(chr(c) for start, end in CODEPOINT_RANGES for c in range(start, end))
 
 
-def random_str() -> str:
-    return random.choice(EMOJIS) + "".join(
-        chr(random_codepoint()) for _ in range(random.randrange(10, 100))
+def random_str(rng: Random) -> str:
+    return rng.choice(emojis()) + "".join(
+        rng.choices(codepoints(), k=rng.randrange(10, 100))
     )
 
 
-def random_mills() -> int:
-    return random.randint(-5000 * 1000, 5000 * 1000)
+def scaled_mills(value: int, h: int) -> int:
+    """A number picked by `h` with the sign, number of digits and trailing
+    zeros of `value`."""
+    if value == 0:
+        return 0
+    digits = str(abs(value))
+    significant = digits.rstrip("0")
+    low = 10 ** (len(significant) - 1)
+    n = low + h % (9 * low)
+    return (n if value > 0 else -n) * 10 ** (len(digits) - len(significant))
+
+
+class Pseudonymizer:
+    """Replacements for names, memos and amounts keyed by the HMAC of the
+    original under `key`, so equal values get equal replacements in every
+    run, record and process with the same key.
+
+    A non-empty string becomes an emoji and random codepoints, as long as
+    the original or at least MIN_TAIL codepoints longer than the emoji.
+    Amounts are random, or with `amounts="scaled"` the same size as the
+    original."""
+
+    def __init__(self, key: str, amounts: str = "random"):
+        if amounts not in AMOUNT_MODES:
+            msg = f"Unknown amount mode {amounts!r}, expected one of {AMOUNT_MODES}"
+            raise RuntimeError(msg)
+        self.key = key.encode()
+        self.amounts = amounts
+        self._new_caches()
+
+    def _new_caches(self):
+        # Repeated strings and amounts cost one hash.
+        self._text = lru_cache(PSEUDONYM_CACHE_SIZE)(self._new_text)
+        self._mills = lru_cache(PSEUDONYM_CACHE_SIZE)(self._new_mills)
+
+    # The caches don't pickle; a process unpickling one starts its own.
+    def __getstate__(self) -> dict[str, Any]:
+        return {"key": self.key, "amounts": self.amounts}
+
+    def __setstate__(self, state: dict[str, Any]):
+        self.__dict__.update(state)
+        self._new_caches()
+
+    def _digest(self, kind: str, value: str) -> bytes:
+        return hmac.digest(self.key, f"{kind}:{value}".encode(), hashlib.sha256)
+
+    def _new_text(self, value: str) -> str:
+        if not value:
+            return value
+        rng = Random(self._digest("text", value))
+        emoji = rng.choice(emojis())
+        return emoji + "".join(
+            rng.choices(codepoints(), k=max(len(value) - len(emoji), MIN_TAIL))
+        )
+
+    def _new_mills(self, value: int) -> int:
+        h = int.from_bytes(self._digest("amount", str(value))[:8])
+        if self.amounts == "scaled":
+            return scaled_mills(value, h)
+        return h % 10_000_001 - 5_000_000
+
+    @overload
+    def text(self, value: str) -> str: ...
+    @overload
+    def text(self, value: str | None) -> str | None: ...
+    def text(self, value: str | None) -> str | None:
+        return None if value is None else self._text(value)
+
+    def mills(self, value: int) -> int:
+        return self._mills(value)
+
+
+class ObfuscatedArray[M](Sequence["BaseModel"]):
+    """obfuscate() applied to each of `source`, computed on demand.
+
+    The replacements depend only on the key, so the output doesn't depend on
+    which process computes which records, or in what order."""
+
+    def __init__(
+        self,
+        source: Sequence[M],
+        obfuscate: Callable[[M, Pseudonymizer], BaseModel],
+        pseudonymizer: Pseudonymizer,
+    ):
+        self.source = source
+        self.obfuscate = obfuscate
+        self.pseudonymizer = pseudonymizer
+
+    def __len__(self) -> int:
+        return len(self.source)
+
+    @overload
+    def __getitem__(self, i: int) -> BaseModel: ...
+    @overload
+    def __getitem__(self, i: slice) -> list[BaseModel]: ...
+    def __getitem__(self, i: int | slice) -> BaseModel | list[BaseModel]:
+        if isinstance(i, int):
+            return self.obfuscate(self.source[i], self.pseudonymizer)
+        return [self.obfuscate(m, self.pseudonymizer) for m in self.source[i]]
+
+    def __iter__(self) -> Iterator[BaseModel]:
+        for m in self.source:
+            yield self.obfuscate(m, self.pseudonymizer)
 
 
-def obfuscate_account(a: Account) -> Account:
-    return Account(
+def obfuscate_account(a: Account, p: Pseudonymizer) -> Account:
+    return ynab.Account(
         id=a.id,
-        name=random_str(),
-        note=random_str(),
+        name=p.text(a.name),
+        note=p.text(a.note),
         type=a.type,
         on_budget=a.on_budget,
         closed=a.closed,
@@ -66,7 +187,11 @@ def obfuscate_account(a: Account) -> Account:
     )
 
 
-def obfuscate_budget(b: BudgetDetail) -> BudgetDetail:
+def obfuscate_budget(
+    b: BudgetDetail, p: Pseudonymizer
+) -> tuple[BudgetDetail, dict[str, ObfuscatedArray[Any]]]:
+    """The obfuscated budget, with months, transactions and subtransactions
+    left as empty placeholders, and those arrays."""
     if (
         b.first_month is None
         or b.last_month is None
@@ -83,61 +208,73 @@ def obfuscate_budget(b: BudgetDetail) -> BudgetDetail:
     ):
         msg = "budget is missing key fields"
         raise Exception(msg)
-    return BudgetDetail(
+    budget = ynab.BudgetDetail(
         id=b.id,
-        name=random_str(),
-        accounts=[obfuscate_account(a) for a in b.accounts],
-        payees=[obfuscate_payee(p) for p in b.payees],
+        name=p.text(b.name),
+        accounts=[obfuscate_account(a, p) for a in b.accounts],
+        payees=[obfuscate_payee(payee, p) for payee in b.payees],
         payee_locations=[],
-        category_groups=[obfuscate_category_group(g) for g in b.category_groups],
-        categories=[obfuscate_category(c) for c in b.categories],
-        months=[obfuscate_month(m) for m in b.months],
-        transactions=[obfuscate_transaction(t) for t in b.transactions],
-        subtransactions=[obfuscate_subtransaction(s) for s in b.subtransactions],
+        category_groups=[obfuscate_category_group(g, p) for g in b.category_groups],
+        categories=[obfuscate_category(c, p) for c in b.categories],
+        months=[],
+        transactions=[],
+        subtransactions=[],
     )
+    arrays: dict[str, ObfuscatedArray[Any]] = {
+        "months": ObfuscatedArray(b.months, obfuscate_month, p),
+        "transactions": ObfuscatedArray(b.transactions, obfuscate_transaction, p),
+        "subtransactions": ObfuscatedArray(
+            b.subtransactions, obfuscate_subtransaction, p
+        ),
+    }
+    return budget, arrays
 
 
-def obfuscate_payee(p: Payee) -> Payee:
-    return Payee(id=p.id, name=random_str(), deleted=p.deleted)
+def obfuscate_payee(payee: Payee, p: Pseudonymizer) -> Payee:
+    return ynab.Payee(id=payee.id, name=p.text(payee.name), deleted=payee.deleted)
 
 
-def obfuscate_category_group(g: CategoryGroup) -> CategoryGroup:
-    return CategoryGroup(id=g.id, name=random_str(), hidden=g.hidden, deleted=g.deleted)
+def obfuscate_category_group(g: CategoryGroup, p: Pseudonymizer) -> CategoryGroup:
+    return ynab.CategoryGroup(
+        id=g.id, name=p.text(g.name), hidden=g.hidden, deleted=g.deleted
+    )
 
 
-def obfuscate_category(c: Category) -> Category:
-    return Category(
+def obfuscate_category(c: Category, p: Pseudonymizer) -> Category:
+    return ynab.Category(
         id=c.id,
         category_group_id=c.category_group_id,
-        name=random_str(),
-        note=random_str(),
+        name=p.text(c.name),
+        note=p.text(c.note),
         hidden=c.hidden,
-        budgeted=random_mills(),
+        budgeted=p.mills(c.budgeted),
         activity=0,
         balance=0,
         deleted=c.deleted,
     )
 
 
-def obfuscate_month(m: MonthDetail) -> MonthDetail:
-    return MonthDetail(
+def obfuscate_month(m: MonthDetail, p: Pseudonymizer) -> MonthDetail:
+    return ynab.MonthDetail(
         month=m.month,
-        note=random_str(),
-        income=random_mills(),
-        budgeted=random_mills(),
-        activity=random_mills(),
+        note=p.text(m.note),
+        income=p.mills(m.income),
+        budgeted=p.mills(m.budgeted),
+        activity=p.mills(m.activity),
         to_be_budgeted=0,
         deleted=m.deleted,
-        categories=[obfuscate_category(c) for c in m.categories],
+        categories=[obfuscate_category(c, p) for c in m.categories],
     )
 
 
-def obfuscate_transaction(t: TransactionSummary) -> TransactionSummary:
-    return TransactionSummary(
+def obfuscate_transaction(
+    t: TransactionSummary, p: Pseudonymizer
+) -> TransactionSummary:
+    return ynab.TransactionSummary(
         id=t.id,
         date=t.var_date,
-        amount=random_mills(),
-        memo=random_str(),
+        amount=p.mills(t.amount),
+        memo=p.text(t.memo),
         cleared=t.cleared,
         approved=t.approved,
         account_id=t.account_id,
@@ -145,12 +282,12 @@ def obfuscate_transaction(t: TransactionSummary) -> TransactionSummary:
     )
 
 
-def obfuscate_subtransaction(s: SubTransaction) -> SubTransaction:
-    return SubTransaction(
+def obfuscate_subtransaction(s: SubTransaction, p: Pseudonymizer) -> SubTransaction:
+    return ynab.SubTransaction(
         id=s.id,
         transaction_id=s.transaction_id,
-        amount=random_mills(),
-        memo=random_str(),
+        amount=p.mills(s.amount),
+        memo=p.text(s.memo),
         deleted=s.deleted,
     )
 
@@ -158,21 +295,61 @@ def obfuscate_subtransaction(s: SubTransaction) -> SubTransaction:
 def main(argv: list[str]):
     parser = argparse.ArgumentParser()
     _ = parser.add_argument("--input", "-i", default="ynab-json/budget-in.json")
-    _ = parser.add_argument("--output", "-o", default="ynab-json/budget-out.json")
+    _ = parser.add_argument(
+        "--output",
+        "-o",
+        default="ynab-json/budget-out.json",
+        help="Compressed with gzip or zstd if named *.gz or *.zst",
+    )
+    _ = parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=1,
+        help="Processes to obfuscate and serialize months, transactions and subtransactions with",
+    )
+    _ = parser.add_argument(
+        "--key",
+        "--seed",
+        help="Key the replacements are derived from: the same key gives the same output, whatever the number of workers. Random if omitted",
+    )
+    _ = parser.add_argument(
+        "--amounts",
+        choices=AMOUNT_MODES,
+        default="random",
+        help="random: any amount up to 5000; scaled: the same sign, number of digits and trailing zeros",
+    )
+    _ = parser.add_argument(
+        "--parser",
+        choices=available_parsers(),
+        default=DEFAULT_PARSER,
+        help="JSON parser to load the input with",
+    )
+    ynab_api.add_arguments(parser)
+    profiling.add_arguments(parser)
     args = parser.parse_args(argv)
+    profiling.configure(args)
     input_path = Path(cast(str, args.input))
     output_path = Path(cast(str, args.output))
-
-    with input_path.open("r") as f:
-        budget_detail_response = BudgetDetailResponse.from_dict(json.load(f))  # pyright: ignore[reportAny]
-    if budget_detail_response is None:
-        msg = "Bad JSON"
-        raise RuntimeError(msg)
+    workers = cast(int, args.workers)
+    json_parser = cast(str, args.parser)
+    budget_id = cast("str | None", args.budget_id)
+    full_fetch = cast(bool, args.full_fetch)
+    key = cast("str | None", args.key) or secrets.token_hex(16)
+    amounts = cast(str, args.amounts)
+
+    with profiling.phase("load"):
+        budget_detail_response = (
+            load_budget(input_path, json_parser)
+            if budget_id is None
+            else ynab_api.fetch(budget_id, full_fetch)
+        )
     budget_in = budget_detail_response.data.budget
-    budget_out = obfuscate_budget(budget_in)
-    _ = output_path.write_text(
-        budget_out.model_dump_json(by_alias=True, exclude_unset=True, indent=2)
-    )
+    with profiling.phase("obfuscate"):
+        budget_out, arrays = obfuscate_budget(budget_in, Pseudonymizer(key, amounts))
+    # Most of the obfuscation happens here, as the arrays are dumped.
+    with profiling.phase("dump"), open_output(output_path) as f:
+        jsonstream.write_model(f, budget_out, arrays, indent=2, workers=workers)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,175 @@
+# Phase spans for the scripts' --profile: wall and CPU time, peak traced
+# memory and live object count per phase, printed as a summary at exit and,
+# with --profile-trace, written as a Chrome trace-event file (chrome://tracing,
+# Perfetto).
+#
+# Code marks phases with `with profiling.phase("name"):`, which costs nothing
+# unless a script has called configure() with --profile.
+
+import atexit
+import cProfile
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, cast
+
+
+if TYPE_CHECKING:
+    import argparse
+    from collections.abc import Iterator
+
+
+@dataclass
+class Span:
+    name: str
+    depth: int
+    start: float  # seconds since the profiler started
+    wall: float = 0.0
+    cpu: float = 0.0
+    peak: int = 0  # bytes, tracemalloc
+    objects: int = 0  # live objects tracked by gc at the end
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.spans: list[Span] = []
+        self.trace_path: Path | None = None
+        self.cprofile_dir: Path | None = None
+        self._t0 = 0.0
+        self._stack: list[Span] = []
+
+    def start(self, trace_path: Path | None, cprofile_dir: Path | None):
+        self.enabled = True
+        self.trace_path = trace_path
+        self.cprofile_dir = cprofile_dir
+        if cprofile_dir is not None:
+            cprofile_dir.mkdir(parents=True, exist_ok=True)
+        self._t0 = time.perf_counter()
+        tracemalloc.start()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        span = Span(name, len(self._stack), time.perf_counter() - self._t0)
+        # The parent's peak so far, before the child resets it.
+        if self._stack:
+            parent = self._stack[-1]
+            parent.peak = max(parent.peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self.spans.append(span)
+        self._stack.append(span)
+        # Only one cProfile can be active at a time, so only top level phases.
+        profile = (
+            cProfile.Profile()
+            if self.cprofile_dir is not None and span.depth == 0
+            else None
+        )
+        cpu0 = time.process_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+                index = sum(1 for s in self.spans if s.depth == 0)
+                profile.dump_stats(
+                    cast(Path, self.cprofile_dir) / f"{index:02d}-{name}.prof"
+                )
+            span.cpu = time.process_time() - cpu0
+            span.wall = time.perf_counter() - self._t0 - span.start
+            span.peak = max(span.peak, tracemalloc.get_traced_memory()[1])
+            span.objects = len(gc.get_objects())
+            _ = self._stack.pop()
+            if self._stack:
+                self._stack[-1].peak = max(self._stack[-1].peak, span.peak)
+
+    def report(self):
+        print(
+            f"{'phase':<32} {'wall s':>8} {'cpu s':>8} {'peak MB':>8} {'objects':>10}",
+            file=sys.stderr,
+        )
+        for s in self.spans:
+            name = "  " * s.depth + s.name
+            print(
+                f"{name:<32} {s.wall:>8.3f} {s.cpu:>8.3f} {s.peak / (1 << 20):>8.1f} {s.objects:>10}",
+                file=sys.stderr,
+            )
+        if self.trace_path is not None:
+            _ = self.trace_path.write_text(json.dumps(self.trace_events()))
+            print(f"Wrote {self.trace_path}", file=sys.stderr)
+
+    def trace_events(self) -> dict[str, Any]:
+        pid = os.getpid()
+        events: list[dict[str, Any]] = []
+        for s in self.spans:
+            events.append(
+                {
+                    "name": s.name,
+                    "ph": "X",
+                    "ts": s.start * 1e6,
+                    "dur": s.wall * 1e6,
+                    "pid": pid,
+                    "tid": 0,
+                    "args": {
+                        "cpu_s": s.cpu,
+                        "peak_bytes": s.peak,
+                        "objects": s.objects,
+                    },
+                }
+            )
+            events.append(
+                {
+                    "name": "memory",
+                    "ph": "C",
+                    "ts": (s.start + s.wall) * 1e6,
+                    "pid": pid,
+                    "args": {"peak_bytes": s.peak},
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+PROFILER = Profiler()
+
+
+def phase(name: str):
+    return PROFILER.phase(name)
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    _ = parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time each phase and print a summary at exit (slows things down)",
+    )
+    _ = parser.add_argument(
+        "--profile-trace",
+        metavar="FILE",
+        help="With --profile, also write the phases to this trace-event file, for chrome://tracing or Perfetto",
+    )
+    _ = parser.add_argument(
+        "--profile-cprofile",
+        help="With --profile, also write a cProfile dump of each top level phase to this directory",
+    )
+
+
+def configure(args: argparse.Namespace):
+    if not cast(bool, args.profile):
+        return
+    trace_path = cast("str | None", args.profile_trace)
+    cprofile_dir = cast("str | None", args.profile_cprofile)
+    PROFILER.start(
+        None if trace_path is None else Path(trace_path),
+        None if cprofile_dir is None else Path(cprofile_dir),
+    )
+    _ = atexit.register(PROFILER.report)
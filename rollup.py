@@ -0,0 +1,223 @@
+# Balance forward for example.py --balance-forward category / carryover.
+#
+# A Rollup sums a slice's transaction amounts, kept and dropped, by account
+# and optionally by category and month, in one pass over transactions and one
+# over subtransactions.  A split transaction counts towards its
+# subtransactions' categories rather than its own.  From the dropped sums it
+# makes one balance forward transaction per account, split by category, so
+# categories keep their activity; with carryover it also budgets the month
+# the balance forward falls in so each category ends it with YNAB's balance.
+# Off-budget accounts' transactions don't count towards category balances in
+# YNAB, so they are left out of that.
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Any, cast
+from uuid import uuid4
+
+from budget_slice import balance_forward_transaction
+from lazy import lazy_import
+
+
+if TYPE_CHECKING:
+    from collections.abc import Collection, Iterable, Mapping
+
+    import ynab
+    from ynab import Category, MonthDetail, SubTransaction, TransactionSummary
+
+    from budget_slice import Id, SliceRule
+else:
+    ynab = lazy_import("ynab")
+
+
+# Account, category and first of the month; category and month are None when
+# not rolled up by.
+type Key = tuple[Id, Id | None, date | None]
+
+BALANCE_FORWARD_MODES = ("account", "category", "carryover")
+
+
+def month_of(d: date) -> date:
+    return d.replace(day=1)
+
+
+@dataclass
+class BalanceForward:
+    """What example.py adds to a slice for the transactions it drops."""
+
+    transactions: list[TransactionSummary] = field(default_factory=list)
+    subtransactions: list[SubTransaction] = field(default_factory=list)
+    # The month the balance forward falls in, budgeted for carryover.
+    month: MonthDetail | None = None
+
+
+@dataclass
+class Rollup:
+    rule: SliceRule
+    by_category: bool = False
+    by_month: bool = False
+    # Ids (as strings) of off-budget accounts.
+    off_budget: Collection[str] = ()
+    kept: defaultdict[Key, int] = field(default_factory=lambda: defaultdict(int))
+    dropped: defaultdict[Key, int] = field(default_factory=lambda: defaultdict(int))
+    # Key and keep of each transaction, for moving split amounts to their
+    # subtransactions' categories.  Only needed by category.
+    _parents: dict[str, tuple[Key, bool]] = field(default_factory=dict)
+
+    def add_transaction(
+        self,
+        t_id: str,
+        account_id: Id,
+        category_id: Id | None,
+        var_date: date,
+        amount: int,
+    ):
+        key = (
+            account_id,
+            category_id if self.by_category else None,
+            month_of(var_date) if self.by_month else None,
+        )
+        kept = self.rule.keeps(account_id, var_date)
+        (self.kept if kept else self.dropped)[key] += amount
+        if self.by_category:
+            self._parents[t_id] = (key, kept)
+
+    def add_subtransaction(
+        self, transaction_id: str, category_id: Id | None, amount: int
+    ):
+        parent = self._parents.get(transaction_id)
+        if parent is None:
+            return
+        (account_id, parent_category_id, month), kept = parent
+        totals = self.kept if kept else self.dropped
+        totals[account_id, parent_category_id, month] -= amount
+        totals[account_id, category_id, month] += amount
+
+    def add_models(
+        self,
+        transactions: Iterable[TransactionSummary],
+        subtransactions: Iterable[SubTransaction],
+    ):
+        for t in transactions:
+            self.add_transaction(
+                t.id, t.account_id, t.category_id, t.var_date, t.amount
+            )
+        if self.by_category:
+            for st in subtransactions:
+                self.add_subtransaction(st.transaction_id, st.category_id, st.amount)
+
+    def add_records(
+        self,
+        transactions: Iterable[Mapping[str, Any]],
+        subtransactions: Iterable[Mapping[str, Any]],
+    ):
+        for t in transactions:
+            self.add_transaction(
+                cast(str, t["id"]),
+                cast(str, t["account_id"]),
+                cast("str | None", t.get("category_id")),
+                date.fromisoformat(cast(str, t["date"])),
+                cast(int, t["amount"]),
+            )
+        if self.by_category:
+            for st in subtransactions:
+                self.add_subtransaction(
+                    cast(str, st["transaction_id"]),
+                    cast("str | None", st.get("category_id")),
+                    cast(int, st["amount"]),
+                )
+
+    def dropped_by_account(self, inflow_category_id: Id) -> dict[Id, dict[Id, int]]:
+        """Nonzero dropped amounts per account and category, with
+        uncategorized amounts in the inflow category, accounts in order of
+        their first dropped transaction."""
+        by_account: dict[Id, defaultdict[Id, int]] = {}
+        for (account_id, category_id, _), amount in self.dropped.items():
+            categories = by_account.setdefault(account_id, defaultdict(int))
+            categories[category_id or inflow_category_id] += amount
+        return {
+            account_id: {c: amount for c, amount in categories.items() if amount}
+            for account_id, categories in by_account.items()
+        }
+
+    def balance_forward(
+        self,
+        start: date,
+        fake_payee_id: Id,
+        inflow_category_id: Id,
+        months: Iterable[MonthDetail] = (),
+    ) -> BalanceForward:
+        """Balance forward transactions dated the day before `start`, split by
+        category if rolled up by category.  With `months` (the export's, or
+        any that include the balance forward's), and by month, also the
+        carryover month."""
+        forward = BalanceForward()
+        for account_id, categories in self.dropped_by_account(
+            inflow_category_id
+        ).items():
+            if not categories:
+                continue
+            t = balance_forward_transaction(
+                account_id,
+                sum(categories.values()),
+                start,
+                fake_payee_id,
+                inflow_category_id,
+            )
+            forward.transactions.append(t)
+            if len(categories) == 1:
+                (t.category_id,) = categories
+                continue
+            t.category_id = None
+            forward.subtransactions.extend(
+                ynab.SubTransaction(
+                    id=str(uuid4()),
+                    transaction_id=t.id,
+                    amount=amount,
+                    memo=t.memo,
+                    payee_id=fake_payee_id,
+                    category_id=category_id,
+                    deleted=False,
+                )
+                for category_id, amount in categories.items()
+            )
+        if self.by_category and self.by_month:
+            forward.month = self.carryover_month(
+                start - timedelta(days=1), inflow_category_id, months
+            )
+        return forward
+
+    def carryover_month(
+        self, var_date: date, inflow_category_id: Id, months: Iterable[MonthDetail]
+    ) -> MonthDetail | None:
+        """The export's month of `var_date`, with each category budgeted so
+        that, with the balance forward and the kept transactions in it, the
+        category ends the month with the balance it had in YNAB."""
+        month = month_of(var_date)
+        m = next((m for m in months if m.month == month), None)
+        if m is None:
+            return None
+        activity: defaultdict[Id | None, int] = defaultdict(int)
+        for (account_id, category_id, _), amount in self.dropped.items():
+            if str(account_id) not in self.off_budget:
+                activity[category_id] += amount
+        for (account_id, category_id, kept_month), amount in self.kept.items():
+            if kept_month == month and str(account_id) not in self.off_budget:
+                activity[category_id] += amount
+        categories = [
+            c.model_copy(
+                update={
+                    "budgeted": 0
+                    if c.id == inflow_category_id
+                    else c.balance - activity[c.id]
+                }
+            )
+            for c in cast(list["Category"], m.categories)
+        ]
+        return m.model_copy(
+            update={
+                "budgeted": sum(c.budgeted for c in categories),
+                "categories": categories,
+            }
+        )
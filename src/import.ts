@@ -1,5 +1,7 @@
 // Based on https://github.com/actualbudget/actual/blob/master/packages/loot-core/src/server/importers/ynab5.ts
-import { FileHandle, mkdir, readFile } from 'fs/promises';
+import { FileHandle, mkdir, readFile, writeFile } from 'fs/promises';
+import { promisify } from 'util';
+import { gunzip, zstdDecompress } from 'zlib';
 import *  as actual from '@actual-app/api';
 import { ImportTransactionEntity } from '@actual-app/api/@types/loot-core/src/types/models';
 import { v4 as uuidv4 } from 'uuid';
@@ -19,7 +21,7 @@ function amountFromYnab(amount: number) {
 
 async function importOrMapAccounts(data: YNAB5.Budget, entityIdMap: Map<string, string>) {
   const byName = new Map((await actual.getAccounts()).map(a => [a.name, a]));
-  data.accounts.map(async ynabAccount => {
+  for (const ynabAccount of data.accounts) {
     if (!ynabAccount.deleted) {
       let actualAccountId = byName.get(ynabAccount.name)?.id;
       if (!actualAccountId) {
@@ -32,12 +34,13 @@ async function importOrMapAccounts(data: YNAB5.Budget, entityIdMap: Map<string,
       }
       entityIdMap.set(ynabAccount.id, actualAccountId);
     }
-  });
+  }
 }
 
 async function importCategories(
   data: YNAB5.Budget,
   entityIdMap: Map<string, string>,
+  createMissing: boolean,
 ) {
   // Hidden categories are put in its own group by YNAB,
   // so it's already handled.
@@ -74,7 +77,23 @@ async function importCategories(
   }
 
   // Can't be done in parallel to have correct sort order. (Probably not true for import.ts.)
-  const groupsByName = new Map((await actual.getCategoryGroups()).map(g => [g.name, g]));
+  const groupIdsByName = new Map((await actual.getCategoryGroups()).map(g => [g.name, g.id]));
+  const catIdsByName = new Map(categories.map(c => [c.name, c.id]));
+
+  // Into a new budget (--local), groups and categories are created as found.
+  async function groupIdFor(name: string) {
+    let groupId = groupIdsByName.get(name);
+    if (!groupId) {
+      if (!createMissing) {
+        throw new Error(`Category group ${name} not found in Actual`);
+      }
+      groupId = await actual.createCategoryGroup({ name: name });
+      groupIdsByName.set(name, groupId);
+      console.log(`Added category group ${name}`);
+    }
+    return groupId;
+  }
+
   for (const group of data.category_groups) {
     if (!group.deleted) {
       let groupId;
@@ -85,10 +104,7 @@ async function importCategories(
         !equalsIgnoreCase(group.name, 'Hidden Categories') &&
           !equalsIgnoreCase(group.name, 'Income')
       ) {
-          groupId = groupsByName.get(group.name)?.id;
-          if (!groupId) {
-            throw new Error(`Category group ${group.name} not found in Actual`);
-          }
+          groupId = await groupIdFor(group.name);
           entityIdMap.set(group.id, groupId);
         }
 
@@ -101,7 +117,6 @@ async function importCategories(
         cat => cat.category_group_id === group.id,
       );
 
-      const actualCatsByName = new Map(categories.map(c => [c.name, c]));
       for (const cat of cats.reverse()) {
         if (!cat.deleted) {
           // Handles special categories. Starting balance is a payee
@@ -117,9 +132,29 @@ async function importCategories(
             case 'internal': // uncategorized is ignored too, handled by actual
               break;
             default: {
-              const id = actualCatsByName.get(cat.name)?.id;
+              let id = catIdsByName.get(cat.name);
               if (!id) {
-                throw new Error(`Category ${cat.name} not found in Actual`);
+                if (!createMissing) {
+                  throw new Error(`Category ${cat.name} not found in Actual`);
+                }
+                // A hidden category goes back in the group it was hidden
+                // from, not in a group of its own.
+                const hiddenFrom = data.category_groups.find(
+                  g => g.id === cat.original_category_group_id,
+                );
+                const newGroupId =
+                  groupId ?? (hiddenFrom && await groupIdFor(hiddenFrom.name));
+                if (!newGroupId) {
+                  console.log(`Skipped hidden category ${cat.name}, from no known group`);
+                  break;
+                }
+                id = await actual.createCategory({
+                  name: cat.name,
+                  group_id: newGroupId,
+                  hidden: cat.hidden,
+                });
+                catIdsByName.set(cat.name, id);
+                console.log(`Added category ${cat.name}`);
               }
               entityIdMap.set(cat.id, id);
             }
@@ -132,7 +167,7 @@ async function importCategories(
 
 async function importOrMapPayees(data: YNAB5.Budget, entityIdMap: Map<string, string>) {
   const byName = new Map((await actual.getPayees()).map(a => [a.name, a]));
-  data.payees.map(async ynabPayee => {
+  for (const ynabPayee of data.payees) {
     if (!ynabPayee.deleted) {
       let actualPayeeId = byName.get(ynabPayee.name)?.id;
       if (!actualPayeeId) {
@@ -142,7 +177,7 @@ async function importOrMapPayees(data: YNAB5.Budget, entityIdMap: Map<string, st
       }
       entityIdMap.set(ynabPayee.id, actualPayeeId);
     }
-  });
+  }
 }
 
 async function importTransactions(
@@ -474,23 +509,44 @@ async function importBudgets(
 
 // Utils
 
-async function doImport(data: YNAB5.Budget) {
+// Time and peak memory of each stage, for --timings.
+interface Timing {
+  phase: string;
+  seconds: number;
+  peak_mb: number;
+}
+
+const timings: Timing[] = [];
+
+async function timed<T>(phase: string, body: () => Promise<T>): Promise<T> {
+  const start = performance.now();
+  const result = await body();
+  timings.push({
+    phase,
+    seconds: (performance.now() - start) / 1000,
+    // maxRSS is in KiB.
+    peak_mb: process.resourceUsage().maxRSS / 1024,
+  });
+  return result;
+}
+
+async function doImport(data: YNAB5.Budget, createMissing: boolean) {
   const entityIdMap = new Map<string, string>();
 
   console.log('Importing/mapping Accounts...');
-  await importOrMapAccounts(data, entityIdMap);
+  await timed('accounts', () => importOrMapAccounts(data, entityIdMap));
 
   console.log('Importing Categories...');
-  await importCategories(data, entityIdMap);
+  await timed('categories', () => importCategories(data, entityIdMap, createMissing));
 
   console.log('Importing/mapping Payees...');
-  await importOrMapPayees(data, entityIdMap);
+  await timed('payees', () => importOrMapPayees(data, entityIdMap));
 
   console.log('Importing Transactions...');
-  await importTransactions(data, entityIdMap);
+  await timed('transactions', () => importTransactions(data, entityIdMap));
 
   console.log('Importing Budgets...');
-  await importBudgets(data, entityIdMap);
+  await timed('budgets', () => importBudgets(data, entityIdMap));
 
   console.log('... import complete!');
 }
@@ -507,9 +563,19 @@ async function doImport(data: YNAB5.Budget) {
 //   return data;
 // }
 
+// Exports named *.gz or *.zst, as the Python scripts write them, are
+// decompressed.
 async function parseFile(infile: string | FileHandle): Promise<YNAB5.Budget> {
-  const fileContent = await readFile(infile, 'utf-8');
-  return JSON.parse(fileContent).data.budget;
+  let fileContent = await readFile(infile);
+  if (typeof infile === 'string' && infile.endsWith('.gz')) {
+    fileContent = await promisify(gunzip)(fileContent);
+  } else if (typeof infile === 'string' && infile.endsWith('.zst')) {
+    if (typeof zstdDecompress !== 'function') {
+      throw new Error(`${infile}: zstd needs Node 22.15 or later`);
+    }
+    fileContent = await promisify(zstdDecompress)(fileContent);
+  }
+  return JSON.parse(fileContent.toString('utf-8')).data.budget;
 }
 
 function equalsIgnoreCase(stringa: string, stringb: string): boolean {
@@ -592,17 +658,42 @@ async function withActual(budgetName: string, body: () => Promise<void>): Promis
   await actual.shutdown();
 }
 
+// A new budget in a local data directory, with no server to sync with.
+async function withLocalActual(
+  dataDir: string,
+  budgetName: string,
+  body: () => Promise<void>,
+): Promise<void> {
+  await mkdir(dataDir, { recursive: true });
+  await actual.init({ dataDir: dataDir });
+  await actual.runImport(budgetName, body);
+  await actual.shutdown();
+}
+
 const program = new Command();
 program
   .version('1.0.0')
   .description('partial nYNAB import')
   .requiredOption('-b, --budget <str>', 'Budget name')
   .requiredOption('-f, --file <str>', 'Input JSON file')
-  .action(async (options: {budget: string, file: string}) => {
-    const ynab: YNAB5.Budget = await parseFile(options.file);
-    withActual(options.budget, async () => {
-      doImport(ynab);
-    });
+  .option('-l, --local <dir>', 'Import into a new budget in this data directory instead of the server\'s')
+  .option('-t, --timings <file>', 'Write the time and peak memory of each stage to this JSON file')
+  .action(async (options: {budget: string, file: string, local?: string, timings?: string}) => {
+    const ynab: YNAB5.Budget = await timed('parse', () => parseFile(options.file));
+    const body = async () => {
+      await doImport(ynab, options.local !== undefined);
+    };
+    if (options.local) {
+      await withLocalActual(options.local, options.budget, body);
+    } else {
+      await withActual(options.budget, body);
+    }
+    if (options.timings) {
+      await writeFile(options.timings, JSON.stringify(timings));
+    }
   });
 
-program.parse(process.argv);
+program.parseAsync(process.argv).catch((e: unknown) => {
+  console.error(e);
+  process.exitCode = 1;
+});
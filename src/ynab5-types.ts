@@ -39,6 +39,7 @@ export interface Category {
   name: string;
   deleted: boolean;
   hidden: boolean;
+  original_category_group_id?: string | null;
   note?: string;
 }
 
@@ -0,0 +1,455 @@
+# Out-of-core slicing for --staging: the export is streamed once into a SQLite
+# database, the slicing runs as indexed queries, and the kept rows are read
+# back out of cursors, so memory stays flat however large the export is.
+#
+# Each transaction, subtransaction and month is a row holding its JSON record
+# plus the columns the queries look at, in export order.  Databases are named
+# by the SHA-256 of the export, as in the budget cache, so later runs on the
+# same export skip staging.
+#
+# For --index, an ExportIndex is the same database kept next to the export,
+# but with each row's record left in the export: `record` is where it is, so
+# a slice reads and decodes only the records it keeps.
+
+import json
+import os
+import sqlite3
+import tempfile
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, cast
+
+import jsonstream
+import profiling
+from budget_cache import DEFAULT_MAX_BYTES, BudgetCache, default_cache_dir
+from budget_slice import check_key_fields
+from compact import is_compressed
+from lazy import lazy_import
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from ynab import BudgetDetailResponse
+
+    from budget_slice import BudgetSlice, SliceRule
+
+if TYPE_CHECKING:
+    import ynab
+else:
+    ynab = lazy_import("ynab")
+
+
+_STAGED = ("months", "transactions", "subtransactions")
+
+_TABLES = """
+CREATE TABLE skeleton (doc TEXT NOT NULL);
+CREATE TABLE transactions (
+    row INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    account_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    payee_id TEXT,
+    record {record} NOT NULL
+);
+CREATE TABLE subtransactions (
+    row INTEGER PRIMARY KEY,
+    transaction_id TEXT NOT NULL,
+    payee_id TEXT,
+    record {record} NOT NULL
+);
+CREATE TABLE months (row INTEGER PRIMARY KEY, month TEXT NOT NULL, record {record} NOT NULL);
+"""
+# An ExportIndex's record is offset << _LENGTH_BITS | length, in bytes.
+_LENGTH_BITS = 24
+# Built after the rows are in, which is quicker than keeping them up to date.
+_INDEXES = """
+CREATE INDEX transactions_account_date ON transactions (account_id, date);
+CREATE INDEX transactions_id ON transactions (id);
+CREATE INDEX subtransactions_transaction_id ON subtransactions (transaction_id);
+CREATE INDEX months_month ON months (month);
+"""
+# Kept rows of the current slice.  Temporary tables are per connection and
+# spill to disk like any other.
+_SLICE_TABLES = """
+CREATE TEMP TABLE never (account_id TEXT PRIMARY KEY);
+CREATE TEMP TABLE always (account_id TEXT PRIMARY KEY);
+CREATE TEMP TABLE kept_transactions (row INTEGER PRIMARY KEY);
+CREATE TEMP TABLE kept_subtransactions (row INTEGER PRIMARY KEY);
+"""
+
+
+def default_staging_dir() -> Path:
+    return default_cache_dir() / "staging"
+
+
+def _dumps(record: object) -> str:
+    return json.dumps(record, separators=(",", ":"))
+
+
+def _bounds(rule: SliceRule) -> tuple[str, str]:
+    # ISO dates sort as strings.
+    return ((rule.start or date.min).isoformat(), (rule.end or date.max).isoformat())
+
+
+def _stage(input_path: Path, db_path: Path, spans: bool = False):
+    # With `spans`, records are left in the export, as for an ExportIndex.
+    doc, offsets = jsonstream.scan_budget(input_path, _STAGED)
+    missing = [key for key in _STAGED if key not in offsets]
+    if missing:
+        msg = f"{input_path}: no {', '.join(missing)} arrays to stage"
+        raise RuntimeError(msg)
+
+    def records(key: str) -> Iterator[tuple[str | int, dict[str, Any]]]:
+        if not spans:
+            for r in jsonstream.iter_array(input_path, offsets[key]):
+                yield _dumps(r), r
+            return
+        for start, length, r in jsonstream.iter_array_spans(input_path, offsets[key]):
+            if length >> _LENGTH_BITS:
+                msg = f"{input_path}: record at byte {start} is too long to index"
+                raise RuntimeError(msg)
+            yield start << _LENGTH_BITS | length, r
+
+    with closing(sqlite3.connect(db_path)) as db:
+        # A fresh file that's only renamed into place once complete.
+        _ = db.execute("PRAGMA journal_mode = OFF")
+        _ = db.execute("PRAGMA synchronous = OFF")
+        _ = db.executescript(_TABLES.format(record="INTEGER" if spans else "TEXT"))
+        _ = db.execute("INSERT INTO skeleton VALUES (?)", (_dumps(doc),))
+        _ = db.executemany(
+            "INSERT INTO transactions VALUES (NULL, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    t["id"],
+                    t["account_id"],
+                    t["date"],
+                    t["amount"],
+                    t.get("payee_id"),
+                    record,
+                )
+                for record, t in records("transactions")
+            ),
+        )
+        _ = db.executemany(
+            "INSERT INTO subtransactions VALUES (NULL, ?, ?, ?)",
+            (
+                (st["transaction_id"], st.get("payee_id"), record)
+                for record, st in records("subtransactions")
+            ),
+        )
+        _ = db.executemany(
+            "INSERT INTO months VALUES (NULL, ?, ?)",
+            ((m["month"], record) for record, m in records("months")),
+        )
+        _ = db.executescript(_INDEXES)
+        db.commit()
+
+
+@dataclass
+class MonthWindow:
+    """Months in the export and in a slice, which are newest first."""
+
+    count: int
+    first: date | None
+    last: date | None
+    kept_count: int
+    first_kept: date | None
+    last_kept: date | None
+
+
+class StagingStore:
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self.db = sqlite3.connect(db_path)
+        _ = self.db.executescript(_SLICE_TABLES)
+
+    @classmethod
+    def open(
+        cls,
+        input_path: Path,
+        directory: Path | None = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> StagingStore:
+        """The staging database for the current content of `input_path`,
+        staged first if there isn't one yet."""
+        cache = BudgetCache(directory or default_staging_dir(), max_bytes, ".sqlite")
+        cache.directory.mkdir(parents=True, exist_ok=True)
+        with profiling.phase("hash"):
+            db_path = cache.entry_path(input_path)
+        if db_path.exists():
+            os.utime(db_path)
+        else:
+            with profiling.phase("stage"):
+                fd, tmp = tempfile.mkstemp(dir=cache.directory, suffix=".tmp")
+                os.close(fd)
+                try:
+                    _stage(input_path, Path(tmp))
+                    _ = Path(tmp).replace(db_path)
+                finally:
+                    Path(tmp).unlink(missing_ok=True)
+            cache.evict()
+        return cls(db_path)
+
+    def close(self):
+        self.db.close()
+
+    def skeleton(self) -> BudgetDetailResponse:
+        """The export, as from load_budget_skeleton."""
+        (doc,) = cast(
+            tuple[str], self.db.execute("SELECT doc FROM skeleton").fetchone()
+        )
+        budget_detail_response = ynab.BudgetDetailResponse.from_dict(json.loads(doc))
+        if budget_detail_response is None:
+            msg = "Bad JSON"
+            raise RuntimeError(msg)
+        check_key_fields(budget_detail_response.data.budget)
+        return budget_detail_response
+
+    def _decode(self, record: Any) -> dict[str, Any]:
+        return json.loads(cast(str, record))
+
+    def _records(self, sql: str, *parameters: object) -> Iterator[dict[str, Any]]:
+        for (record,) in cast("Iterable[tuple[Any]]", self.db.execute(sql, parameters)):
+            yield self._decode(record)
+
+    def last_transaction(self) -> dict[str, Any] | None:
+        return next(
+            self._records("SELECT record FROM transactions ORDER BY row DESC LIMIT 1"),
+            None,
+        )
+
+    def account_totals(self) -> dict[str, int]:
+        """Sum of transaction amounts per account."""
+        return dict(
+            cast(
+                "Iterable[tuple[str, int]]",
+                self.db.execute(
+                    "SELECT account_id, sum(amount) FROM transactions GROUP BY account_id"
+                ),
+            )
+        )
+
+    def transaction_records(self) -> Iterator[dict[str, Any]]:
+        return self._records("SELECT record FROM transactions ORDER BY row")
+
+    def subtransaction_records(self) -> Iterator[dict[str, Any]]:
+        return self._records("SELECT record FROM subtransactions ORDER BY row")
+
+    def month(self, month: date) -> dict[str, Any] | None:
+        return next(
+            self._records(
+                "SELECT record FROM months WHERE month = ?", month.isoformat()
+            ),
+            None,
+        )
+
+    def slice(self, s: BudgetSlice):
+        """Fill in `s` for its rule, as TransactionStore.slice does, and keep
+        the rows it keeps for kept_transactions and kept_subtransactions."""
+        rule = s.rule
+        db = self.db
+        for table, ids in (("never", rule.never), ("always", rule.always)):
+            _ = db.execute(f"DELETE FROM {table}")  # noqa: S608
+            _ = db.executemany(
+                f"INSERT OR IGNORE INTO {table} VALUES (?)",  # noqa: S608
+                ((str(a),) for a in ids),
+            )
+        _ = db.execute("DELETE FROM kept_transactions")
+        _ = db.execute(
+            """
+            INSERT INTO kept_transactions
+            SELECT row FROM transactions
+            WHERE account_id NOT IN never
+                AND (account_id IN always OR date BETWEEN ? AND ?)
+            """,
+            _bounds(rule),
+        )
+        _ = db.execute("DELETE FROM kept_subtransactions")
+        _ = db.execute(
+            """
+            INSERT INTO kept_subtransactions
+            SELECT row FROM subtransactions
+            WHERE transaction_id IN (
+                SELECT id FROM transactions JOIN kept_transactions USING (row)
+            )
+            """
+        )
+
+        # Accounts in order of their first (kept, dropped) row, as when
+        # adding transactions to s one at a time.
+        for account_id, count, latest in cast(
+            "Iterable[tuple[str, int, str]]",
+            db.execute(
+                """
+                SELECT account_id, count(*), max(date) FROM transactions
+                GROUP BY account_id ORDER BY min(row)
+                """
+            ),
+        ):
+            s.transaction_counts[account_id] = count
+            s.latest[account_id] = date.fromisoformat(latest)
+        for account_id, count in cast(
+            "Iterable[tuple[str, int]]",
+            db.execute(
+                """
+                SELECT account_id, count(*)
+                FROM transactions JOIN kept_transactions USING (row)
+                GROUP BY account_id ORDER BY min(row)
+                """
+            ),
+        ):
+            s.kept_counts[account_id] = count
+        for account_id, amount in cast(
+            "Iterable[tuple[str, int]]",
+            db.execute(
+                """
+                SELECT account_id, sum(amount) FROM transactions
+                WHERE row NOT IN kept_transactions
+                GROUP BY account_id ORDER BY min(row)
+                """
+            ),
+        ):
+            s.dropped_amounts[account_id] += amount
+
+        ((s.subtransaction_count,),) = cast(
+            "Iterable[tuple[int]]", db.execute("SELECT count(*) FROM subtransactions")
+        )
+        ((s.kept_subtransaction_count,),) = cast(
+            "Iterable[tuple[int]]",
+            db.execute("SELECT count(*) FROM kept_subtransactions"),
+        )
+        s.payee_ids.update(
+            payee_id
+            for (payee_id,) in cast(
+                "Iterable[tuple[str]]",
+                db.execute(
+                    """
+                    SELECT payee_id
+                    FROM transactions JOIN kept_transactions USING (row)
+                    WHERE payee_id IS NOT NULL
+                    UNION
+                    SELECT payee_id
+                    FROM subtransactions JOIN kept_subtransactions USING (row)
+                    WHERE payee_id IS NOT NULL
+                    """
+                ),
+            )
+        )
+
+    def kept_transactions(self) -> Iterator[dict[str, Any]]:
+        """Records of the transactions the last slice kept, in export order."""
+        return self._records(
+            """
+            SELECT record FROM transactions JOIN kept_transactions USING (row)
+            ORDER BY row
+            """
+        )
+
+    def kept_subtransactions(self) -> Iterator[dict[str, Any]]:
+        return self._records(
+            """
+            SELECT record FROM subtransactions JOIN kept_subtransactions USING (row)
+            ORDER BY row
+            """
+        )
+
+    def month_window(self, rule: SliceRule) -> MonthWindow:
+        def month(sql: str, *parameters: object) -> date | None:
+            row = cast("tuple[str] | None", self.db.execute(sql, parameters).fetchone())
+            return None if row is None else date.fromisoformat(row[0])
+
+        in_range = "FROM months WHERE month BETWEEN ? AND ?"
+        bounds = _bounds(rule)
+        ((count,),) = cast(
+            "Iterable[tuple[int]]", self.db.execute("SELECT count(*) FROM months")
+        )
+        ((kept_count,),) = cast(
+            "Iterable[tuple[int]]",
+            self.db.execute(f"SELECT count(*) {in_range}", bounds),  # noqa: S608
+        )
+        return MonthWindow(
+            count=count,
+            first=month("SELECT month FROM months ORDER BY row LIMIT 1"),
+            last=month("SELECT month FROM months ORDER BY row DESC LIMIT 1"),
+            kept_count=kept_count,
+            first_kept=month(
+                f"SELECT month {in_range} ORDER BY row LIMIT 1",  # noqa: S608
+                *bounds,
+            ),
+            last_kept=month(
+                f"SELECT month {in_range} ORDER BY row DESC LIMIT 1",  # noqa: S608
+                *bounds,
+            ),
+        )
+
+    def kept_months(self, rule: SliceRule) -> Iterator[dict[str, Any]]:
+        """Records of the months within the rule's dates, in export order."""
+        return self._records(
+            "SELECT record FROM months WHERE month BETWEEN ? AND ? ORDER BY row",
+            *_bounds(rule),
+        )
+
+
+def index_path(input_path: Path) -> Path:
+    return input_path.with_name(f"{input_path.name}.index")
+
+
+class ExportIndex(StagingStore):
+    """A StagingStore whose records are read from the export itself."""
+
+    def __init__(self, db_path: Path, input_path: Path):
+        super().__init__(db_path)
+        self._export = input_path.open("rb")
+
+    @classmethod
+    def of(cls, input_path: Path) -> ExportIndex:
+        """The index next to `input_path`, built first if there isn't one or
+        the export has changed since."""
+        if is_compressed(input_path):
+            # Every record read would decompress the export up to it.
+            msg = f"{input_path}: --index needs an uncompressed export"
+            raise RuntimeError(msg)
+        path = index_path(input_path)
+        stat = input_path.stat()
+        source = (stat.st_size, stat.st_mtime_ns)
+        if _indexed_source(path) != source:
+            with profiling.phase("index"):
+                fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+                os.close(fd)
+                try:
+                    _stage(input_path, Path(tmp), spans=True)
+                    with closing(sqlite3.connect(tmp)) as db:
+                        _ = db.execute("CREATE TABLE source (size, mtime_ns)")
+                        _ = db.execute("INSERT INTO source VALUES (?, ?)", source)
+                        db.commit()
+                    _ = Path(tmp).replace(path)
+                finally:
+                    Path(tmp).unlink(missing_ok=True)
+        return cls(path, input_path)
+
+    def close(self):
+        super().close()
+        self._export.close()
+
+    def _decode(self, record: Any) -> dict[str, Any]:
+        span = cast(int, record)
+        _ = self._export.seek(span >> _LENGTH_BITS)
+        return json.loads(self._export.read(span & ((1 << _LENGTH_BITS) - 1)))
+
+
+def _indexed_source(path: Path) -> tuple[int, int] | None:
+    # Size and modification time of the export when `path` indexed it.
+    if not path.exists():
+        return None
+    try:
+        with closing(sqlite3.connect(path)) as db:
+            return cast(
+                "tuple[int, int] | None",
+                db.execute("SELECT size, mtime_ns FROM source").fetchone(),
+            )
+    except sqlite3.DatabaseError:
+        return None
@@ -0,0 +1,329 @@
+# Generate a synthetic budget export at a chosen scale, for benchmarks that
+# shouldn't need anyone's real data.
+
+import argparse
+import json
+import sys
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from random import Random
+from typing import TYPE_CHECKING, Any, cast
+from uuid import UUID
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from typing import TextIO
+
+from obfuscate import random_str
+
+
+@dataclass(frozen=True)
+class SyntheticConfig:
+    accounts: int = 10
+    payees: int = 200
+    categories: int = 40
+    months: int = 120  # transactions are spread evenly over these
+    last_month: date = date(2025, 12, 1)
+    transactions: int = 10_000
+    split_ratio: float = 0.05  # fraction of transactions with subtransactions
+    unapproved_ratio: float = 0.02
+    seed: int = 0
+
+
+def first_month(config: SyntheticConfig) -> date:
+    m = config.last_month.year * 12 + config.last_month.month - config.months
+    return date(m // 12, m % 12 + 1, 1)
+
+
+def _uuid(rng: Random) -> str:
+    return str(UUID(int=rng.getrandbits(128), version=4))
+
+
+def _category_groups(config: SyntheticConfig, rng: Random) -> list[dict[str, Any]]:
+    count = max(1, config.categories // 5)
+    return [
+        {"id": _uuid(rng), "name": name, "hidden": False, "deleted": False}
+        for name in [
+            "Internal Master Category",
+            *(random_str(rng) for _ in range(count)),
+        ]
+    ]
+
+
+def _categories(
+    config: SyntheticConfig, rng: Random, groups: list[dict[str, Any]]
+) -> list[dict[str, Any]]:
+    def category(name: str, group: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "id": _uuid(rng),
+            "category_group_id": group["id"],
+            "category_group_name": group["name"],
+            "name": name,
+            "hidden": False,
+            "original_category_group_id": None,
+            "note": None,
+            "budgeted": 0,
+            "activity": 0,
+            "balance": 0,
+            "goal_type": None,
+            "deleted": False,
+        }
+
+    return [
+        category("Inflow: Ready to Assign", groups[0]),
+        *(
+            category(random_str(rng), groups[1 + i % (len(groups) - 1)])
+            for i in range(config.categories)
+        ),
+    ]
+
+
+def _accounts(config: SyntheticConfig, rng: Random) -> list[dict[str, Any]]:
+    return [
+        {
+            "id": _uuid(rng),
+            "name": f"Account {i}",
+            "type": rng.choice(["checking", "savings", "creditCard", "cash"]),
+            "on_budget": True,
+            "closed": False,
+            "note": None,
+            "balance": 0,
+            "cleared_balance": 0,
+            "uncleared_balance": 0,
+            "transfer_payee_id": _uuid(rng),
+            "direct_import_linked": False,
+            "direct_import_in_error": False,
+            "last_reconciled_at": None,
+            "debt_original_balance": None,
+            "debt_interest_rates": {},
+            "debt_minimum_payments": {},
+            "debt_escrow_amounts": {},
+            "deleted": False,
+        }
+        for i in range(config.accounts)
+    ]
+
+
+def _payees(config: SyntheticConfig, rng: Random) -> list[dict[str, Any]]:
+    return [
+        {"id": _uuid(rng), "name": name, "transfer_account_id": None, "deleted": False}
+        for name in [
+            "Fake",
+            "Starting Balance",
+            *(random_str(rng) for _ in range(config.payees)),
+        ]
+    ]
+
+
+def _months(
+    config: SyntheticConfig, rng: Random, categories: list[dict[str, Any]]
+) -> list[dict[str, Any]]:
+    first = first_month(config)
+    months: list[dict[str, Any]] = []
+    for i in range(config.months):
+        m = first.year * 12 + first.month - 1 + i
+        months.append(
+            {
+                "month": date(m // 12, m % 12 + 1, 1).isoformat(),
+                "note": None,
+                "income": rng.randrange(1_000_000),
+                "budgeted": rng.randrange(1_000_000),
+                "activity": -rng.randrange(1_000_000),
+                "to_be_budgeted": 0,
+                "age_of_money": None,
+                "deleted": False,
+                "categories": categories,
+            }
+        )
+    months.reverse()
+    return months
+
+
+def _transaction(
+    config: SyntheticConfig,
+    rng: Random,
+    var_date: date,
+    account: dict[str, Any],
+    payees: list[dict[str, Any]],
+    categories: list[dict[str, Any]],
+) -> dict[str, Any]:
+    payee = rng.choice(payees)
+    return {
+        "id": _uuid(rng),
+        "date": var_date.isoformat(),
+        "amount": rng.randint(-500_000, 100_000),
+        "memo": random_str(rng) if rng.random() < 0.5 else None,
+        "cleared": rng.choice(["cleared", "uncleared", "reconciled"]),
+        "approved": rng.random() >= config.unapproved_ratio,
+        "flag_color": None,
+        "flag_name": None,
+        "account_id": account["id"],
+        "account_name": account["name"],
+        "payee_id": payee["id"],
+        "payee_name": payee["name"],
+        "category_id": rng.choice(categories)["id"],
+        "category_name": None,
+        "transfer_account_id": None,
+        "transfer_transaction_id": None,
+        "matched_transaction_id": None,
+        "import_id": None,
+        "import_payee_name": None,
+        "import_payee_name_original": None,
+        "debt_transaction_type": None,
+        "deleted": False,
+    }
+
+
+def _subtransactions(
+    rng: Random,
+    transaction: dict[str, Any],
+    payees: list[dict[str, Any]],
+    categories: list[dict[str, Any]],
+) -> list[dict[str, Any]]:
+    count = rng.randrange(2, 5)
+    amount = cast(int, transaction["amount"])
+    amounts = [amount // count] * (count - 1)
+    amounts.append(amount - sum(amounts))
+    subtransactions: list[dict[str, Any]] = []
+    for a in amounts:
+        payee = rng.choice(payees)
+        category = rng.choice(categories)
+        subtransactions.append(
+            {
+                "id": _uuid(rng),
+                "transaction_id": transaction["id"],
+                "amount": a,
+                "memo": None,
+                "payee_id": payee["id"],
+                "payee_name": payee["name"],
+                "category_id": category["id"],
+                "category_name": category["name"],
+                "transfer_account_id": None,
+                "transfer_transaction_id": None,
+                "deleted": False,
+            }
+        )
+    return subtransactions
+
+
+def _write_array(f: TextIO, records: Iterable[dict[str, Any]]):
+    sep = "["
+    for r in records:
+        _ = f.write(sep)
+        _ = f.write(json.dumps(r, ensure_ascii=False))
+        sep = ","
+    _ = f.write("[]" if sep == "[" else "]")
+
+
+def write_synthetic(f: TextIO, config: SyntheticConfig):
+    """Write an export in the API's compact form.
+
+    Transactions are written as they are generated; only the (fewer)
+    subtransactions are held in memory."""
+    rng = Random(config.seed)
+    groups = _category_groups(config, rng)
+    categories = _categories(config, rng, groups)
+    accounts = _accounts(config, rng)
+    payees = _payees(config, rng)
+    months = _months(config, rng, categories)
+    first = first_month(config)
+    days = (config.last_month - first).days + 28
+
+    budget: dict[str, Any] = {
+        "id": _uuid(rng),
+        "name": "Synthetic",
+        "last_modified_on": f"{config.last_month}T00:00:00+00:00",
+        "first_month": first.isoformat(),
+        "last_month": config.last_month.isoformat(),
+        "date_format": {"format": "YYYY-MM-DD"},
+        "currency_format": {
+            "iso_code": "USD",
+            "example_format": "123,456.78",
+            "decimal_digits": 2,
+            "decimal_separator": ".",
+            "symbol_first": True,
+            "group_separator": ",",
+            "currency_symbol": "$",
+            "display_symbol": True,
+        },
+        "accounts": accounts,
+        "payees": payees,
+        "payee_locations": [],
+        "category_groups": groups,
+        "categories": categories,
+        "months": months,
+        "transactions": [],
+        "subtransactions": [],
+        "scheduled_transactions": [],
+        "scheduled_subtransactions": [],
+    }
+    text = json.dumps(
+        {"data": {"budget": budget, "server_knowledge": 1}}, ensure_ascii=False
+    )
+    # The placeholders are the only empty arrays with these keys.
+    head, rest = text.split('"transactions": []', 1)
+    middle, tail = rest.split('"subtransactions": []', 1)
+
+    subtransactions: list[dict[str, Any]] = []
+
+    def transactions() -> Iterable[dict[str, Any]]:
+        for i in range(config.transactions):
+            var_date = first + timedelta(days=i * days // config.transactions)
+            t = _transaction(
+                config, rng, var_date, rng.choice(accounts), payees, categories
+            )
+            if rng.random() < config.split_ratio:
+                subtransactions.extend(_subtransactions(rng, t, payees, categories))
+                t["category_id"] = None
+            yield t
+
+    _ = f.write(head + '"transactions": ')
+    _write_array(f, transactions())
+    _ = f.write(middle + '"subtransactions": ')
+    _write_array(f, subtransactions)
+    _ = f.write(tail)
+
+
+def main(argv: list[str]):
+    defaults = SyntheticConfig()
+    parser = argparse.ArgumentParser()
+    _ = parser.add_argument("--output", "-o", default="ynab-json/synthetic.json")
+    _ = parser.add_argument(
+        "--transactions", "-t", type=int, default=defaults.transactions
+    )
+    _ = parser.add_argument("--accounts", type=int, default=defaults.accounts)
+    _ = parser.add_argument("--payees", type=int, default=defaults.payees)
+    _ = parser.add_argument("--categories", type=int, default=defaults.categories)
+    _ = parser.add_argument("--months", type=int, default=defaults.months)
+    _ = parser.add_argument(
+        "--split-ratio",
+        type=float,
+        default=defaults.split_ratio,
+        help="Fraction of transactions split into subtransactions",
+    )
+    _ = parser.add_argument(
+        "--unapproved-ratio",
+        type=float,
+        default=defaults.unapproved_ratio,
+        help="Fraction of transactions not approved",
+    )
+    _ = parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args(argv)
+    config = SyntheticConfig(
+        accounts=cast(int, args.accounts),
+        payees=cast(int, args.payees),
+        categories=cast(int, args.categories),
+        months=cast(int, args.months),
+        transactions=cast(int, args.transactions),
+        split_ratio=cast(float, args.split_ratio),
+        unapproved_ratio=cast(float, args.unapproved_ratio),
+        seed=cast(int, args.seed),
+    )
+    with Path(cast(str, args.output)).open("w") as f:
+        write_synthetic(f, config)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,43 @@
+import itertools
+import uuid
+
+import pytest
+
+import budget_slice
+import rollup
+from synthetic import SyntheticConfig, write_synthetic
+
+
+SYNTHETIC = SyntheticConfig(accounts=5, payees=40, categories=12, transactions=3000)
+
+
+@pytest.fixture(scope="session")
+def export(tmp_path_factory):
+    """A small synthetic export."""
+    path = tmp_path_factory.mktemp("export") / "synthetic.json"
+    with path.open("w") as f:
+        write_synthetic(f, SYNTHETIC)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def reset_uuids(monkeypatch):
+    """Balance forward ids are made up each run: number them from 1 again
+    each time this is called."""
+    counter = [itertools.count(1)]
+
+    def uuid4():
+        return uuid.UUID(int=next(counter[0]), version=4)
+
+    def reset():
+        counter[0] = itertools.count(1)
+
+    monkeypatch.setattr(budget_slice, "uuid4", uuid4)
+    monkeypatch.setattr(rollup, "uuid4", uuid4)
+    return reset
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    # Keep the budget cache and staging databases out of the user's cache.
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
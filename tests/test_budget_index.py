@@ -0,0 +1,35 @@
+import pytest
+
+from budget_index import BudgetIndex
+from budget_slice import load_budget
+
+
+@pytest.fixture(scope="module")
+def index(export):
+    budget = load_budget(export).data.budget
+    names = ["Checking", "Savings [Joint]", "Visa *1234", "Visa 1234", "Savings J"]
+    accounts = [
+        a.model_copy(update={"name": name})
+        for a, name in zip(budget.accounts, names, strict=True)
+    ]
+    return BudgetIndex(budget.model_copy(update={"accounts": accounts}))
+
+
+def names(index, selectors):
+    return sorted(index.accounts[i].name for i in index.select_accounts(selectors))
+
+
+def test_exact_names_win_over_globs(index):
+    assert names(index, ["Savings [Joint]"]) == ["Savings [Joint]"]
+    assert names(index, ["Visa *1234"]) == ["Visa *1234"]
+
+
+def test_globs_and_regexes(index):
+    assert names(index, ["Visa*"]) == ["Visa *1234", "Visa 1234"]
+    assert names(index, ["Savings [J]*"]) == ["Savings J"]
+    assert names(index, ["re:Sav.*"]) == ["Savings J", "Savings [Joint]"]
+
+
+def test_missing(index):
+    with pytest.raises(RuntimeError, match="No such account"):
+        _ = index.select_accounts(["Checking", "Brokerage"])
@@ -0,0 +1,42 @@
+# TransactionIndex.slice cuts the same slices as slice_transactions' scan.
+
+import random
+from datetime import timedelta
+
+import pytest
+
+from budget_index import BudgetIndex
+from budget_slice import SliceRule, TransactionIndex, load_budget, slice_transactions
+
+
+@pytest.fixture(scope="module")
+def budget(export):
+    return load_budget(export).data.budget
+
+
+def rules(budget, n):
+    rng = random.Random(0)
+    dates = sorted(t.var_date for t in budget.transactions)
+    account_ids = [a.id for a in budget.accounts]
+    for _ in range(n):
+        start, end = sorted(rng.sample(dates, 2))
+        yield SliceRule(
+            start=rng.choice([None, start, start + timedelta(days=1)]),
+            end=rng.choice([None, end]),
+            always=set(rng.sample(account_ids, rng.randint(0, 1))),
+            never=set(rng.sample(account_ids, rng.randint(0, 2))),
+        )
+
+
+def test_slices_match_scan(budget):
+    index = TransactionIndex(BudgetIndex(budget))
+    for rule in rules(budget, 50):
+        s, transactions, subtransactions = index.slice(rule)
+        expected, expected_transactions, expected_subtransactions = slice_transactions(
+            rule, budget.transactions, budget.subtransactions
+        )
+        assert transactions == expected_transactions
+        assert subtransactions == expected_subtransactions
+        assert s == expected
+        # Account order matters to the balance forward transactions.
+        assert list(s.dropped_amounts.items()) == list(expected.dropped_amounts.items())
@@ -0,0 +1,109 @@
+# --state: a second run over the same export emits nothing new, a run after
+# a change fails if it changed what was emitted before, and one that only
+# adds transactions emits just those.
+
+import json
+from datetime import date
+
+import pytest
+
+from budget_index import BudgetIndex
+from budget_slice import SliceRule, forward_budget, load_budget, slice_transactions
+from cli import script_main
+from delta import ExportState, delta_budget
+
+
+START = date(2021, 1, 1)
+
+
+def forward(budget):
+    index = BudgetIndex(budget)
+    s, transactions, subtransactions = slice_transactions(
+        SliceRule(start=START), budget.transactions, budget.subtransactions
+    )
+    return forward_budget(
+        index, s, transactions, subtransactions, "#review", drop=False
+    )
+
+
+def test_round_trip(export, tmp_path):
+    budget = load_budget(export).data.budget
+    state_path = tmp_path / "state.json"
+
+    state = ExportState.load(state_path)
+    state.check_start(START)
+    filtered, balance_forward = forward(budget)
+    emitted, delta = delta_budget(filtered, balance_forward, state)
+    assert delta.new == len(filtered.transactions) - len(balance_forward)
+    assert delta.balance_forward == len(balance_forward) > 0
+    assert emitted.transactions == filtered.transactions
+    assert emitted.subtransactions == filtered.subtransactions
+    state.save(state_path)
+
+    state = ExportState.load(state_path)
+    state.check_start(START)
+    filtered, balance_forward = forward(budget)
+    emitted, delta = delta_budget(filtered, balance_forward, state)
+    assert (delta.new, delta.balance_forward) == (0, 0)
+    assert delta.unchanged == len(filtered.transactions) - len(balance_forward)
+    # Every month was skipped whole.
+    assert delta.unchanged_months == len(state.months) > 0
+    assert emitted.transactions == []
+    assert emitted.subtransactions == []
+    assert emitted.accounts == []
+    state.save(state_path)
+
+    # A transaction added in one month is emitted, and only its month is
+    # hashed again.
+    kept = next(t for t in budget.transactions if t.var_date >= START)
+    added = kept.model_copy(update={"id": "added"})
+    grown = budget.model_copy(update={"transactions": [*budget.transactions, added]})
+    state = ExportState.load(state_path)
+    filtered, balance_forward = forward(grown)
+    emitted, delta = delta_budget(filtered, balance_forward, state)
+    assert [t.id for t in emitted.transactions] == ["added"]
+    assert delta.unchanged_months == len(state.months) - 1
+
+
+@pytest.mark.parametrize("change", ["kept", "dropped"])
+def test_changed_fails(export, change):
+    # Changing a kept transaction or, through its account's balance
+    # forward, a dropped one would import it twice.
+    budget = load_budget(export).data.budget
+    state = ExportState()
+    filtered, balance_forward = forward(budget)
+    _ = delta_budget(filtered, balance_forward, state)
+
+    if change == "kept":
+        target = next(t for t in budget.transactions if t.var_date >= START)
+        update = {"memo": "changed"}
+    else:
+        target = next(t for t in budget.transactions if t.var_date < START)
+        update = {"amount": target.amount + 1000}
+    changed = budget.model_copy(
+        update={
+            "transactions": [
+                t.model_copy(update=update) if t is target else t
+                for t in budget.transactions
+            ]
+        }
+    )
+    filtered, balance_forward = forward(changed)
+    with pytest.raises(RuntimeError, match="1 transactions were emitted before"):
+        _ = delta_budget(filtered, balance_forward, state)
+
+
+def test_unchanged_export_skips_slicing(export, tmp_path, monkeypatch):
+    state_path = tmp_path / "state.json"
+    output = tmp_path / "out.json"
+    args = ["--input", str(export), "--output", str(output), "--start"]
+    args += [START.isoformat(), "--state", str(state_path), "--no-cache"]
+    script_main("example.py")(args)
+    assert json.loads(output.read_text())["data"]["budget"]["transactions"]
+
+    def fail(*_):
+        raise AssertionError
+
+    monkeypatch.setattr("example.slice_transactions", fail)
+    script_main("example.py")(args)
+    assert json.loads(output.read_text())["data"]["budget"]["transactions"] == []
@@ -0,0 +1,60 @@
+# ExportIndex rows point at their records' bytes in the export.
+
+import json
+import os
+
+import jsonstream
+import staging
+from staging import ExportIndex, index_path
+
+
+def test_spans_decode_to_records(export):
+    budget = json.loads(export.read_bytes())["data"]["budget"]
+    data = export.read_bytes()
+    index = ExportIndex.of(export)
+    try:
+        for table, key in (
+            ("transactions", "transactions"),
+            ("subtransactions", "subtransactions"),
+            ("months", "months"),
+        ):
+            spans = [
+                span
+                for (span,) in index.db.execute(
+                    f"SELECT record FROM {table} ORDER BY row"  # noqa: S608
+                )
+            ]
+            assert len(spans) == len(budget[key])
+            mask = (1 << staging._LENGTH_BITS) - 1
+            for span, record in zip(spans, budget[key], strict=True):
+                offset, length = span >> staging._LENGTH_BITS, span & mask
+                assert json.loads(data[offset : offset + length]) == record
+        assert list(index.transaction_records()) == budget["transactions"]
+    finally:
+        index.close()
+
+
+def test_rebuilt_when_export_changes(export, tmp_path):
+    copy = tmp_path / "export.json"
+    _ = copy.write_bytes(export.read_bytes())
+    ExportIndex.of(copy).close()
+    built = index_path(copy).stat().st_mtime_ns
+
+    ExportIndex.of(copy).close()
+    assert index_path(copy).stat().st_mtime_ns == built
+
+    # Same size, new modification time.
+    stat = copy.stat()
+    os.utime(copy, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    ExportIndex.of(copy).close()
+    assert index_path(copy).stat().st_mtime_ns != built
+
+
+def test_spans_match_iter_array(export):
+    doc, offsets = jsonstream.scan_budget(export, ["transactions"])
+    assert doc["data"]["budget"]["transactions"] == []
+    data = export.read_bytes()
+    for start, length, record in jsonstream.iter_array_spans(
+        export, offsets["transactions"]
+    ):
+        assert json.loads(data[start : start + length]) == record
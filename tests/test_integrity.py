@@ -0,0 +1,35 @@
+# --verify catches a slice that keeps one side of a transfer and drops the
+# other, which the importer can't link.
+
+from datetime import date
+
+from budget_index import BudgetIndex
+from budget_slice import SliceRule, forward_budget, load_budget, slice_transactions
+from integrity import check_budget
+
+
+START = date(2021, 1, 1)
+
+
+def test_half_dropped_transfer(export):
+    budget = load_budget(export).data.budget
+    a, b = budget.accounts[0].id, budget.accounts[1].id
+    t = next(t for t in budget.transactions if t.account_id == a and t.var_date < START)
+    other = next(
+        t for t in budget.transactions if t.account_id == b and t.var_date < START
+    )
+    t.transfer_account_id, t.transfer_transaction_id = b, other.id
+    other.transfer_account_id, other.transfer_transaction_id = a, t.id
+    assert check_budget(budget) == []
+
+    # Account a is kept whole, b only from START on.
+    s, transactions, subtransactions = slice_transactions(
+        SliceRule(start=START, always={a}), budget.transactions, budget.subtransactions
+    )
+    sliced, _ = forward_budget(
+        BudgetIndex(budget), s, transactions, subtransactions, "", drop=False
+    )
+    problems = check_budget(sliced)
+    assert len(problems) == 1
+    assert problems[0].startswith("transactions.transfer_transaction_id: 1 ids")
+    assert str(other.id) in problems[0]
@@ -0,0 +1,71 @@
+import json
+import random
+
+import pytest
+
+import jsonstream
+
+
+def random_value(rng: random.Random, depth: int = 0) -> object:
+    kinds = ["int", "float", "small", "str", "literal"]
+    if depth < 3:
+        kinds += ["list", "dict"]
+    match rng.choice(kinds):
+        case "int":
+            return rng.randint(-(10**12), 10**12)
+        case "float":
+            return rng.uniform(-1e6, 1e6)
+        case "small":
+            return rng.choice([1e-7, -2.5e-12, 3e20, 0.5]) * rng.random()
+        case "str":
+            return "".join(rng.choice('ab é😀"\\\n') for _ in range(rng.randint(0, 8)))
+        case "literal":
+            return rng.choice([True, False, None])
+        case "list":
+            return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+        case _:
+            return {
+                f"k{i}": random_value(rng, depth + 1) for i in range(rng.randint(0, 4))
+            }
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 8])
+def test_reader_matches_json_loads(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(jsonstream, "CHUNK_SIZE", chunk_size)
+    rng = random.Random(chunk_size)
+    path = tmp_path / "doc.json"
+    for _ in range(50):
+        doc = [random_value(rng) for _ in range(20)]
+        _ = path.write_text(
+            json.dumps(doc, ensure_ascii=False, indent=rng.choice([None, 1]))
+        )
+        assert list(jsonstream.iter_array(path, 0)) == json.loads(path.read_text())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 7])
+def test_array_spans(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(jsonstream, "CHUNK_SIZE", chunk_size)
+    rng = random.Random(chunk_size)
+    doc = [random_value(rng) for _ in range(200)]
+    path = tmp_path / "doc.json"
+    _ = path.write_text(json.dumps(doc, ensure_ascii=False))
+    data = path.read_bytes()
+    values = []
+    for start, length, value in jsonstream.iter_array_spans(path, 0):
+        assert json.loads(data[start : start + length]) == value
+        values.append(value)
+    assert values == doc
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 8])
+def test_array_where(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(jsonstream, "CHUNK_SIZE", chunk_size)
+    rng = random.Random(chunk_size)
+    doc = [
+        {"n": n} | {f"k{i}": random_value(rng) for i in range(rng.randint(0, 4))}
+        for n in range(100)
+    ]
+    path = tmp_path / "doc.json"
+    _ = path.write_text(json.dumps(doc, ensure_ascii=False, indent=1))
+    actual = list(jsonstream.iter_array_where(path, 0, "n", lambda n: n % 3 == 0))
+    assert actual == [(e["n"], e if e["n"] % 3 == 0 else None) for e in doc]
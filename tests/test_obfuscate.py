@@ -0,0 +1,40 @@
+import io
+from multiprocessing import get_context
+
+import jsonstream
+from budget_slice import load_budget
+from obfuscate import MIN_TAIL, Pseudonymizer, obfuscate_budget
+
+
+def test_short_names_stay_distinct():
+    p = Pseudonymizer("test")
+    names = [f"{a}{b}" for a in "ABCDEFGHIJ" for b in "0123456789"]
+    names += list("abcdefghijklmnopqrstuvwxyz")
+    pseudonyms = [p.text(n) for n in names]
+    assert len(set(pseudonyms)) == len(names)
+    assert all(len(s) > MIN_TAIL for s in pseudonyms)
+
+
+def test_same_key_same_pseudonyms():
+    a, b = Pseudonymizer("key"), Pseudonymizer("key")
+    long = "Groceries and household supplies"
+    assert a.text(long) == b.text(long) != Pseudonymizer("other").text(long)
+    assert len(a.text(long)) == len(long)
+    assert a.text(None) is None
+    assert a.text("") == ""
+    assert a.mills(-123_450) == b.mills(-123_450)
+
+
+def test_workers_under_spawn(export, monkeypatch):
+    # Where fork isn't used the arrays, and so the Pseudonymizer, are
+    # pickled to the workers.
+    monkeypatch.setattr(jsonstream, "get_context", lambda _: get_context("spawn"))
+    budget, arrays = obfuscate_budget(
+        load_budget(export).data.budget, Pseudonymizer("key")
+    )
+    outputs = []
+    for workers in (1, 2):
+        f = io.StringIO()
+        jsonstream.write_model(f, budget, arrays, indent=2, workers=workers)
+        outputs.append(f.getvalue())
+    assert outputs[0] == outputs[1]
@@ -0,0 +1,57 @@
+# Every way of running a script writes the same bytes as the default.
+
+import pytest
+
+from cli import script_main
+from compact import open_output
+from synthetic import first_month
+
+from .conftest import SYNTHETIC
+
+
+def midpoint():
+    first = first_month(SYNTHETIC)
+    return (first + (SYNTHETIC.last_month - first) / 2).isoformat()
+
+
+def run(script, export, output, args, reset_uuids):
+    reset_uuids()
+    script_main(script)(["--input", str(export), "--output", str(output), *args])
+    return output.read_bytes()
+
+
+@pytest.mark.parametrize("balance_forward", ["account", "carryover"])
+@pytest.mark.parametrize(
+    "mode", [["--stream"], ["--staging"], ["--index"], ["--workers", "2"]]
+)
+def test_example(export, tmp_path, reset_uuids, mode, balance_forward):
+    args = ["--start", midpoint(), "--balance-forward", balance_forward, "--no-cache"]
+    expected = run("example.py", export, tmp_path / "a.json", args, reset_uuids)
+    actual = run("example.py", export, tmp_path / "b.json", args + mode, reset_uuids)
+    assert actual == expected
+
+
+@pytest.mark.parametrize("mode", [["--staging"], ["--index"], ["--workers", "2"]])
+def test_inverse_example(export, tmp_path, reset_uuids, mode):
+    args = ["--end", midpoint(), "--no-cache"]
+    expected = run("inverse-example.py", export, tmp_path / "a.json", args, reset_uuids)
+    actual = run(
+        "inverse-example.py", export, tmp_path / "b.json", args + mode, reset_uuids
+    )
+    assert actual == expected
+
+
+@pytest.mark.parametrize("mode", [[], ["--stream"], ["--staging"]])
+@pytest.mark.parametrize("suffix", [".gz", ".zst"])
+def test_compressed_input(export, tmp_path, reset_uuids, mode, suffix):
+    if suffix == ".zst":
+        _ = pytest.importorskip("compression.zstd")
+    compressed = tmp_path / f"export.json{suffix}"
+    with open_output(compressed) as f:
+        _ = f.write(export.read_text())
+    args = ["--start", midpoint(), "--no-cache"]
+    expected = run("example.py", export, tmp_path / "a.json", args, reset_uuids)
+    actual = run(
+        "example.py", compressed, tmp_path / "b.json", args + mode, reset_uuids
+    )
+    assert actual == expected
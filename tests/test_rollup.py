@@ -0,0 +1,36 @@
+# Carryover budgets only count on-budget accounts towards category balances.
+
+from datetime import date, timedelta
+
+from budget_index import BudgetIndex
+from budget_slice import SliceRule, load_budget
+from rollup import Rollup
+
+
+START = date(2021, 1, 1)
+
+
+def test_carryover_ignores_off_budget(export):
+    budget = load_budget(export).data.budget
+    inflow_category_id = BudgetIndex(budget).inflow_category_id()
+    account_id = budget.accounts[0].id
+
+    def carryover(transactions, off_budget):
+        rollup = Rollup(
+            SliceRule(start=START),
+            by_category=True,
+            by_month=True,
+            off_budget=off_budget,
+        )
+        rollup.add_models(transactions, budget.subtransactions)
+        return rollup.carryover_month(
+            START - timedelta(days=1), inflow_category_id, budget.months
+        )
+
+    off_budget = carryover(budget.transactions, {str(account_id)})
+    without = carryover(
+        [t for t in budget.transactions if t.account_id != account_id], ()
+    )
+    assert off_budget is not None
+    assert off_budget == without
+    assert off_budget != carryover(budget.transactions, ())
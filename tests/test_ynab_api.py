@@ -0,0 +1,180 @@
+# fetch_budget against a local stand-in for the YNAB API.
+
+import asyncio
+import copy
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+import ynab_api
+from budget_slice import load_budget
+
+
+class StubApi:
+    """GET /v1/budgets/{id}: the budget's full document, or its delta when
+    asked with last_knowledge_of_server."""
+
+    def __init__(self):
+        self.full = {}
+        self.deltas = {}
+        self.last_used = None
+        # (budget id, last_knowledge_of_server or None) of each request.
+        self.requests = []
+
+    def response(self, path, query):
+        budget_id = path.removeprefix("/v1/budgets/")
+        knowledge = query.get("last_knowledge_of_server", [None])[0]
+        self.requests.append((budget_id, None if knowledge is None else int(knowledge)))
+        if budget_id == "last-used":
+            budget_id = self.last_used
+        if knowledge is not None and budget_id in self.deltas:
+            return self.deltas[budget_id]
+        return self.full[budget_id]
+
+
+@pytest.fixture
+def api(monkeypatch):
+    stub = StubApi()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            body = json.dumps(stub.response(url.path, parse_qs(url.query))).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            _ = self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv(ynab_api.HOST_ENV, f"http://127.0.0.1:{server.server_port}/v1")
+    monkeypatch.setenv(ynab_api.TOKEN_ENV, "test-token")
+    yield stub
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="module")
+def doc(export):
+    return json.loads(export.read_bytes())
+
+
+def budget_doc(doc, budget_id, knowledge):
+    d = copy.deepcopy(doc)
+    d["data"]["budget"]["id"] = budget_id
+    d["data"]["server_knowledge"] = knowledge
+    return d
+
+
+def delta_doc(doc, knowledge, **arrays):
+    """Only the given arrays' entities, as the API sends changes."""
+    d = copy.deepcopy(doc)
+    budget = d["data"]["budget"]
+    for key, value in budget.items():
+        if isinstance(value, list):
+            budget[key] = arrays.get(key, [])
+    d["data"]["server_knowledge"] = knowledge
+    return d
+
+
+def fetch(budget_id, snapshot_dir, full=False):
+    return asyncio.run(ynab_api.fetch_budgets([budget_id], snapshot_dir, full))[
+        budget_id
+    ]
+
+
+def budget_of(doc, tmp_path):
+    path = tmp_path / "expected.json"
+    _ = path.write_text(json.dumps(doc))
+    return load_budget(path)
+
+
+A = "aaaaaaaa-0000-4000-8000-000000000001"
+B = "bbbbbbbb-0000-4000-8000-000000000002"
+
+
+def test_full_fetch(api, doc, tmp_path):
+    api.full[A] = budget_doc(doc, A, 10)
+    fetched = fetch(A, tmp_path / "snapshots")
+    assert api.requests == [(A, None)]
+    assert fetched == budget_of(api.full[A], tmp_path)
+    assert (tmp_path / "snapshots" / f"{A}.pickle").exists()
+
+
+def test_delta_fetch(api, doc, tmp_path):
+    full = budget_doc(doc, A, 10)
+    api.full[A] = full
+    _ = fetch(A, tmp_path / "snapshots")
+
+    # Nothing changed: the same knowledge, no entities.
+    api.deltas[A] = delta_doc(full, 10)
+    unchanged = fetch(A, tmp_path / "snapshots")
+    assert api.requests[-1] == (A, 10)
+    assert unchanged == budget_of(full, tmp_path)
+
+    # One transaction changed, one deleted and one added.
+    transactions = full["data"]["budget"]["transactions"]
+    changed = dict(transactions[0], memo="changed")
+    deleted = dict(transactions[1], deleted=True)
+    added = dict(transactions[2], id="cccccccc-0000-4000-8000-000000000003")
+    api.deltas[A] = delta_doc(full, 11, transactions=[changed, deleted, added])
+    merged = fetch(A, tmp_path / "snapshots")
+    assert api.requests[-1] == (A, 10)
+    assert merged.data.server_knowledge == 11
+
+    expected = copy.deepcopy(full)
+    expected["data"]["server_knowledge"] = 11
+    expected_transactions = [changed, *transactions[2:], added]
+    expected_transactions.sort(key=lambda t: t["date"])
+    expected["data"]["budget"]["transactions"] = expected_transactions
+    assert merged == budget_of(expected, tmp_path)
+    assert merged == ynab_api.merge_delta(
+        budget_of(full, tmp_path), budget_of(api.deltas[A], tmp_path)
+    )
+
+    # The next delta is against the merged snapshot.
+    api.deltas[A] = delta_doc(full, 11)
+    assert fetch(A, tmp_path / "snapshots") == merged
+    assert api.requests[-1] == (A, 11)
+
+
+def test_corrupt_snapshot(api, doc, tmp_path):
+    api.full[A] = budget_doc(doc, A, 10)
+    snapshot_dir = tmp_path / "snapshots"
+    _ = fetch(A, snapshot_dir)
+    path = snapshot_dir / f"{A}.pickle"
+    _ = path.write_bytes(path.read_bytes()[:1000])
+    api.deltas[A] = delta_doc(api.full[A], 10)
+    fetched = fetch(A, snapshot_dir)
+    # The delta request goes out first; the full fetch follows.
+    assert api.requests[-1] == (A, None)
+    assert fetched == budget_of(api.full[A], tmp_path)
+
+
+def test_last_used_changes(api, doc, tmp_path):
+    snapshot_dir = tmp_path / "snapshots"
+    api.full[A] = budget_doc(doc, A, 10)
+    api.full[B] = budget_doc(doc, B, 20)
+    api.full[B]["data"]["budget"]["name"] = "Other budget"
+    api.last_used = A
+    _ = fetch("last-used", snapshot_dir)
+    assert (snapshot_dir / f"{A}.pickle").exists()
+
+    api.last_used = B
+    api.deltas[B] = delta_doc(api.full[B], 20)
+    fetched = fetch("last-used", snapshot_dir)
+    assert api.requests[-2:] == [("last-used", 10), ("last-used", None)]
+    assert fetched == budget_of(api.full[B], tmp_path)
+    assert (snapshot_dir / f"{B}.pickle").exists()
+
+    # Now a delta against B's snapshot.
+    _ = fetch("last-used", snapshot_dir)
+    assert api.requests[-1] == ("last-used", 20)
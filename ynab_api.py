@@ -0,0 +1,290 @@
+# Fetch budgets straight from the YNAB API instead of from an export file.
+#
+# The API doesn't page: GET /budgets/{id} returns the whole export in one
+# response, or with last_knowledge_of_server only the entities that changed
+# since.  The last budget fetched is kept as a snapshot (a pickle, as in the
+# budget cache), so later fetches ask for the changes and merge them in.
+# Snapshots are named by budget id; an alias such as last-used is a file
+# naming the id it was last, and a delta for another budget than the
+# snapshot's is ignored for a full fetch.
+#
+# Requests run in threads under asyncio and share one ynab.ApiClient, so one
+# pool of connections.  A delta request is in flight while its snapshot is
+# unpickled, and fetch_budgets fetches several budgets at once.
+
+import argparse
+import asyncio
+import os
+import pickle
+import sys
+import tempfile
+from operator import attrgetter
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO, cast
+
+import profiling
+from budget_cache import default_cache_dir
+from budget_json import gc_paused, parse_bytes
+from budget_slice import check_key_fields, write_budget
+from lazy import lazy_import
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+    import ynab
+    from pydantic import BaseModel
+    from ynab import BudgetDetail, BudgetDetailResponse, MonthDetail
+else:
+    ynab = lazy_import("ynab")
+
+
+TOKEN_ENV = "YNAB_ACCESS_TOKEN"
+# Another API root, e.g. a local stand-in for testing.
+HOST_ENV = "YNAB_API_HOST"
+MAX_CONNECTIONS = 4
+
+# Budget arrays whose entities are matched up by id when merging a delta.
+_BY_ID = [
+    "accounts",
+    "payees",
+    "payee_locations",
+    "category_groups",
+    "categories",
+    "transactions",
+    "subtransactions",
+    "scheduled_transactions",
+    "scheduled_subtransactions",
+]
+_SCALARS = [
+    "name",
+    "last_modified_on",
+    "first_month",
+    "last_month",
+    "date_format",
+    "currency_format",
+]
+
+
+def default_snapshot_dir() -> Path:
+    return default_cache_dir() / "api"
+
+
+def api_client(
+    token: str | None = None, connections: int = MAX_CONNECTIONS
+) -> ynab.ApiClient:
+    token = token or os.environ.get(TOKEN_ENV)
+    if not token:
+        msg = f"Set {TOKEN_ENV} to a YNAB personal access token"
+        raise RuntimeError(msg)
+    configuration = ynab.Configuration(access_token=token)
+    host = os.environ.get(HOST_ENV)
+    if host:
+        configuration.host = host
+    configuration.connection_pool_maxsize = connections
+    return ynab.ApiClient(configuration)
+
+
+def _get_budget(
+    client: ynab.ApiClient, budget_id: str, last_knowledge_of_server: int | None
+) -> bytes:
+    # The raw body, so it can be parsed like an export file (with orjson)
+    # rather than by the client's own json.loads.
+    response = ynab.BudgetsApi(client).get_budget_by_id_without_preload_content(
+        budget_id, last_knowledge_of_server
+    )
+    body = cast(bytes, response.data)
+    if response.status != 200:
+        msg = f"GET budget {budget_id}: HTTP {response.status} {body[:200]!r}"
+        raise RuntimeError(msg)
+    return body
+
+
+def _merge[M: BaseModel](
+    old: Iterable[M], new: Iterable[M], key: Callable[[M], Any]
+) -> list[M]:
+    # Changed entities replace the old ones in place, new ones go at the
+    # end, and deleted ones (only ever sent in deltas) are dropped.
+    merged = {key(e): e for e in old}
+    for e in new:
+        merged[key(e)] = e
+    return [e for e in merged.values() if not cast(bool, getattr(e, "deleted", False))]
+
+
+def merge_delta(
+    snapshot: BudgetDetailResponse, delta: BudgetDetailResponse
+) -> BudgetDetailResponse:
+    """`snapshot` with the changes in `delta`, as a full fetch would have
+    returned it."""
+    budget = snapshot.data.budget
+    changes = delta.data.budget
+    update: dict[str, Any] = {
+        name: _merge(getattr(budget, name), getattr(changes, name), attrgetter("id"))
+        for name in _BY_ID
+    }
+    # Exports list transactions by date (sort is stable, so ties keep their
+    # order) and months newest first.
+    update["transactions"].sort(key=attrgetter("var_date"))
+    old_months = {m.month: m for m in cast(list["MonthDetail"], budget.months)}
+    months = _merge(
+        old_months.values(),
+        cast(list["MonthDetail"], changes.months),
+        attrgetter("month"),
+    )
+    for m in months:
+        # A changed month may carry only its changed categories.
+        old = old_months.get(m.month)
+        if old is not None and m is not old:
+            m.categories = _merge(old.categories, m.categories, attrgetter("id"))
+    months.sort(key=attrgetter("month"), reverse=True)
+    update["months"] = months
+    for name in _SCALARS:
+        value = getattr(changes, name)  # pyright: ignore[reportAny]
+        if value is not None:
+            update[name] = value
+    merged: BudgetDetail = budget.model_copy(update=update)
+    return snapshot.model_copy(
+        update={
+            "data": snapshot.data.model_copy(
+                update={
+                    "budget": merged,
+                    "server_knowledge": delta.data.server_knowledge,
+                }
+            )
+        }
+    )
+
+
+def _read_snapshot(f: BinaryIO) -> BudgetDetailResponse:
+    with gc_paused():
+        return cast("BudgetDetailResponse", pickle.load(f))  # noqa: S301
+
+
+def _write_snapshot(path: Path, budget_detail_response: BudgetDetailResponse):
+    # Server knowledge first, so the next fetch can send its request before
+    # unpickling the budget.  Written and renamed, as in the budget cache.
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        pickle.dump(budget_detail_response.data.server_knowledge, f)
+        pickle.dump(budget_detail_response, f, pickle.HIGHEST_PROTOCOL)
+    _ = Path(tmp).replace(path)
+
+
+def _snapshot_path(snapshot_dir: Path, budget_id: str) -> Path:
+    try:
+        budget_id = (snapshot_dir / f"{budget_id}.alias").read_text()
+    except FileNotFoundError:
+        pass
+    return snapshot_dir / f"{budget_id}.pickle"
+
+
+async def fetch_budget(
+    client: ynab.ApiClient, budget_id: str, snapshot_dir: Path, full: bool = False
+) -> BudgetDetailResponse:
+    """Budget `budget_id`, fetched whole the first time (or with `full`) and
+    as a delta against its snapshot after that."""
+    snapshot_path = _snapshot_path(snapshot_dir, budget_id)
+    budget_detail_response = None
+    if not full:
+        try:
+            with snapshot_path.open("rb") as f:
+                knowledge = cast(int, pickle.load(f))  # noqa: S301
+                body, snapshot = await asyncio.gather(
+                    asyncio.to_thread(_get_budget, client, budget_id, knowledge),
+                    asyncio.to_thread(_read_snapshot, f),
+                )
+            delta = parse_bytes(body)
+            if str(delta.data.budget.id) == str(snapshot.data.budget.id):
+                budget_detail_response = merge_delta(snapshot, delta)
+            else:
+                print(
+                    f"{budget_id} is now budget {delta.data.budget.id}, not {snapshot.data.budget.id}; fetching it in full"
+                )
+        except FileNotFoundError:
+            pass
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            print(f"Ignoring snapshot {snapshot_path}: {e!r}")
+    if budget_detail_response is None:
+        body = await asyncio.to_thread(_get_budget, client, budget_id, None)
+        budget_detail_response = parse_bytes(body)
+    check_key_fields(budget_detail_response.data.budget)
+    resolved_id = str(budget_detail_response.data.budget.id)
+    await asyncio.to_thread(
+        _write_snapshot, snapshot_dir / f"{resolved_id}.pickle", budget_detail_response
+    )
+    if resolved_id != budget_id:
+        _ = (snapshot_dir / f"{budget_id}.alias").write_text(resolved_id)
+    return budget_detail_response
+
+
+async def fetch_budgets(
+    budget_ids: list[str],
+    snapshot_dir: Path | None = None,
+    full: bool = False,
+    connections: int = MAX_CONNECTIONS,
+) -> dict[str, BudgetDetailResponse]:
+    snapshot_dir = snapshot_dir or default_snapshot_dir()
+    limit = asyncio.Semaphore(connections)
+
+    async def fetch_one(client: ynab.ApiClient, budget_id: str):
+        async with limit:
+            return await fetch_budget(client, budget_id, snapshot_dir, full)
+
+    with api_client(connections=connections) as client:
+        budgets = await asyncio.gather(*(fetch_one(client, b) for b in budget_ids))
+    return dict(zip(budget_ids, budgets, strict=True))
+
+
+def fetch(budget_id: str, full: bool = False) -> BudgetDetailResponse:
+    """fetch_budget for scripts: the result goes straight to the slicing,
+    without an export file."""
+    return asyncio.run(fetch_budgets([budget_id], full=full))[budget_id]
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    _ = parser.add_argument(
+        "--budget-id",
+        help=f"Fetch this budget (an id, or last-used) from the YNAB API instead of reading --input. Needs {TOKEN_ENV}",
+    )
+    _ = parser.add_argument(
+        "--full-fetch",
+        action="store_true",
+        help="With --budget-id, fetch the whole budget rather than the changes since the last fetch",
+    )
+
+
+def main(argv: list[str]):
+    parser = argparse.ArgumentParser(
+        description="Write YNAB budgets as export files, fetched concurrently"
+    )
+    _ = parser.add_argument("budget_ids", nargs="+")
+    _ = parser.add_argument("--output-dir", "-o", default="ynab-json")
+    _ = parser.add_argument(
+        "--full-fetch",
+        action="store_true",
+        help="Fetch whole budgets rather than the changes since the last fetch",
+    )
+    _ = parser.add_argument("--connections", type=int, default=MAX_CONNECTIONS)
+    profiling.add_arguments(parser)
+    args = parser.parse_args(argv)
+    profiling.configure(args)
+    output_dir = Path(cast(str, args.output_dir))
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with profiling.phase("fetch"):
+        budgets = asyncio.run(
+            fetch_budgets(
+                cast(list[str], args.budget_ids),
+                full=cast(bool, args.full_fetch),
+                connections=cast(int, args.connections),
+            )
+        )
+    for budget_id, budget_detail_response in budgets.items():
+        output_path = output_dir / f"{budget_id}.json"
+        with profiling.phase("dump"):
+            write_budget(output_path, budget_detail_response)
+        print(output_path)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])